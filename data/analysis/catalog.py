@@ -0,0 +1,214 @@
+""" Catalog of the source data files
+
+Summary of every MetaTrader export found in a data folder, persisted next to
+the columnar store of `src/helpers/store.py`:
+
+    data/.store/catalog.json
+
+    {"WIN$N_1M_2015.08.12_2015.12.30_.csv": {
+        "symbol": "WIN$N", "freq": "1M",
+        "first": "2015.08.12", "last": "2015.12.30", "rows": 50911,
+        "days": "<base64 bitmap of the trading days from first to last>",
+        "checksum": "<sha1 of the file, chained over the appended bytes>",
+        "size": ..., "mtime_ns": ...},
+     ...}
+
+Entries are rebuilt only when the file size or mtime change, so listing the
+files and intersecting their trading days never reads the CSVs again.
+"""
+import os
+import json
+import base64
+import hashlib
+import numpy as np
+import pandas
+
+from src.helpers.store import STORE_DIR
+from src.helpers.timeparse import parse_dates, NS_PER_DAY
+
+CATALOG_NAME = "catalog.json"
+CATALOG_VERSION = 1
+
+
+def catalog_path(datapath):
+    """Catalog file of the folder of a given source file.
+
+    Examples
+    --------
+    >>> catalog_path("./data/WIN$N_5M_2015.05.22_2021.01.22_.csv")
+    './data/.store/catalog.json'
+
+    """
+    return os.path.join(os.path.dirname(datapath), STORE_DIR, CATALOG_NAME)
+
+
+def parse_filename(datapath):
+    """Symbol and frequency of a file named as {symbol}_{freq}_{first}_{last}_.csv.
+
+    Examples
+    --------
+    >>> parse_filename("./data/WIN$N_10M_2013.11.08_2021.01.22_.csv")
+    ('WIN$N', '10M')
+
+    """
+    symbol, freq = os.path.basename(datapath).split("_")[:2]
+    return symbol, freq
+
+
+def file_checksum(datapath, chunksize=2**20, offset=0, checksum=None):
+    """sha1 of a file from byte `offset` on, chained to the `checksum` of the bytes before it.
+
+    An append only hashes the appended bytes: the checksum of a file then depends on the
+    sizes it was appended at, and it is not the plain sha1 of the whole file anymore.
+    """
+    sha1 = hashlib.sha1()
+    if checksum is not None:
+        sha1.update(checksum.encode("ascii"))
+    with open(datapath, "rb") as file:
+        file.seek(offset)
+        for chunk in iter(lambda: file.read(chunksize), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def encode_days(days):
+    """Base64 bitmap of sorted epoch days, starting at the first one."""
+    if len(days) == 0:
+        return ""
+    bits = np.zeros(days[-1] - days[0] + 1, dtype=bool)
+    bits[days - days[0]] = True
+    return base64.b64encode(np.packbits(bits).tobytes()).decode("ascii")
+
+
+def entry_days(entry):
+    """int64 epoch days with at least one bar of a catalog entry."""
+    if entry["rows"] == 0:
+        return np.zeros(0, dtype=np.int64)
+    first = parse_dates([entry["first"]])[0] // NS_PER_DAY
+    last = parse_dates([entry["last"]])[0] // NS_PER_DAY
+    bits = np.unpackbits(np.frombuffer(base64.b64decode(entry["days"]), dtype=np.uint8))
+    return first + np.flatnonzero(bits[:last - first + 1])
+
+
+def format_days(days):
+    """"YYYY.MM.DD" strings of epoch days."""
+    return list(pandas.to_datetime(np.asarray(days) * NS_PER_DAY).strftime("%Y.%m.%d"))
+
+
+def build_entry(datapath):
+    """Catalog entry of a source file, reading its "date" column once."""
+    symbol, freq = parse_filename(datapath)
+    dates = pandas.read_csv(datapath, usecols=["date"], dtype={"date": str})["date"]
+    days = np.unique(parse_dates(dates) // NS_PER_DAY)
+    first_last = format_days(days[[0, -1]]) if len(days) else ["", ""]
+    stat = os.stat(datapath)
+    return {"symbol": symbol,
+            "freq": freq,
+            "first": first_last[0],
+            "last": first_last[1],
+            "rows": int(len(dates)),
+            "days": encode_days(days),
+            "checksum": file_checksum(datapath),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns}
+
+
+def load_catalog(path):
+    try:
+        with open(path, "r") as file:
+            catalog = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    if catalog.get("version") != CATALOG_VERSION:
+        return {}
+    return catalog.get("files", {})
+
+
+def save_catalog(path, entries):
+    """Write the catalog atomically, skipping read-only data folders."""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmppath = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmppath, "w") as file:
+            json.dump({"version": CATALOG_VERSION, "files": entries}, file, indent=2, sort_keys=True)
+        os.replace(tmppath, path)
+    except OSError:
+        pass
+
+
+def read_catalog(files):
+    """Catalog entries of the given files, indexing only the new or modified ones.
+
+    Parameters
+    ----------
+    files: list
+        CSV filepaths, possibly from different folders.
+
+    Returns
+    -------
+    entries: dict
+        dict with the filepaths as keys and their catalog entries as values.
+
+    Examples
+    --------
+    >>> entries = read_catalog(["./data/WIN$N_30M_2015.08.12_2021.01.22_.csv"])
+    >>> entries["./data/WIN$N_30M_2015.08.12_2021.01.22_.csv"]["first"]
+    '2015.08.12'
+
+    """
+    folders = {}
+    for file in files:
+        folders.setdefault(catalog_path(file), []).append(file)
+
+    entries = {}
+    for path, folder_files in folders.items():
+        catalog = load_catalog(path)
+        changed = False
+        for file in folder_files:
+            name = os.path.basename(file)
+            entry = catalog.get(name, None)
+            if not is_current(entry, file):
+                entry = catalog[name] = build_entry(file)
+                changed = True
+            entries[file] = entry
+        if changed:
+            save_catalog(path, catalog)
+    return entries
+
+
+def is_current(entry, datapath):
+    """Whether a catalog entry still describes the file, by its size and mtime."""
+    stat = os.stat(datapath)
+    return (entry is not None) and (entry["size"], entry["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns)
+
+
+def extend_entry(entry, datapath, days, rows):
+    """Catalog entry of a file after `rows` bars, on the epoch `days`, were appended to it.
+
+    Only the day bitmap is merged and only the bytes after the former `entry["size"]` are
+    hashed, the file is not read again.
+    """
+    days = np.union1d(entry_days(entry), np.asarray(days, dtype=np.int64))
+    first_last = format_days(days[[0, -1]]) if len(days) else ["", ""]
+    stat = os.stat(datapath)
+    return dict(entry,
+                first=first_last[0],
+                last=first_last[1],
+                rows=entry["rows"] + int(rows),
+                days=encode_days(days),
+                checksum=file_checksum(datapath, offset=entry["size"], checksum=entry["checksum"]),
+                size=stat.st_size,
+                mtime_ns=stat.st_mtime_ns)
+
+
+def overlapping_days(entry1, entry2):
+    """Trading days present in both catalog entries, as int64 epoch days.
+
+    Files whose first/last dates do not intersect are discarded before decoding any bitmap.
+    """
+    if (entry1["rows"] == 0) or (entry2["rows"] == 0):
+        return np.zeros(0, dtype=np.int64)
+    # "YYYY.MM.DD" strings sort as dates
+    if (entry1["first"] > entry2["last"]) or (entry2["first"] > entry1["last"]):
+        return np.zeros(0, dtype=np.int64)
+    return np.intersect1d(entry_days(entry1), entry_days(entry2), assume_unique=True)
@@ -2,10 +2,20 @@
 
 """
 import os
+import re
 import glob
+import pickle
+import shutil
+import tempfile
+import argparse
+import numpy as np
 import pandas
 
-from datetime import datetime
+from src.helpers.timeparse import parse_dates, parse_datetimes, NS_PER_DAY
+from src.helpers.store import read_store, read_meta, append_store, store_path, source_signature, write_meta
+from data.analysis import catalog
+
+MERGE_CHUNKSIZE = 2**16
 
 
 def list_data_files():
@@ -70,57 +80,453 @@ def process_overlapping_dfs(df1, df2):
     return df
 
 
-def split_date_dfs(df, days_split=30):
-    idx_split = []
-    for idx, date in df.loc[1:, "date"].drop_duplicates().items():
-        date_idx = datetime.strptime(date, "%Y.%m.%d").date()
-        date_idx_1 = datetime.strptime(df.loc[idx-1, "date"], "%Y.%m.%d").date()
-        diff_date = abs(date_idx - date_idx_1).days
-        if diff_date > days_split:
-            idx_split.append(idx)
-
-    if len(idx_split) == 0:
+def split_date_points(df, days_split=30):
+    """Positions of the rows starting a new part, after a gap longer than `days_split` days.
+
+    Examples
+    --------
+    >>> df = pandas.DataFrame({"date": ["2015.08.12", "2015.08.13", "2015.10.01", "2015.10.02"]})
+    >>> split_date_points(df)
+    array([2])
+
+    """
+    days = parse_dates(df["date"]) // NS_PER_DAY
+    return np.flatnonzero(np.abs(np.diff(days)) > days_split) + 1
+
+
+def split_views(df, splits):
+    """Positional slices of `df` between the `splits` positions, without copying the rows."""
+    if len(splits) == 0:
         return [df]
+    bounds = [0] + list(splits) + [len(df)]
+    return [df.iloc[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def split_date_dfs(df, days_split=30):
+    """Split a dataframe on the gaps longer than `days_split` days between consecutive rows.
+
+    The parts are slices of `df`, keeping its index.
+    """
+    return split_views(df, split_date_points(df, days_split=days_split))
+
+
+def whole_keys(chunks):
+    """Sorted (df, keys) chunks regrouped so that the rows of a key are never split between two chunks."""
+    carry = None
+    for df, keys in chunks:
+        if carry is not None:
+            df, keys = pandas.concat([carry[0], df]), np.concatenate([carry[1], keys])
+        if len(keys) == 0:
+            continue
+        start = np.searchsorted(keys, keys[-1], side="left")
+        if start > 0:
+            yield df.iloc[:start], keys[:start]
+        carry = df.iloc[start:], keys[start:]
+    if carry is not None:
+        yield carry
+
+
+def merge_chunks(streams):
+    """k-way merge of sorted (df, keys) chunk streams, keeping the row of the latest stream when repeated.
+
+    Each round takes, from every stream, the rows up to the smallest last key of their current
+    chunks: no row of a later chunk can sort before it, so those rows are merged (a stable sort
+    of at most one chunk per stream) and yielded. Memory is bounded by one chunk per stream.
+
+    Parameters
+    ----------
+    streams: list
+        iterables of (pandas.DataFrame, numpy.ndarray) chunks, each sorted by its int64 keys
+        and following the previous chunk of the same stream.
+
+    Yields
+    ------
+    df: pandas.DataFrame
+        merged rows, without repeated keys.
+    keys: numpy.ndarray
+        their sorted keys.
+
+    """
+    streams = [whole_keys(stream) for stream in streams]
+    buffers = [next(stream, None) for stream in streams]
+    while True:
+        active = [i for i, buffer in enumerate(buffers) if buffer is not None]
+        if len(active) == 0:
+            return
+        bound = min(buffers[i][1][-1] for i in active)
+
+        dfs, list_keys = [], []
+        for i in active:
+            df, keys = buffers[i]
+            stop = np.searchsorted(keys, bound, side="right")
+            dfs.append(df.iloc[:stop])
+            list_keys.append(keys[:stop])
+            buffers[i] = (df.iloc[stop:], keys[stop:]) if stop < len(keys) else next(streams[i], None)
+
+        # repeated keys stay in stream order, the last one is from the latest stream
+        keys = np.concatenate(list_keys)
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        last = np.ones(len(keys), dtype=bool)
+        last[:-1] = keys[1:] != keys[:-1]
+        yield pandas.concat(dfs).take(order[last]), keys[last]
+
+
+def gap_splits(keys, previous=None, days_split=30):
+    """Positions of sorted `keys` starting a new part, after a gap longer than `days_split` days.
+
+    `previous` is the key before `keys[0]`, when they continue earlier keys.
+    """
+    days = keys // NS_PER_DAY
+    if previous is not None:
+        days = np.concatenate([[previous // NS_PER_DAY], days])
+    splits = np.flatnonzero(np.diff(days) > days_split)
+    return splits if previous is not None else splits + 1
+
+
+def merge_sorted_keys(list_keys, days_split=30, chunksize=MERGE_CHUNKSIZE):
+    """Merge already sorted key arrays, keeping the key of the latest array when repeated.
+
+    The arrays are merged `chunksize` keys at a time, see `merge_chunks`.
+
+    Parameters
+    ----------
+    list_keys: list
+        int64 epoch nanoseconds of each file, each one sorted.
+    days_split: int
+        largest gap, in days, allowed between consecutive rows of the same part.
+    chunksize: int
+        keys taken from each array per merge round.
+
+    Returns
+    -------
+    rows: numpy.ndarray
+        rows of the concatenation of `list_keys`, in merged order and without repeated keys.
+    splits: numpy.ndarray
+        positions of `rows` starting a new part, after a gap longer than `days_split`.
+
+    Examples
+    --------
+    >>> rows, splits = merge_sorted_keys([np.array([1, 2, 4]), np.array([2, 3])])
+    >>> rows, splits
+    (array([0, 3, 4, 2]), array([], dtype=int64))
+
+    """
+    streams, offset = [], 0
+    for keys in list_keys:
+        rows = pandas.DataFrame({"row": np.arange(offset, offset + len(keys))})
+        streams.append([(rows.iloc[start:start + chunksize], keys[start:start + chunksize])
+                        for start in range(0, len(keys), chunksize)])
+        offset += len(keys)
+
+    rows, keys = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+    for df, chunk_keys in merge_chunks(streams):
+        rows.append(df["row"].values)
+        keys.append(chunk_keys)
+    return np.concatenate(rows), gap_splits(np.concatenate(keys), days_split=days_split)
+
+
+def sorted_chunks(filepath, chunksize=MERGE_CHUNKSIZE):
+    """Chunks of `chunksize` rows of a MetaTrader export, as (df, keys) sorted by their int64 keys.
+
+    Exports are written from the oldest or from the newest bar: the chunks are spilled to a
+    temporary folder while the file is read, then loaded back one at a time in ascending
+    order. An export in neither order is sorted as a whole.
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths, ascending, descending, previous = [], True, True, None
+        for df in pandas.read_csv(filepath, chunksize=chunksize, dtype={"date": str, "hour": str}):
+            df.columns = [s.strip() for s in df.columns]
+            df = split_date_column(df)
+            keys = parse_datetimes(df["date"], df["hour"])
+            if len(keys) == 0:
+                continue
+            steps = np.diff(keys if previous is None else np.concatenate([[previous], keys]))
+            ascending = ascending and bool(np.all(steps >= 0))
+            descending = descending and bool(np.all(steps <= 0))
+            previous = keys[-1]
+
+            order = np.argsort(keys, kind="stable")
+            paths.append(os.path.join(tmpdir, "{}.pkl".format(len(paths))))
+            with open(paths[-1], "wb") as file:
+                pickle.dump((df.take(order), keys[order]), file, protocol=pickle.HIGHEST_PROTOCOL)
+            del df, keys
+
+        if ascending or descending:
+            for path in (paths if ascending else paths[::-1]):
+                with open(path, "rb") as file:
+                    yield pickle.load(file)
+                os.remove(path)
+            return
+
+        chunks = []
+        for path in paths:
+            with open(path, "rb") as file:
+                chunks.append(pickle.load(file))
+        df = pandas.concat([chunk[0] for chunk in chunks])
+        keys = np.concatenate([chunk[1] for chunk in chunks])
+        del chunks
+        order = np.argsort(keys, kind="stable")
+        for start in range(0, len(order), chunksize):
+            rows = order[start:start + chunksize]
+            yield df.take(rows), keys[rows]
+
+
+def merge_files(list_files, chunksize=MERGE_CHUNKSIZE):
+    """Merged (df, keys) chunks of MetaTrader exports, the rows of a (date, hour) key repeated
+    in more than one file are taken from the latest file of `list_files`."""
+    return merge_chunks([sorted_chunks(file, chunksize=chunksize) for file in list_files])
+
+
+def process_files(list_files, days_split=30):
+    """Merge MetaTrader exports into continuous dataframes.
+
+    Rows repeated in more than one file, by their (date, hour) key, are taken from the
+    latest file of `list_files`, and the series is split on gaps longer than `days_split`
+    as in `split_date_dfs`. The parts are returned in memory, `write_parts` writes them
+    while merging instead.
+    """
+    dfs, list_keys = [], []
+    for df, keys in merge_files(list_files):
+        dfs.append(df)
+        list_keys.append(keys)
 
-    list_dfs = []
-    for idx in idx_split:
-        df_sample = df.loc[:idx-1, :].reset_index(drop=True)
-        list_dfs.append(df_sample)
-        df = df.loc[idx:, :]
+    if len(dfs) == 0:
+        return []
 
-    list_dfs.append(df.reset_index(drop=True))
-    return list_dfs
+    dfs = pandas.concat(dfs, ignore_index=True)
+    return split_views(dfs, gap_splits(np.concatenate(list_keys), days_split=days_split))
 
 
-def process_files(list_files):
-    dfs = pandas.DataFrame()
-    for file in list_files:
-        df = read_csv(file)
-        df = split_date_column(df)
-        dfs = process_overlapping_dfs(df, dfs)
-    list_dfs = split_date_dfs(dfs)
-    return list_dfs
+def part_filename(date_start, date_end, key, path="./data/", product="WIN$N"):
+    """Consolidated file of a part, named after its first and last dates."""
+    str_daterange = "_".join([date_start, date_end])
+    return "_".join([path+product, key, str_daterange, ".csv"])
 
 
 def save_dfs(list_dfs, key, path="./data/", product="WIN$N"):
     saved_files = []
     for df in list_dfs:
         date_start, date_end = get_start_end_dt(df)
-        str_daterange = "_".join([date_start, date_end])
-        filename = "_".join([path+product, key, str_daterange, ".csv"])
+        filename = part_filename(date_start, date_end, key, path=path, product=product)
         df.to_csv(filename, index=False)
         saved_files.append(filename)
         print()
     return saved_files
 
 
-def main():
+def write_parts(chunks, key, path="./data/", product="WIN$N", days_split=30):
+    """Write merged (df, keys) chunks as consolidated files, one per part, as `save_dfs`.
+
+    Each chunk is appended to the file of its part, split on gaps longer than `days_split`
+    days, and the file is renamed after its dates once the part ends, so only one chunk
+    is held in memory.
+
+    Returns
+    -------
+    saved_files: list
+        consolidated CSV filepaths.
+
+    """
+    saved_files = []
+    tmppath = "{}.{}.tmp".format(part_filename("", "", key, path=path, product=product), os.getpid())
+    dates, previous = None, None
+    for df, keys in chunks:
+        splits = gap_splits(keys, previous=previous, days_split=days_split)
+        bounds = np.unique(np.concatenate([[0], splits, [len(keys)]]))
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            if (dates is not None) and (start in splits):
+                saved_files.append(part_filename(dates[0], dates[1], key, path=path, product=product))
+                os.replace(tmppath, saved_files[-1])
+                dates = None
+            part = df.iloc[start:stop]
+            part.to_csv(tmppath, mode="w" if dates is None else "a", header=dates is None, index=False)
+            dates = (part["date"].iloc[0] if dates is None else dates[0], part["date"].iloc[-1])
+        previous = keys[-1]
+
+    if dates is not None:
+        saved_files.append(part_filename(dates[0], dates[1], key, path=path, product=product))
+        os.replace(tmppath, saved_files[-1])
+    return saved_files
+
+
+def dated_target(target, last):
+    """Name of a consolidated file once its bars go up to the `last` "YYYY.MM.DD" date.
+
+    Files whose name has no last date, or a later one, keep their name.
+
+    Examples
+    --------
+    >>> dated_target("./data/WIN$N_1M_2015.08.12_2015.12.30_.csv", "2016.01.08")
+    './data/WIN$N_1M_2015.08.12_2016.01.08_.csv'
+
+    """
+    dirname, basename = os.path.split(target)
+    fields = basename.split("_")
+    if (len(fields) < 5) or not re.fullmatch(r"\d{4}\.\d{2}\.\d{2}", fields[3]) or (fields[3] >= last):
+        return target
+    fields[3] = last
+    return os.path.join(dirname, "_".join(fields))
+
+
+def rename_target(target, renamed, meta, entries):
+    """Rename a consolidated file along with its columnar store and catalog entry.
+
+    `meta` and `entries` are its current store metadata and folder catalog (or None), the
+    resampled series of the old name are removed.
+    """
+    os.replace(target, renamed)
+    if meta is not None:
+        shutil.rmtree(store_path(renamed), ignore_errors=True)
+        os.replace(store_path(target), store_path(renamed))
+        write_meta(store_path(renamed), dict(meta, source=source_signature(renamed)))
+    for path in glob.glob(glob.escape(store_path(target)) + ".*M"):
+        shutil.rmtree(path, ignore_errors=True)
+    if entries is not None:
+        entries[os.path.basename(renamed)] = entries.pop(os.path.basename(target))
+        catalog.save_catalog(catalog.catalog_path(renamed), entries)
+
+
+def append_export(target, export):
+    """Append to a consolidated file the bars of a new export that are after its last bar.
+
+    Only the new bars are parsed and written: they are appended to the CSV, to its columnar
+    store (with the day index used as trading calendar) and to its catalog entry, leaving the
+    earlier data untouched. Resampled series of the file are rebuilt on their next read.
+    The file is then renamed after its new last date (see `dated_target`), so that the dates
+    of its name still cover its bars.
+
+    Parameters
+    ----------
+    target: str
+        consolidated CSV filepath.
+    export: str
+        new MetaTrader export CSV filepath.
+
+    Returns
+    -------
+    target: str
+        consolidated CSV filepath, renamed if the new bars are after the last date of its name.
+    rows: int
+        number of appended bars.
+
+    Examples
+    --------
+    >>> append_export("./data/WIN$N_1M_2015.08.12_2015.12.30_.csv", "./data/WIN$N_1M_2015.12.30_2016.01.08.csv")
+    ('./data/WIN$N_1M_2015.08.12_2016.01.08_.csv', 1460)
+
+    """
+    # store and catalog as they were before the target changes
+    arrays = read_store(target)
+    meta = read_meta(target)
+    catalog_file = catalog.catalog_path(target)
+    entries = catalog.load_catalog(catalog_file)
+    entry = entries.get(os.path.basename(target), None)
+    entry = entry if catalog.is_current(entry, target) else None
+    last = int(arrays["datetime"][-1]) if len(arrays["datetime"]) else np.iinfo(np.int64).min
+
+    df = split_date_column(read_csv(export))
+    keys = parse_datetimes(df["date"], df["hour"])
+    new = np.flatnonzero(keys > last)
+    order = new[np.argsort(keys[new], kind="stable")]
+    # repeated bars keep the last row of the export
+    keep = np.ones(len(order), dtype=bool)
+    keep[:-1] = keys[order][1:] != keys[order][:-1]
+    rows = order[keep]
+    if len(rows) == 0:
+        return target, 0
+
+    df = df.take(rows)
+    columns = [column.strip() for column in pandas.read_csv(target, nrows=0).columns]
+    with open(target, "rb+") as file:
+        file.seek(0, os.SEEK_END)
+        if file.tell() > 0:
+            file.seek(-1, os.SEEK_END)
+            if file.read(1) != b"\n":
+                file.write(b"\n")
+    df[columns].to_csv(target, mode="a", header=False, index=False)
+
+    new_arrays = {"datetime": keys[rows], "open": df["open"].values, "high": df["high"].values,
+                  "low": df["low"].values, "close": df["close"].values, "volume": df["real_volume"].values}
+    if meta is not None:
+        meta = append_store(target, new_arrays, meta)
+    if entry is not None:
+        entries[os.path.basename(target)] = catalog.extend_entry(entry, target, np.unique(keys[rows] // NS_PER_DAY),
+                                                                 len(rows))
+        catalog.save_catalog(catalog_file, entries)
+
+    renamed = dated_target(target, catalog.format_days([keys[rows[-1]] // NS_PER_DAY])[0])
+    if renamed != target:
+        rename_target(target, renamed, meta, entries if entry is not None else None)
+    return renamed, len(rows)
+
+
+def consolidated_target(export, path="./data/"):
+    """Consolidated file, as written by `save_dfs`, that a new export should be appended to.
+
+    The target has the same symbol and frequency of the export ("{symbol}_{freq}_..." names)
+    and the latest last date, None if there is none yet.
+
+    Examples
+    --------
+    >>> consolidated_target("./exports/WIN$N_1M_2021.01.20_2021.02.10.csv")
+    './data/WIN$N_1M_2020.04.24_2021.01.20_.csv'
+
+    """
+    product, key = os.path.basename(export).split("_")[:2]
+    pattern = os.path.join(glob.escape(path), "{}_{}_*_*_.csv".format(glob.escape(product), glob.escape(key)))
+    targets = [file for file in glob.glob(pattern) if os.path.abspath(file) != os.path.abspath(export)]
+    if len(targets) == 0:
+        return None
+    return max(targets, key=lambda file: os.path.basename(file).split("_")[3])
+
+
+def append_exports(exports, path="./data/"):
+    """Append each new export to its `consolidated_target`, see `append_export`.
+
+    Returns
+    -------
+    appended: dict
+        number of appended bars by target (by its name after the appends), exports without
+        a target are skipped.
+
+    """
+    appended = {}
+    for export in exports:
+        target = consolidated_target(export, path=path)
+        if target is None:
+            print(export, "has no consolidated file to append to, run without --append to build it")
+            continue
+        renamed, rows = append_export(target, export)
+        appended[renamed] = appended.pop(target, 0) + rows
+        print(export, "->", renamed, rows, "bars appended")
+    return appended
+
+
+def parse_args(pargs=None):
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        description='Merge the MetaTrader exports of ./data into consolidated files')
+
+    parser.add_argument('--append', nargs='+', default=None, metavar='EXPORT',
+                        help=('Only append the bars of these new exports to the consolidated file of\n'
+                              'the same symbol and frequency, instead of rebuilding every file'))
+    parser.add_argument('--path', default='./data/',
+                        help='Folder of the consolidated files')
+
+    return parser.parse_args(pargs)
+
+
+def main(pargs=None):
+    args = parse_args(pargs)
+    if args.append:
+        return append_exports(args.append, path=args.path)
+
     files = list_data_files()
 
     saved_files = []
     for key in files.keys():
-        list_dfs = process_files(files[key])
-        saved_files.append(save_dfs(list_dfs, key))
+        saved_files.append(write_parts(merge_files(files[key]), key))
     return saved_files
 
 
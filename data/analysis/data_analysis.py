@@ -4,8 +4,15 @@ associated with : `data_analysis.ipynb`
 
 import os
 import glob
+import numpy as np
 import pandas
 import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from src.helpers.timeparse import parse_datetimes, NS_PER_DAY
+from data.analysis.catalog import read_catalog, overlapping_days, format_days, parse_filename
+
+CANDLE_TYPES = [0, 1, 2, 3, 4]
 
 # confirmar local de execução do código
 # os.chdir('..')
@@ -38,8 +45,9 @@ def list_data_files(data_path="./data/*.csv"):
     """
     dict_files = {}
     files = glob.glob(data_path)
+    catalog = read_catalog(files)
     for file in files:
-        freq = file.split(".")[1].split("_")[1]
+        freq = catalog[file]["freq"]
         if freq in list(dict_files.keys()):
             dict_files[freq].append(file)
         else:
@@ -70,13 +78,8 @@ def filter_overlapping_dates(file1, file2):
     ['2015.08.12', '2015.08.13', '2015.08.14', ... '2015.12.29', '2015.12.30']
 
     """
-    df1 = pandas.read_csv(file1)
-    df2 = pandas.read_csv(file2)
-    dates_df1 = df1["date"].drop_duplicates().reset_index(drop=True)
-    dates_df2 = df2["date"].drop_duplicates().reset_index(drop=True)
-    dates = dates_df1.append(dates_df2).reset_index(drop=True)
-    duplicated = dates[dates.duplicated()].reset_index(drop=True)
-    return list(duplicated)
+    catalog = read_catalog([file1, file2])
+    return format_days(overlapping_days(catalog[file1], catalog[file2]))
 
 
 def filter_overlapping_files(files):
@@ -116,13 +119,14 @@ def filter_overlapping_files(files):
     base = str(base) + "M"
     keys.remove(base)
     base_files = files[base]
+    catalog = read_catalog([file for file_keys in files.values() for file in file_keys])
 
     dict_files_all = {}
     for key in keys:
         file_keys = files[key]
         for file_key in file_keys:
             for file_base in base_files:
-                dates_overlapping = filter_overlapping_dates(file_base, file_key)
+                dates_overlapping = overlapping_days(catalog[file_base], catalog[file_key])
                 if len(dates_overlapping) > 0:
                     list_files = [file_base, file_key]
                     combination = base + "_" + key
@@ -138,6 +142,9 @@ def format_hour(df):
 
     Sometimes the hour need to be proper formatted to be properly sorted.
     It should be "09:00:00" and not "9:00:00".
+    Bars are sorted by date and hour, and a repeated (date, hour) bar keeps its first row.
+    The "time" column, after "hour", holds the int64 nanoseconds since midnight of each bar,
+    to compare or group bars by their time of day without parsing the hours again.
 
     Parameters
     ----------
@@ -147,7 +154,7 @@ def format_hour(df):
     Returns
     -------
     df: pandas.Dataframe
-        Dataframe with proper Hour format.
+        Dataframe with proper Hour format, and the "time" column.
 
     Examples:
     --------
@@ -162,24 +169,25 @@ def format_hour(df):
     999  2015.08.12  9:04:00  50325  50330  50090  50190         2078          747
     >>> df = format_hour(df)
     >>> print(df)
-            date      hour   open   high    low  close  real_volume  tick_volume
-    0  2015.08.12  09:00:00  50280  50430  50255  50405          976          217
-    1  2015.08.12  09:01:00  50405  50440  50335  50400         1589          445
-    2  2015.08.12  09:02:00  50395  50410  50355  50355          465          102
-    3  2015.08.12  09:03:00  50350  50360  50320  50325          474          150
-    4  2015.08.12  09:04:00  50325  50330  50090  50190         2078          747
+            date      hour            time   open   high    low  close  real_volume  tick_volume
+    0  2015.08.12  09:00:00  32400000000000  50280  50430  50255  50405          976          217
+    1  2015.08.12  09:01:00  32460000000000  50405  50440  50335  50400         1589          445
+    2  2015.08.12  09:02:00  32520000000000  50395  50410  50355  50355          465          102
+    3  2015.08.12  09:03:00  32580000000000  50350  50360  50320  50325          474          150
+    4  2015.08.12  09:04:00  32640000000000  50325  50330  50090  50190         2078          747
     ...
-    999  2015.08.12  18:30:00  50395  50410  50355  50355          465          102
+    999  2015.08.12  18:30:00  66600000000000  50395  50410  50355  50355          465          102
 
     """
-    for idx, row in enumerate(df["hour"]):
-        hour = row.split(":")[0]
-        if len(hour) == 1:
-            hour = "0" + hour
-            hour = ":".join([hour, ":".join(row.split(":")[1:])])
-            df.loc[idx, "hour"] = hour
-    df = df.drop_duplicates()
-    df = df.sort_values(by=["date", "hour"]).reset_index(drop=True)
+    hours = df["hour"].str.zfill(8)
+    # (date, time of day) integer key, to sort and drop repeated bars without comparing strings
+    keys = parse_datetimes(df["date"], hours)
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    first = np.ones(len(keys), dtype=bool)
+    first[1:] = keys[1:] != keys[:-1]
+    df = df.assign(hour=hours).take(order[first]).reset_index(drop=True)
+    df.insert(df.columns.get_loc("hour") + 1, "time", keys[first] % NS_PER_DAY)
     return df
 
 
@@ -206,12 +214,12 @@ def filter_date_df(date_time, df, var="date"):
     >>> dates = filter_overlapping_dates(file1, file2)
     >>> df1 = pandas.read_csv(file1)
     >>> filter_date_df(dates_overlapping, df1).head()
-            date      hour   open   high    low  close  real_volume  tick_volume
-    0  2015.08.12  09:00:00  50280  50430  50255  50405          976          217
-    1  2015.08.12  09:01:00  50405  50440  50335  50400         1589          445
-    2  2015.08.12  09:02:00  50395  50410  50355  50355          465          102
-    3  2015.08.12  09:03:00  50350  50360  50320  50325          474          150
-    4  2015.08.12  09:04:00  50325  50330  50090  50190         2078          747
+            date      hour            time   open   high    low  close  real_volume  tick_volume
+    0  2015.08.12  09:00:00  32400000000000  50280  50430  50255  50405          976          217
+    1  2015.08.12  09:01:00  32460000000000  50405  50440  50335  50400         1589          445
+    2  2015.08.12  09:02:00  32520000000000  50395  50410  50355  50355          465          102
+    3  2015.08.12  09:03:00  32580000000000  50350  50360  50320  50325          474          150
+    4  2015.08.12  09:04:00  32640000000000  50325  50330  50090  50190         2078          747
 
     """
     filters = [True if date in date_time else False for date in df[var]]
@@ -245,19 +253,19 @@ def filter_overlapping_files_dfs(file1, file2):
     >>> file2 = './data/WIN$N_10M_2013.11.08_2021.01.22_.csv'
     >>> df1_filter, df2_filter = filter_overlapping_files_dfs(file1, file2)
     >>> print(df1_filter.head())
-             date      hour   open   high    low  close  real_volume  tick_volume
-    0  2015.08.12  09:00:00  50280  50430  50255  50405          976          217
-    1  2015.08.12  09:01:00  50405  50440  50335  50400         1589          445
-    2  2015.08.12  09:02:00  50395  50410  50355  50355          465          102
-    3  2015.08.12  09:03:00  50350  50360  50320  50325          474          150
-    4  2015.08.12  09:04:00  50325  50330  50090  50190         2078          747
+             date      hour            time   open   high    low  close  real_volume  tick_volume
+    0  2015.08.12  09:00:00  32400000000000  50280  50430  50255  50405          976          217
+    1  2015.08.12  09:01:00  32460000000000  50405  50440  50335  50400         1589          445
+    2  2015.08.12  09:02:00  32520000000000  50395  50410  50355  50355          465          102
+    3  2015.08.12  09:03:00  32580000000000  50350  50360  50320  50325          474          150
+    4  2015.08.12  09:04:00  32640000000000  50325  50330  50090  50190         2078          747
     >>> print(df2_filter.head())
-             date      hour   open   high    low  close  real_volume  tick_volume
-    0  2015.08.12  09:00:00  50280  50440  50030  50260         8559         2938
-    1  2015.08.12  09:10:00  50260  50375  50230  50260         5491         2189
-    2  2015.08.12  09:20:00  50265  50305  50120  50140         4973         2142
-    3  2015.08.12  09:30:00  50145  50155  49585  49665        15082         6077
-    4  2015.08.12  09:40:00  49675  49685  49550  49650         6575         2504
+             date      hour            time   open   high    low  close  real_volume  tick_volume
+    0  2015.08.12  09:00:00  32400000000000  50280  50440  50030  50260         8559         2938
+    1  2015.08.12  09:10:00  33000000000000  50260  50375  50230  50260         5491         2189
+    2  2015.08.12  09:20:00  33600000000000  50265  50305  50120  50140         4973         2142
+    3  2015.08.12  09:30:00  34200000000000  50145  50155  49585  49665        15082         6077
+    4  2015.08.12  09:40:00  34800000000000  49675  49685  49550  49650         6575         2504
 
     """
     df1 = pandas.read_csv(file1)
@@ -268,6 +276,48 @@ def filter_overlapping_files_dfs(file1, file2):
     return df1_filter, df2_filter
 
 
+def match_bars(dt1, dt2, dt_delta):
+    """Map the bars of a finer series onto the bars of a coarser one.
+
+    A fine bar belongs to the coarse bar starting at `dt`, when it is between `dt` and
+    `dt + dt_delta` (both included).
+
+    Parameters
+    ----------
+    dt1: numpy.ndarray
+        sorted datetimes of the finer series.
+    dt2: numpy.ndarray
+        sorted datetimes of the coarser series.
+    dt_delta: numpy.timedelta64
+        difference between the periods of the series.
+
+    Returns
+    -------
+    match1: numpy.ndarray
+        position of the coarse bar of each fine bar, -1 when there is none.
+    offsets2: numpy.ndarray
+        (m, 2) array with the [start, end) positions of the fine bars of each coarse bar.
+
+    Examples
+    --------
+    >>> dt1 = np.array(["2015-08-12T09:00", "2015-08-12T09:05", "2015-08-12T09:12"], dtype="datetime64[ns]")
+    >>> dt2 = np.array(["2015-08-12T09:00", "2015-08-12T09:10"], dtype="datetime64[ns]")
+    >>> match_bars(dt1, dt2, np.timedelta64(9, "m"))
+    (array([0, 0, 1]), array([[0, 2], [2, 3]]))
+
+    """
+    dt1 = np.asarray(dt1)
+    dt2 = np.asarray(dt2)
+    offsets2 = np.stack([np.searchsorted(dt1, dt2, side="left"),
+                         np.searchsorted(dt1, dt2 + dt_delta, side="right")], axis=1)
+
+    match1 = np.searchsorted(dt2, dt1, side="right") - 1
+    matched = match1 >= 0
+    matched[matched] = dt1[matched] <= dt2[match1[matched]] + dt_delta
+    match1[~matched] = -1
+    return match1, offsets2
+
+
 def filter_time_match(file1, file2):
     """Create index match for given files.
 
@@ -280,8 +330,10 @@ def filter_time_match(file1, file2):
 
     Returns
     -------
-    time_match_df1: pandas.core.series.Series
-    time_match_df2: pandas.core.series.Series
+    time_match_df1: numpy.ndarray
+        row of df2 matching each row of df1, -1 when there is none.
+    time_match_df2: numpy.ndarray
+        (len(df2), 2) array with the [start, end) rows of df1 matching each row of df2.
 
     Examples
     --------
@@ -289,31 +341,78 @@ def filter_time_match(file1, file2):
     >>> file2 = './data/WIN$N_10M_2013.11.08_2021.01.22_.csv'
     >>> time_match_df1, time_match_df2 = filter_time_match(file1, file2)
     >>> print(time_match_df1)
-    (0, 0) (1, 0) (2, 0) (3, 0) (4, 0) (5, 0) (6, 0) (7, 0) (8, 0) (9, 0) (10, 1) (11, 1) (12, 1)...
+    [0 0 0 0 0 0 0 0 0 0 1 1 1 ...]
     >>> print(time_match_df2)
-    (0, (0, 1, 2, 3, 4, 5, 6, 7, 8, 9)) (1, (10, 11, 12, 13, 14, 15, 16, 17, 18, 19)) ...
+    [[ 0 10] [10 20] ...]
 
     """
-    freq1 = int(file1.split(".")[1].split("_")[1].replace("M", ""))
-    freq2 = int(file2.split(".")[1].split("_")[1].replace("M", ""))
+    freq1 = int(parse_filename(file1)[1].replace("M", ""))
+    freq2 = int(parse_filename(file2)[1].replace("M", ""))
     df1, df2 = filter_overlapping_files_dfs(file1, file2)
 
-    dt1 = pandas.to_datetime(df1["date"] + " " + df1["hour"])
-    dt2 = pandas.to_datetime(df2["date"] + " " + df2["hour"])
+    dt1 = parse_datetimes(df1["date"], df1["hour"]).astype("datetime64[ns]")
+    dt2 = parse_datetimes(df2["date"], df2["hour"]).astype("datetime64[ns]")
 
-    dt_delta = datetime.timedelta(minutes=freq2 - freq1)
-    time_match_df1 = dt1.copy()
-    time_match_df2 = dt2.copy()
-    for idx, dt in dt2.items():
-        match = dt1[(dt1 >= dt) & (dt1 <= dt + dt_delta)]
-        time_match_df1[match.index] = idx
-        time_match_df2[idx] = 0
-        time_match_df2[idx] = tuple(match.index)
-
-    time_match_df2[time_match_df2.apply(len) != 10]
+    dt_delta = np.timedelta64(freq2 - freq1, "m")
+    time_match_df1, time_match_df2 = match_bars(dt1, dt2, dt_delta)
     return time_match_df1, time_match_df2
 
 
+def classify_candles(df1, df2, offsets2, min_bars=3):
+    """Candle type of every coarse bar, from the order of its high and low in the fine bars.
+
+    The high (low) of a coarse bar is located at the first fine bar with the same high (low).
+    Coarse bars with less than `min_bars` fine bars, or whose high or low is not found in
+    them, are labeled 0, as well as the ones with close equal to open.
+
+    Parameters
+    ----------
+    df1: pandas.Dataframe
+        finer frequency data.
+    df2: pandas.Dataframe
+        coarser frequency data.
+    offsets2: numpy.ndarray
+        (len(df2), 2) array with the [start, end) rows of df1 of each row of df2.
+    min_bars: int
+
+    Returns
+    -------
+    candles: numpy.ndarray
+        candle type of each row of df2, see `compare_candles_frequencies`.
+
+    """
+    offsets2 = np.asarray(offsets2).reshape(-1, 2)
+    candles = np.zeros(len(offsets2), dtype=np.int64)
+    lengths = offsets2[:, 1] - offsets2[:, 0]
+    groups = np.flatnonzero(lengths >= max(min_bars, 1))
+    if len(groups) == 0:
+        return candles
+
+    # fine rows of the selected coarse bars, contiguous per coarse bar
+    lengths = lengths[groups]
+    group_starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    rows = np.arange(lengths.sum()) - np.repeat(group_starts - offsets2[groups, 0], lengths)
+    row_group = np.repeat(groups, lengths)
+
+    # first position of the coarse high/low among the fine rows, len(rows) when missing
+    positions = np.arange(len(rows))
+    missing = len(rows)
+    high1 = df1["high"].values[rows]
+    low1 = df1["low"].values[rows]
+    i_high = np.minimum.reduceat(np.where(high1 == df2["high"].values[row_group], positions, missing), group_starts)
+    i_low = np.minimum.reduceat(np.where(low1 == df2["low"].values[row_group], positions, missing), group_starts)
+    found = (i_high < missing) & (i_low < missing)
+
+    p_open = df2["open"].values[groups]
+    p_close = df2["close"].values[groups]
+    up = found & (p_close > p_open)
+    down = found & (p_close < p_open)
+    types = np.select([up & (i_high > i_low), down & (i_high < i_low), up & (i_high < i_low), down & (i_high > i_low)],
+                      [1, 2, 3, 4], default=0)
+    candles[groups] = types
+    return candles
+
+
 def compare_candles_frequencies(file1, file2):
     """Comparar arquivos sobrepostos de frequencias diferentes.
 
@@ -333,15 +432,15 @@ def compare_candles_frequencies(file1, file2):
     Returns
     -------
     candles: pandas.core.series.Series
-        series with candles types.
+        series with the int candles types.
     df1: pandas.Dtaframe
         dataframe with smaller frequency data.
     df2: pandas.Dtaframe
         dataframe with larger frequency data.
-    time_match_df1: pandas.core.series.Series
-        series with match index for smaller frequency dataset
-    time_match_df2: pandas.core.series.Series
-        series with match index for larger frequency dataset
+    time_match_df1: numpy.ndarray
+        row of df2 matching each row of df1, -1 when there is none.
+    time_match_df2: numpy.ndarray
+        [start, end) rows of df1 matching each row of df2.
 
     Examples
     --------
@@ -365,35 +464,14 @@ def compare_candles_frequencies(file1, file2):
     3  2015.08.12  09:30:00  50145  50155  49585  49665        15082         6077
     4  2015.08.12  09:40:00  49675  49685  49550  49650         6575         2504
     >>> print(time_match_df1)
-    (0, 0) (1, 0) (2, 0) (3, 0) (4, 0) (5, 0) (6, 0) (7, 0) (8, 0) (9, 0) (10, 1) (11, 1) (12, 1) (13, 1) (14, 1)...
+    [0 0 0 0 0 0 0 0 0 0 1 1 1 1 1 ...]
     >>> print(time_match_df2)
-    (0, (0, 1, 2, 3, 4, 5, 6, 7, 8, 9)) (1, (10, 11, 12, 13, 14, 15, 16, 17, 18, 19)) ...
+    [[ 0 10] [10 20] ...]
 
     """
     df1, df2 = filter_overlapping_files_dfs(file1, file2)
     time_match_df1, time_match_df2 = filter_time_match(file1, file2)
-    candles = time_match_df2.copy()
-    for idx, row in df2.iterrows():
-        if (time_match_df2[idx] == ()) or (len(time_match_df2[idx]) < 3):
-            candles[idx] = 0
-            continue
-        p_open, p_high, p_low, p_close = row[["open", "high", "low", "close"]]
-        df1_sample = df1.loc[list(time_match_df2[idx]), :]
-        if (p_high not in list(df1_sample["high"])) or (p_low not in list(df1_sample["low"])):
-            candles[idx] = 0
-            continue
-        i_high = df1_sample[df1_sample["high"] == p_high].index[0]
-        i_low = df1_sample[df1_sample["low"] == p_low].index[0]
-        if (p_close > p_open) & (i_high > i_low):
-            candles[idx] = 1
-        elif (p_close < p_open) & (i_high < i_low):
-            candles[idx] = 2
-        elif (p_close > p_open) & (i_high < i_low):
-            candles[idx] = 3
-        elif (p_close < p_open) & (i_high > i_low):
-            candles[idx] = 4
-        else:
-            candles[idx] = 0
+    candles = pandas.Series(classify_candles(df1, df2, time_match_df2), index=df2.index)
     # time_match_df2.value_counts()
     return candles, df1, df2, time_match_df1, time_match_df2
 
@@ -404,7 +482,8 @@ def format_df_candles(df, time_match_df, candles):
     Parameters
     ----------
     df: pandas.Dataframe
-    time_match_df: pandas.core.series.Series
+    time_match_df: numpy.ndarray
+        row of the candles matching each row of `df`, -1 when there is none.
     candles: pandas.core.series.Series
     candle_type: int
 
@@ -435,33 +514,68 @@ def format_df_candles(df, time_match_df, candles):
     [12 rows x 11 columns]
 
     """
-    ids = [0]
-    for idx, value in enumerate(time_match_df.diff()[:-1]):
-        if value != 0:
-            ids.insert(idx, 0)
-        else:
-            ids.insert(idx, ids[idx - 1] + 1)
-    df["id"] = ids
+    time_match_df = np.asarray(time_match_df)
+    # position of each row inside its run of rows matching the same candle
+    positions = np.arange(len(time_match_df))
+    starts = np.ones(len(time_match_df), dtype=bool)
+    starts[1:] = time_match_df[1:] != time_match_df[:-1]
+    df["id"] = positions - np.maximum.accumulate(np.where(starts, positions, 0))
     df["match"] = time_match_df
-    df["candle"] = [candles[value] for value in df["match"]]
+    df["candle"] = np.where(time_match_df >= 0, np.asarray(candles)[time_match_df], 0)
     return df
 
 
-def candles_analysis(files):
+def candles_counts(file1, file2):
+    """Number of candles of each type in `CANDLE_TYPES` for a pair of overlapping files."""
+    candles = compare_candles_frequencies(file1, file2)[0]
+    return np.bincount(candles.values, minlength=len(CANDLE_TYPES))
+
+
+def candles_analysis(files, workers=None, output_path="./samples/candles_analisys.csv"):
+    """Count the candles types of every pair of overlapping files.
+
+    Parameters
+    ----------
+    files: dict
+         dict with frequencies as keys and list of files as values.
+    workers: int
+        number of processes comparing file pairs, None to use all cores and 1 to run serially.
+    output_path: str
+        CSV filepath to save the output, None to skip it.
+
+    Returns
+    -------
+    df: pandas.Dataframe
+        candles types counts, with (frequencies, date_range) as index and the types as columns.
+
+    Examples
+    --------
+    >>> files = list_data_files()
+    >>> candles_analysis(files, workers=4)
+                                       0     1     2    3    4
+    frequencies date_range
+    1M_10M      2015.08.12_2015.12.30  194  1786  1681  232  177
+    ...
+
+    """
     dict_files = filter_overlapping_files(files)
-    df = pandas.DataFrame()
-    for key, values in dict_files.items():
-        for value in values:
-            date_range = "_".join(value[0].split("_")[2:4])
-            file1, file2 = value
-            candles, df1, df2, time_match_df1, time_match_df2 = compare_candles_frequencies(file1, file2)
-            candles_counts = candles.value_counts()
-            candles_index = pandas.Series([key, date_range], index=["frequencies", "date_range"])
-            candles_index = candles_index.append(candles_counts)
-            df = df.append(candles_index.T, ignore_index=True)
-
-    df = df.set_index(["frequencies", "date_range"])
-    df.to_csv("./samples/candles_analisys.csv")
+    pairs = [(key, file1, file2) for key, values in dict_files.items() for file1, file2 in values]
+    files1 = [file1 for key, file1, file2 in pairs]
+    files2 = [file2 for key, file1, file2 in pairs]
+
+    if workers == 1:
+        counts = list(map(candles_counts, files1, files2))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            counts = list(executor.map(candles_counts, files1, files2))
+
+    index = pandas.MultiIndex.from_tuples(
+        [(key, "_".join(os.path.basename(file1).split("_")[2:4])) for key, file1, file2 in pairs],
+        names=["frequencies", "date_range"])
+    counts = np.stack(counts) if len(counts) else np.zeros((0, len(CANDLE_TYPES)), dtype=np.int64)
+    df = pandas.DataFrame(counts, index=index, columns=CANDLE_TYPES)
+    if output_path is not None:
+        df.to_csv(output_path)
     return df
 
 
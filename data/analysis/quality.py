@@ -0,0 +1,148 @@
+""" Data quality scanner for OHLCV source files
+
+Builds a per-day report of the issues found in the bars of a source file:
+
+    missing         bars of the session grid (every step from the session start up to its
+                    close) without data, also at the start and end of the day; shorter sessions,
+                    such as the days before holidays, show their early close as missing bars
+    duplicated      bars with the same timestamp as the previous one
+    zero_volume     bars with zero real volume
+    invalid_ohlc    bars with high < max(open, close), low > min(open, close) or high < low
+    out_of_session  bars starting before the session start, or at/after its close
+
+All checks run over the columnar arrays of `src/helpers/store.py` at once, and
+are summed per day with the day index of the store.
+
+Usage:
+    python -m data.analysis.quality ./data/WIN$N_1M_2015.08.12_2015.12.30_.csv --issues
+"""
+import argparse
+import numpy as np
+import pandas
+
+from src.helpers.store import read_store
+from src.helpers.datafeed import source_step
+from src.helpers.timeparse import parse_hours, NS_PER_DAY
+from data.analysis.catalog import format_days
+
+QUALITY_COLUMNS = ["bars", "missing", "duplicated", "zero_volume", "invalid_ohlc", "out_of_session"]
+# B3 mini index session: first bar at 09:00, last 1 minute bar at 17:54
+SESSION = ("09:00:00", "17:55:00")
+
+
+def format_hours(time_of_day):
+    """"HH:MM:SS" strings of nanoseconds since midnight."""
+    return list(pandas.to_datetime(np.asarray(time_of_day, dtype=np.int64)).strftime("%H:%M:%S"))
+
+
+def scan_arrays(arrays, session=SESSION, step=None):
+    """Per-day quality report of the columnar arrays of a source file.
+
+    Parameters
+    ----------
+    arrays: dict
+        output of `read_store`, with the "days" and "offsets" index.
+    session: tuple
+        "HH:MM:SS" session start and close: bars start from the start (included) and before
+        the close (excluded), so the grid of every bar period ends at its last bar before it.
+    step: int
+        bar period in nanoseconds, None to infer it from the data.
+
+    Returns
+    -------
+    report: pandas.Dataframe
+        `QUALITY_COLUMNS` counts per day, plus the "first" and "last" bar hours, indexed by "date".
+
+    Examples
+    --------
+    >>> report = scan_arrays(read_store("./data/WIN$N_1M_2015.08.12_2015.12.30_.csv"))
+    >>> report.loc["2015.08.12"]
+    bars                   535
+    missing                  0
+    ...
+
+    """
+    datetimes = np.asarray(arrays["datetime"])
+    offsets = np.asarray(arrays["offsets"])
+    starts = offsets[:-1]
+    step = source_step(datetimes) if step is None else step
+
+    days = datetimes // NS_PER_DAY
+    same_day = np.zeros(len(datetimes), dtype=bool)
+    same_day[1:] = days[1:] == days[:-1]
+    gaps = np.zeros(len(datetimes), dtype=np.int64)
+    gaps[1:] = np.diff(datetimes)
+
+    opens, highs, lows, closes = (np.asarray(arrays[column]) for column in ["open", "high", "low", "close"])
+    time_of_day = datetimes - days * NS_PER_DAY
+    session_start, session_end = parse_hours(list(session))
+
+    duplicated = same_day & (gaps == 0)
+    in_session = (time_of_day >= session_start) & (time_of_day < session_end)
+    # bars filling a slot of the session grid, the missing ones are the empty slots
+    on_grid = in_session & ~duplicated & ((time_of_day - session_start) % max(step, 1) == 0)
+
+    checks = {
+        "bars": np.ones(len(datetimes), dtype=np.int64),
+        "filled": on_grid,
+        "duplicated": duplicated,
+        "zero_volume": np.asarray(arrays["volume"]) == 0,
+        "invalid_ohlc": ((highs < np.maximum(opens, closes)) | (lows > np.minimum(opens, closes)) | (highs < lows)),
+        "out_of_session": ~in_session,
+    }
+    sums = {}
+    for column, values in checks.items():
+        values = values.astype(np.int64)
+        sums[column] = np.add.reduceat(values, starts) if len(starts) else values
+
+    slots = -((session_start - session_end) // step) if step > 0 else 0
+    sums["missing"] = np.maximum(slots - sums.pop("filled"), 0)
+    report = {column: sums[column] for column in QUALITY_COLUMNS}
+    report["first"] = format_hours(time_of_day[starts])
+    report["last"] = format_hours(time_of_day[offsets[1:] - 1])
+    return pandas.DataFrame(report, index=pandas.Index(format_days(arrays["days"]), name="date"))
+
+
+def scan_file(datapath, session=SESSION):
+    """Per-day quality report of a source file, see `scan_arrays`."""
+    return scan_arrays(read_store(datapath), session=session)
+
+
+def issues(report):
+    """Days of a report with at least one issue."""
+    return report[report[QUALITY_COLUMNS[1:]].sum(axis=1) > 0]
+
+
+def parse_args(pargs=None):
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        description='Per-day data quality report of OHLCV source files')
+
+    parser.add_argument('files', nargs='+',
+                        help='CSV source files to scan')
+    parser.add_argument('--session', nargs=2, default=list(SESSION),
+                        metavar=('START', 'CLOSE'),
+                        help='Session start and close, HH:MM:SS, bars start from START and before CLOSE')
+    parser.add_argument('--issues', action='store_true', default=False,
+                        help='Report only the days with at least one issue')
+    parser.add_argument('--output', required=False, default=None,
+                        help='CSV filepath to save the report')
+
+    return parser.parse_args(pargs)
+
+
+def main(pargs=None):
+    args = parse_args(pargs)
+    reports = {file: scan_file(file, session=tuple(args.session)) for file in args.files}
+    report = pandas.concat(reports, names=["file"])
+    if args.issues:
+        report = issues(report)
+
+    print(report[QUALITY_COLUMNS].groupby(level="file").sum().to_string())
+    if args.output is not None:
+        report.to_csv(args.output)
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,349 @@
+""" Tick to bar aggregator
+
+Builds OHLCV bars, plus "tick_volume" and "spread", from the tick exports of
+MetaTrader ("Symbols > Ticks > Export Ticks"), a tab separated file such as:
+
+    <DATE>	<TIME>	<BID>	<ASK>	<LAST>	<VOLUME>	<FLAGS>
+    2021.01.22	09:00:00.137	118630	118635	118635	3	88
+
+Only the trades (ticks with a <LAST> price) make the bars, while the bid/ask
+quotes are carried forward to measure the spread. A new bar starts when the
+time, tick count, traded volume or price range threshold is crossed, and bars
+never mix ticks of different days, as in `src/helpers/datafeed.resample_arrays`.
+
+Bars are written with the layout of the MetaTrader bar exports, so they can
+be used as `--data` by `src/helpers/datafeed.py` like the other source files:
+
+    date,hour,open,high,low,close,real_volume,tick_volume,spread
+
+The "hour" column keeps whole seconds, so thresholds that start more than one
+bar in the same second are rejected by `write_bars`: the pipeline would keep
+only one bar of each (date, hour).
+
+Usage:
+    python -m data.analysis.ticks "./data/WIN$N_ticks.csv" --by time --threshold 15 --output ./data
+"""
+import os
+import argparse
+import numpy as np
+import pandas
+
+from src.helpers.timeparse import parse_dates, parse_hours, NS_PER_DAY, NS_PER_SECOND
+from data.analysis.catalog import format_days
+
+BAR_COLUMNS = ["date", "hour", "open", "high", "low", "close", "real_volume", "tick_volume", "spread"]
+# suffix of the frequency in the filenames of the bars built by each threshold
+BAR_FREQS = {"time": "S", "tick": "T", "volume": "V", "range": "R"}
+# first width of the windows searched for the end of a range bar, doubled until found
+RANGE_WINDOW = 64
+
+
+def read_ticks(datapath):
+    """Trades of a MetaTrader tick export, as sorted columnar arrays.
+
+    Parameters
+    ----------
+    datapath: str
+        tick export filepath, tab or comma separated, with the "<DATE>", "<TIME>", "<LAST>" and
+        "<VOLUME>" columns, and optionally "<BID>" and "<ASK>" (brackets and case are ignored).
+
+    Returns
+    -------
+    ticks: dict
+        "datetime" (int64 epoch nanoseconds), "price", "volume" and "spread" (ask - bid of the
+        last quotes, NaN without quotes) arrays, one row per trade.
+
+    """
+    with open(datapath, "r") as file:
+        header = file.readline()
+    sep = "\t" if "\t" in header else ","
+    names = [name.strip().strip("<>").lower() for name in header.split(sep)]
+
+    usecols = [name for name in ["date", "time", "bid", "ask", "last", "volume"] if name in names]
+    dataframe = pandas.read_csv(datapath, sep=sep, header=0, names=names, usecols=usecols,
+                                dtype={"date": str, "time": str})
+
+    datetimes = parse_dates(dataframe["date"]) + parse_times(dataframe["time"])
+    order = np.argsort(datetimes, kind="mergesort")
+    datetimes = datetimes[order]
+    prices = dataframe["last"].to_numpy(dtype=np.float64)[order]
+
+    spreads = np.full(len(datetimes), np.nan)
+    if ("bid" in usecols) and ("ask" in usecols):
+        spreads = carry_forward(dataframe["ask"].to_numpy(dtype=np.float64)[order]) - \
+            carry_forward(dataframe["bid"].to_numpy(dtype=np.float64)[order])
+
+    # quotes only update bid/ask, trades have a last price
+    trades = np.isfinite(prices) & (prices > 0)
+    volumes = np.nan_to_num(dataframe["volume"].to_numpy(dtype=np.float64)[order])
+    return {"datetime": datetimes[trades],
+            "price": prices[trades],
+            "volume": volumes[trades],
+            "spread": spreads[trades]}
+
+
+def parse_times(times):
+    """Nanoseconds since midnight of "HH:MM:SS" or "HH:MM:SS.mmm" times.
+
+    Only the distinct "HH:MM:SS" prefixes are parsed, the milliseconds are read from the bytes.
+
+    Examples
+    --------
+    >>> parse_times(["09:00:00.137", "09:00:01"]) // 10**6
+    array([32400137, 32401000])
+
+    """
+    chars = np.asarray(times).astype("S12").view(np.uint8).reshape(-1, 12)
+    seconds = np.ascontiguousarray(chars[:, :8]).view(np.uint64).ravel()
+    codes, uniques = pandas.factorize(seconds)
+    hours = parse_hours(np.asarray(uniques, dtype=np.uint64).view("S8").astype(str))[codes]
+
+    digits = chars[:, 9:12].astype(np.int64) - ord("0")
+    millis = np.where((chars[:, 8] == ord(".")) & np.all((digits >= 0) & (digits <= 9), axis=1),
+                      digits[:, 0] * 100 + digits[:, 1] * 10 + digits[:, 2], 0)
+    return hours + millis * (NS_PER_SECOND // 1000)
+
+
+def carry_forward(values):
+    """Last finite value up to each position, NaN before the first one."""
+    idx = np.where(np.isfinite(values) & (values > 0), np.arange(len(values)), -1)
+    idx = np.maximum.accumulate(idx) if len(idx) else idx
+    return np.where(idx >= 0, values[np.maximum(idx, 0)], np.nan)
+
+
+def bar_starts(ticks, by="time", threshold=60):
+    """First tick of each bar.
+
+    Parameters
+    ----------
+    ticks: dict
+        output of `read_ticks`.
+    by: str
+        "time" for bars of `threshold` seconds (starting at multiples of it from midnight),
+        "tick" for bars of `threshold` trades, "volume" for bars closed once their traded
+        volume reaches `threshold`, "range" for bars whose high - low stays within
+        `threshold` price points (a new bar starts at the trade that would exceed it).
+    threshold: int
+        seconds, trades, volume or price points of each bar.
+
+    Returns
+    -------
+    starts: numpy.ndarray
+        row of the first tick of each bar, all bars restart at the first tick of each day.
+
+    """
+    if threshold <= 0:
+        raise ValueError("threshold must be positive, got {}".format(threshold))
+    if by not in BAR_FREQS:
+        raise ValueError("by must be one of {}, got {}".format(list(BAR_FREQS), by))
+    datetimes = ticks["datetime"]
+    if len(datetimes) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    days = datetimes // NS_PER_DAY
+    new_day = np.diff(days, prepend=days[0] - 1) != 0
+    day_starts = np.flatnonzero(new_day)
+
+    # volume and range bars depend on where the previous bar closed, they are searched one bar at a time
+    if by == "volume":
+        return volume_starts(ticks["volume"], day_starts, threshold)
+    if by == "range":
+        return range_starts(ticks["price"], day_starts, threshold)
+
+    if by == "time":
+        period = int(threshold) * NS_PER_SECOND
+        keys = (datetimes - days * NS_PER_DAY) // period
+    else:
+        # position of each tick since the first one of its day
+        day_first = np.repeat(day_starts, np.diff(np.append(day_starts, len(days))))
+        keys = (np.arange(len(datetimes)) - day_first) // int(threshold)
+
+    return np.flatnonzero(new_day | (np.diff(keys, prepend=keys[0] - 1) != 0))
+
+
+def volume_starts(volumes, day_starts, threshold):
+    """First tick of the bars closed at the trade where their own volume reaches `threshold`.
+
+    The volume is counted from the start of each bar, so every bar but the last one of each
+    day has at least `threshold` volume.
+
+    Examples
+    --------
+    >>> volume_starts(np.array([400, 200, 450, 100, 500]), np.array([0]), 500)
+    array([0, 2, 4])
+
+    """
+    cumulative = np.cumsum(volumes)
+    day_ends = np.append(day_starts[1:], len(volumes))
+    starts = []
+    for start, end in zip(day_starts, day_ends):
+        while start < end:
+            starts.append(start)
+            before = cumulative[start - 1] if start else 0
+            # volumes are not negative, so the cumulative volume is sorted
+            start = np.searchsorted(cumulative, before + threshold, side="left") + 1
+    return np.asarray(starts, dtype=np.int64)
+
+
+def range_starts(prices, day_starts, threshold):
+    """First tick of the bars whose high - low stays within `threshold`.
+
+    Examples
+    --------
+    >>> range_starts(np.array([100, 103, 98, 105, 106, 100]), np.array([0]), 5)
+    array([0, 3, 5])
+
+    """
+    day_ends = np.append(day_starts[1:], len(prices))
+    starts = []
+    for start, end in zip(day_starts, day_ends):
+        while start < end:
+            starts.append(start)
+            width = RANGE_WINDOW
+            while True:
+                stop = min(start + width, end)
+                window = prices[start:stop]
+                over = np.flatnonzero(np.maximum.accumulate(window) - np.minimum.accumulate(window) > threshold)
+                if len(over):
+                    start += over[0]
+                    break
+                if stop == end:
+                    start = end
+                    break
+                width *= 2
+    return np.asarray(starts, dtype=np.int64)
+
+
+def aggregate_ticks(ticks, by="time", threshold=60):
+    """OHLCV bars of the trades, see `bar_starts` for the thresholds.
+
+    Returns
+    -------
+    bars: dict
+        "datetime" (of the bar start for time bars, of its first trade otherwise), "open", "high",
+        "low", "close", "real_volume", "tick_volume" (trades) and "spread" (smallest of the bar) arrays.
+
+    Examples
+    --------
+    >>> bars = aggregate_ticks(read_ticks("./data/WIN$N_ticks.csv"), by="volume", threshold=500)
+
+    """
+    starts = bar_starts(ticks, by=by, threshold=threshold)
+    ends = np.append(starts[1:], len(ticks["datetime"]))
+    datetimes = ticks["datetime"][starts]
+    if by == "time":
+        period = int(threshold) * NS_PER_SECOND
+        datetimes = datetimes // period * period
+
+    if len(starts) == 0:
+        empty = np.zeros(0)
+        return {"datetime": datetimes, "open": empty, "high": empty, "low": empty, "close": empty,
+                "real_volume": empty, "tick_volume": np.zeros(0, dtype=np.int64), "spread": empty}
+
+    prices = ticks["price"]
+    return {"datetime": datetimes,
+            "open": prices[starts],
+            "high": np.maximum.reduceat(prices, starts),
+            "low": np.minimum.reduceat(prices, starts),
+            "close": prices[ends - 1],
+            "real_volume": np.add.reduceat(ticks["volume"], starts),
+            "tick_volume": ends - starts,
+            "spread": np.fmin.reduceat(ticks["spread"], starts)}
+
+
+def format_hours(datetimes):
+    """"HH:MM:SS" strings of epoch nanoseconds, the fraction of second is dropped."""
+    seconds = (datetimes % NS_PER_DAY) // NS_PER_SECOND
+    codes, uniques = pandas.factorize(seconds)
+    uniques = np.asarray(uniques)
+    labels = np.char.add(np.char.add(np.char.zfill((uniques // 3600).astype(str), 2), ":"),
+                         np.char.add(np.char.add(np.char.zfill((uniques // 60 % 60).astype(str), 2), ":"),
+                                     np.char.zfill((uniques % 60).astype(str), 2)))
+    return labels[codes]
+
+
+def bars_dataframe(bars):
+    """DataFrame of the bars with the columns of the MetaTrader bar exports."""
+    codes, days = pandas.factorize(bars["datetime"] // NS_PER_DAY)
+    dataframe = pandas.DataFrame({"date": np.asarray(format_days(days), dtype=object)[codes],
+                                  "hour": format_hours(bars["datetime"])})
+    for column in BAR_COLUMNS[2:]:
+        values = np.asarray(bars[column])
+        finite = values[np.isfinite(values)]
+        # prices and volumes of the exports are integers whenever possible
+        if np.array_equal(finite, np.round(finite)) and (len(finite) == len(values)):
+            values = values.astype(np.int64)
+        dataframe[column] = values
+    return dataframe
+
+
+def bars_filename(symbol, by, threshold, bars):
+    """Filename of the bars, following the {symbol}_{freq}_{first}_{last}_.csv convention.
+
+    Time bars of whole minutes keep the "{N}M" frequency of the MetaTrader exports.
+
+    Examples
+    --------
+    >>> bars_filename("WIN$N", "time", 300, bars)
+    'WIN$N_5M_2021.01.04_2021.01.22_.csv'
+
+    """
+    if (by == "time") and (threshold % 60 == 0):
+        freq = "{}M".format(int(threshold) // 60)
+    else:
+        freq = "{}{}".format(int(threshold), BAR_FREQS[by])
+    first, last = format_days(bars["datetime"][[0, -1]] // NS_PER_DAY) if len(bars["datetime"]) else ["", ""]
+    return "{}_{}_{}_{}_.csv".format(symbol, freq, first, last)
+
+
+def write_bars(bars, filepath):
+    """Write the bars as a MetaTrader bar export CSV, loadable by `src/helpers/datafeed.py`.
+
+    Raises a ValueError if two bars start in the same second, since the (date, hour) key of
+    the exports could not tell them apart.
+    """
+    seconds = bars["datetime"] // NS_PER_SECOND
+    repeated = np.flatnonzero(np.diff(seconds) == 0)
+    if len(repeated):
+        raise ValueError("{} bars start in the same second as the previous one (first at {} {}), "
+                         "use a larger threshold".format(len(repeated),
+                                                         *format_days(seconds[[repeated[0]]] // 86400),
+                                                         format_hours(bars["datetime"][[repeated[0]]])[0]))
+    bars_dataframe(bars).to_csv(filepath, index=False)
+    return filepath
+
+
+def parse_args(pargs=None):
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        description='Aggregate MetaTrader tick exports into OHLCV bars')
+
+    parser.add_argument('files', nargs='+',
+                        help='Tick export files')
+    parser.add_argument('--by', default='time', choices=list(BAR_FREQS),
+                        help='Threshold that closes each bar')
+    parser.add_argument('--threshold', type=int, default=60,
+                        help=('Seconds (time), trades (tick), traded volume (volume) or high - low\n'
+                              'price points (range) of each bar'))
+    parser.add_argument('--symbol', default=None,
+                        help='Symbol of the output filenames, the first "_" field of the tick filename if not set')
+    parser.add_argument('--output', default='./data',
+                        help='Folder to save the bars')
+
+    return parser.parse_args(pargs)
+
+
+def main(pargs=None):
+    args = parse_args(pargs)
+    filepaths = []
+    for file in args.files:
+        bars = aggregate_ticks(read_ticks(file), by=args.by, threshold=args.threshold)
+        symbol = args.symbol or os.path.basename(file).split("_")[0]
+        filepath = os.path.join(args.output, bars_filename(symbol, args.by, args.threshold, bars))
+        filepaths.append(write_bars(bars, filepath))
+        print(filepath, len(bars["datetime"]), "bars")
+    return filepaths
+
+
+if __name__ == '__main__':
+    main()
@@ -41,6 +41,19 @@ def parse_args(pargs=None):
                         help='Do not use header rows')
     parser.add_argument('--noprint', action='store_true', default=True,
                         help='Print the dataframe')
+    parser.add_argument('--no-datacache', action='store_true', default=False,
+                        help='Do not read/write the columnar cache of the data file')
+    parser.add_argument('--resample', required=False, type=int, default=None,
+                        help=('Resample the data to bars of this number of minutes, a missing\n'
+                              '{symbol}_{N}M data file is resampled from the finest one covering its dates'))
+    parser.add_argument('--compact', required=False, default=None, choices=['int32', 'int16'],
+                        help=('Keep the data in memory as int32 prices (or int16 ticks from a\n'
+                              'daily base) and uint32 volumes, expanding only each window'))
+    parser.add_argument('--streaming', nargs='?', type=int, required=False, default=None,
+                        const=2 ** 16, metavar='CHUNKSIZE',
+                        help=('Stream the data from the columnar store in chunks of this number of\n'
+                              'bars, without preload and with exactbars (1 if unset), to keep the\n'
+                              'memory bounded on long histories'))
     parser.add_argument('--writercsv', '-wcsv', action='store_true',
                         help='Tell the writer to produce a csv stream')
 
@@ -75,6 +88,9 @@ def parse_args(pargs=None):
                         help='Do not optimize data preloading in optimization')
     parser.add_argument('--no-optreturn', action='store_true', required=False,
                         help='Do not optimize the returned values to save time')
+    parser.add_argument('--sharedmem', action='store_true', required=False,
+                        help=('Publish the data in shared memory once, and let the optimization\n'
+                              'workers attach to it instead of receiving a pickled copy'))
     # ## RSI
     # parser.add_argument('--period_rsi_low', type=int, default=10, required=False,
     #                     help='RSI period range to optimize')
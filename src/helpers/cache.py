@@ -0,0 +1,138 @@
+""" In-process cache of datasets read from the source files
+
+`main_opt.main` and `main_signals.main` run one backtest per window and
+signal, all of them over the same `args.data` file. The datasets read from it
+are kept here, keyed by (path, columns, dtype), so each file is parsed at
+most once per process. Entries are evicted in least recently used order once
+the cache holds more than `maxbytes`, and are dropped when the source file
+size or mtime changes.
+"""
+import os
+import collections
+import numpy as np
+
+
+def dataset_nbytes(value):
+    """Approximate memory used by an array, a DataFrame or a dict/list of them.
+
+    Memory-mapped arrays are counted in full, even if their pages are shared with the OS file cache.
+    """
+    if isinstance(value, dict):
+        return sum(dataset_nbytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(dataset_nbytes(item) for item in value)
+    if hasattr(value, "memory_usage"):
+        return int(np.sum(value.memory_usage(deep=True)))
+    return int(getattr(value, "nbytes", 0))
+
+
+class DatasetCache(object):
+    """LRU cache of datasets with a memory budget.
+
+    Parameters
+    ----------
+    maxbytes: int
+        memory budget, the least recently used datasets are evicted above it.
+
+    Examples
+    --------
+    >>> from src.helpers.store import read_store
+    >>> cache = DatasetCache(maxbytes=512 * 1024 ** 2)
+    >>> arrays = cache.load("./data/WIN$N_30M_2015.08.12_2021.01.22_.csv", loader=read_store)
+    >>> arrays = cache.load("./data/WIN$N_30M_2015.08.12_2021.01.22_.csv", loader=read_store)
+    >>> cache.stats()
+    {'items': 1, 'nbytes': 1206008, 'hits': 1, 'misses': 1, 'evictions': 0}
+
+    """
+
+    def __init__(self, maxbytes=2 * 1024 ** 3):
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = collections.OrderedDict()
+
+    @staticmethod
+    def key(datapath, columns=None, dtype=None):
+        columns = tuple(columns) if columns is not None else None
+        dtype = str(np.dtype(dtype)) if dtype is not None else None
+        return os.path.abspath(datapath), columns, dtype
+
+    @staticmethod
+    def signature(datapath):
+        stat = os.stat(datapath)
+        return stat.st_size, stat.st_mtime_ns
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key, signature=None):
+        """Cached value of `key`, or None if missing or stale."""
+        item = self._items.get(key, None)
+        if item is None:
+            return None
+        value, item_signature, nbytes = item
+        if (signature is not None) and (signature != item_signature):
+            self.pop(key)
+            return None
+        self._items.move_to_end(key)
+        return value
+
+    def put(self, key, value, signature=None):
+        """Store `value`, evicting least recently used entries above `maxbytes`."""
+        self.pop(key)
+        nbytes = dataset_nbytes(value)
+        self._items[key] = (value, signature, nbytes)
+        self.nbytes += nbytes
+        # keep at least the newest entry, even above the budget
+        while (self.nbytes > self.maxbytes) and (len(self._items) > 1):
+            oldest = next(iter(self._items))
+            self.pop(oldest)
+            self.evictions += 1
+        return value
+
+    def pop(self, key):
+        item = self._items.pop(key, None)
+        if item is not None:
+            self.nbytes -= item[2]
+        return item
+
+    def clear(self):
+        self._items.clear()
+        self.nbytes = 0
+
+    def load(self, datapath, columns=None, dtype=None, loader=None):
+        """Cached dataset of a source file, calling `loader(datapath)` on a miss.
+
+        Parameters
+        ----------
+        datapath: str
+            source filepath, its size and mtime invalidate the cached entry.
+        columns: list
+            columns held by the dataset, part of the key.
+        dtype: str
+            dtype of the dataset, part of the key.
+        loader: callable
+            function receiving `datapath` and returning the dataset.
+
+        """
+        key = self.key(datapath, columns, dtype)
+        signature = self.signature(datapath)
+        value = self.get(key, signature)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        return self.put(key, loader(datapath), signature)
+
+    def stats(self):
+        return {"items": len(self._items), "nbytes": self.nbytes, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
+
+
+DATASET_CACHE = DatasetCache()
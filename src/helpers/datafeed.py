@@ -1,14 +1,613 @@
 # from __future__ import (absolute_import, division, print_function, unicode_literals)
 
+import os
+import glob
+import re
+import shutil
 import argparse
+import numpy
 import pandas
 import datetime  # For datetime objects
+from multiprocessing import shared_memory
 # from args import parse_args
 
+from src.helpers.store import read_store, read_source, day_index, slice_rows, NS_PER_DAY, STORE_COLUMNS
+from src.helpers.store import compact_ohlcv, expand_ohlcv, store_path, write_store, load_store, STORE_DIR
+from src.helpers.cache import DATASET_CACHE
+
 # Import the backtrader platform
-# import backtrader as bt
+import backtrader as bt
 # import backtrader.feeds as btfeeds
 
+# backtrader date2num of 1970-01-01, dates are stored as days since 0001-01-01
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+DATA_COLS = ['open', 'high', 'low', 'close', 'volume']
+COMPACT_DTYPES = {"int32": False, "int16": True}
+NS_PER_MINUTE = 60 * 10**9
+# disk budget of the resampled series of each data folder
+RESAMPLE_MAXBYTES = 1024 ** 3
+# bars converted to float64 at a time by StreamingData
+STREAM_CHUNKSIZE = 2 ** 16
+
+
+class NumpyData(bt.feeds.DataBase):
+    """Data feed over contiguous numpy arrays.
+
+    `dataname` is a dict with a "datetime" array, already converted with `date2num`, and
+    "open", "high", "low", "close", "volume" (and optionally "openinterest") arrays of the same
+    length, as returned by `numpydatafeed`.
+
+    With `preload=True` the line buffers are filled with one array copy per line, instead of
+    loading the bars one by one as `bt.feeds.PandasData` does. Bars outside `fromdate`/`todate`
+    are skipped in the same way as the other feeds, except for the `warmup` bars before
+    `fromdate`, which are loaded to prime the indicators (see `warming_up`).
+    """
+    params = (("warmup", 0),)
+
+    def _start_finish(self):
+        super(NumpyData, self)._start_finish()
+        warmup_fromdate(self, self._arrays["datetime"])
+
+    def start(self):
+        super(NumpyData, self).start()
+        self._idx = -1
+        arrays = self.p.dataname
+        length = len(arrays["datetime"])
+        self._arrays = {}
+        for alias in self.getlinealiases():
+            values = arrays.get(alias, None)
+            if values is None:
+                # datafield missing in the stream, like in PandasData
+                values = numpy.full(length, numpy.nan)
+            self._arrays[alias] = numpy.ascontiguousarray(values, dtype=numpy.float64)
+
+    def preload(self):
+        lines = [getattr(self.lines, alias) for alias in self.getlinealiases()]
+        if self._filters or self._tzinput or any(line.bindings or line.extension for line in lines):
+            # let the bar by bar loading handle filters and timezones
+            return super(NumpyData, self).preload()
+
+        dtime = self._arrays["datetime"]
+        start = numpy.searchsorted(dtime, self.fromdate, side="left")
+        stop = numpy.searchsorted(dtime, self.todate, side="right")
+        size = max(stop - start, 0)
+        for alias, line in zip(self.getlinealiases(), lines):
+            line.array.frombytes(self._arrays[alias][start:start + size].data.cast("B"))
+            line.idx += size
+            line.lencount += size
+        self._idx = len(dtime)
+
+        self._last()
+        self.home()
+
+    def _load(self):
+        self._idx += 1
+
+        if self._idx >= len(self._arrays["datetime"]):
+            # exhausted all rows
+            return False
+
+        for alias, values in self._arrays.items():
+            getattr(self.lines, alias)[0] = values[self._idx]
+        return True
+
+
+class StreamingData(bt.feeds.DataBase):
+    """Data feed reading columnar arrays in chunks, for histories larger than the memory.
+
+    `dataname` is a dict with an int64 epoch nanoseconds "datetime" array and the `DATA_COLS`
+    arrays, as returned by `arraysdatafeed`, i.e. memory-mapped from the columnar store. Only
+    `chunksize` bars are converted to float64 at a time, instead of the whole arrays as in
+    `NumpyData`, so with `bt.Cerebro(preload=False, exactbars=1)` (see `streaming_kwargs`) the
+    memory used does not grow with the length of the history. The `warmup` bars before
+    `fromdate` are loaded as in `NumpyData`.
+    """
+    params = (("chunksize", STREAM_CHUNKSIZE), ("warmup", 0))
+
+    def _start_finish(self):
+        super(StreamingData, self)._start_finish()
+        warmup_fromdate(self, self.p.dataname["datetime"])
+
+    def start(self):
+        super(StreamingData, self).start()
+        self._stop = 0
+        self._idx = 0
+        self._chunk = {}
+
+    def _next_chunk(self):
+        arrays = self.p.dataname
+        start = self._stop
+        stop = min(start + max(int(self.p.chunksize), 1), len(arrays["datetime"]))
+        if start >= stop:
+            return False
+
+        self._chunk = {}
+        for alias in self.getlinealiases():
+            values = arrays.get(alias, None)
+            if alias == "datetime":
+                values = date2num(values[start:stop])
+            elif values is None:
+                # datafield missing in the stream, like in PandasData
+                values = numpy.full(stop - start, numpy.nan)
+            else:
+                values = numpy.ascontiguousarray(values[start:stop], dtype=numpy.float64)
+            self._chunk[alias] = values
+        self._stop = stop
+        self._idx = 0
+        return True
+
+    def _load(self):
+        if (self._idx >= len(self._chunk.get("datetime", ()))) and not self._next_chunk():
+            # exhausted all rows
+            return False
+
+        for alias, values in self._chunk.items():
+            getattr(self.lines, alias)[0] = values[self._idx]
+        self._idx += 1
+        return True
+
+
+def warmup_fromdate(data, datetimes):
+    """Move the `fromdate` of a feed back by its `warmup` bars, keeping the first traded one as `tradefrom`.
+
+    Parameters
+    ----------
+    data: bt.feeds.DataBase
+        feed with a `warmup` param, once its `fromdate` was converted by `_start_finish`.
+    datetimes: numpy.ndarray
+        sorted datetimes of the bars of the feed, `date2num` floats or int64 epoch nanoseconds.
+
+    """
+    data.tradefrom = data.fromdate
+    warmup = int(data.p.warmup or 0)
+    if (warmup <= 0) or (len(datetimes) == 0) or not numpy.isfinite(data.fromdate):
+        return data.fromdate
+
+    key = data.fromdate
+    if datetimes.dtype.kind in "iu":
+        # nanoseconds of the fromdate, rounded as in `date2num`
+        key = int(round((data.fromdate - EPOCH_ORDINAL) * NS_PER_DAY))
+    start = int(numpy.searchsorted(datetimes, key, side="left"))
+    first = datetimes[max(start - warmup, 0):max(start - warmup, 0) + 1]
+    data.fromdate = min(data.fromdate, float(date2num(first)[0] if datetimes.dtype.kind in "iu" else first[0]))
+    return data.fromdate
+
+
+def warming_up(data):
+    """Whether the current bar of a feed is one of its warm up bars, before `fromdate`.
+
+    Strategies skip their orders on these bars, so the indicators are primed when the
+    trading starts at `fromdate`.
+    """
+    return data.datetime[0] < getattr(data, "tradefrom", float("-inf"))
+
+
+class SharedArrays(object):
+    """Columnar arrays published once in a `multiprocessing.shared_memory` block.
+
+    Can be passed as `dataname` to `NumpyData`. When cerebro sends the data feed to its
+    optimization workers only the block name and layout are pickled, and every worker
+    attaches to the same block instead of receiving its own copy of the arrays.
+
+    Parameters
+    ----------
+    arrays: dict
+        dict with column names as keys and numpy arrays as values.
+
+    Examples
+    --------
+    >>> shared = SharedArrays(numpydatafeed(datapath, args=args))
+    >>> data = NumpyData(dataname=shared)
+    >>> ...
+    >>> shared.unlink()     # once cerebro.run() is over
+
+    """
+
+    def __init__(self, arrays):
+        self.layout = []
+        offset = 0
+        for column, values in arrays.items():
+            values = numpy.ascontiguousarray(values)
+            self.layout.append((column, values.dtype.str, len(values), offset))
+            # keep every column aligned to 8 bytes
+            offset += -(-values.nbytes // 8) * 8
+
+        self._shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        self._owner = True
+        self._attach_arrays()
+        for column, values in arrays.items():
+            self._arrays[column][:] = values
+
+    def _attach_arrays(self):
+        self._arrays = {column: numpy.ndarray((length,), dtype=dtype, buffer=self._shm.buf, offset=offset)
+                        for column, dtype, length, offset in self.layout}
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def __getstate__(self):
+        return {"name": self._shm.name, "layout": self.layout}
+
+    def __setstate__(self, state):
+        self.layout = state["layout"]
+        self._shm = shared_memory.SharedMemory(name=state["name"])
+        self._owner = False
+        self._attach_arrays()
+
+    def __getitem__(self, column):
+        return self._arrays[column]
+
+    def __len__(self):
+        return len(self._arrays)
+
+    def __iter__(self):
+        return iter(self._arrays)
+
+    def get(self, column, default=None):
+        return self._arrays.get(column, default)
+
+    def keys(self):
+        return self._arrays.keys()
+
+    def close(self):
+        """Detach from the block, the arrays can not be used afterwards."""
+        self._arrays = {}
+        try:
+            self._shm.close()
+        except BufferError:
+            # views still exported (e.g. by a data feed), released with them
+            pass
+
+    def unlink(self):
+        """Free the block, only the process that published it does it."""
+        self.close()
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def date2num(datetimes):
+    """Vectorized `backtrader.date2num` of int64 epoch nanoseconds.
+
+    Examples
+    --------
+    >>> date2num(numpy.array(["2015-08-12T09:30"], dtype="datetime64[ns]").view(numpy.int64))
+    array([735822.39583333])
+
+    """
+    datetimes = numpy.asarray(datetimes, dtype=numpy.int64)
+    days = datetimes // NS_PER_DAY
+    fraction = (datetimes - days * NS_PER_DAY) / NS_PER_DAY
+    return (days + EPOCH_ORDINAL).astype(numpy.float64) + fraction
+
+
+def warmup_bars(*signals_params):
+    """Number of bars the indicators of the given signals need before producing values.
+
+    Parameters
+    ----------
+    signals_params: dict
+        signal params, as in `settings["opt_params"]`, the values can be scalars or ranges.
+
+    Returns
+    -------
+    warmup: int
+        the largest "period*" param.
+
+    Examples
+    --------
+    >>> warmup_bars({"period_me1": numpy.arange(10, 21, 5), "period_me2": numpy.arange(20, 31, 5),
+    ...              "period_atr": numpy.arange(50, 81, 15), "atrdist": numpy.arange(0.8, 1.5, 0.2)})
+    80
+
+    """
+    periods = [numpy.max(value) for params in signals_params if isinstance(params, dict)
+               for key, value in params.items() if key.startswith("period")]
+    return int(max(periods, default=0))
+
+
+def source_step(datetimes):
+    """Bar period, in nanoseconds, of a sorted datetime array (gcd of the intraday steps)."""
+    datetimes = numpy.asarray(datetimes)
+    steps = numpy.diff(datetimes)
+    steps = steps[(steps > 0) & (numpy.diff(datetimes // NS_PER_DAY) == 0)]
+    return int(numpy.gcd.reduce(steps)) if len(steps) else 0
+
+
+def resample_arrays(arrays, minutes):
+    """Aggregate columnar arrays into `minutes` bars, never mixing bars of different sessions.
+
+    Bars start at multiples of `minutes` from midnight, as in MetaTrader exports, and are
+    labeled with their start time. Only bars with data are kept.
+
+    Parameters
+    ----------
+    arrays: dict
+        output of `read_store`.
+    minutes: int
+        period of the new bars, a multiple of the period of `arrays`.
+
+    Returns
+    -------
+    resampled: dict
+        dict with `STORE_COLUMNS` as keys and numpy arrays as values.
+
+    Examples
+    --------
+    >>> arrays = read_store("./data/WIN$N_1M_2015.08.12_2015.12.30_.csv")
+    >>> resample_arrays(arrays, 30)["datetime"][:2].astype("datetime64[ns]")
+    array(['2015-08-12T09:00:00.000000000', '2015-08-12T09:30:00.000000000'], dtype='datetime64[ns]')
+
+    """
+    datetimes = numpy.asarray(arrays["datetime"])
+    period = int(minutes) * NS_PER_MINUTE
+    step = source_step(datetimes)
+    if (period <= 0) or (step and period % step):
+        raise ValueError("{} minutes bars can not be built from {} minutes bars".format(minutes, step / NS_PER_MINUTE))
+
+    days = datetimes // NS_PER_DAY
+    bins = days * NS_PER_DAY + (datetimes - days * NS_PER_DAY) // period * period
+    starts = numpy.flatnonzero(numpy.diff(bins, prepend=bins[:1] - 1)) if len(bins) else numpy.zeros(0, dtype=int)
+    ends = numpy.append(starts[1:], len(bins)) - 1
+
+    resampled = {"datetime": bins[starts]}
+    if len(starts) == 0:
+        resampled.update({column: numpy.asarray(arrays[column])[:0] for column in STORE_COLUMNS[1:]})
+        return resampled
+    resampled["open"] = numpy.asarray(arrays["open"])[starts]
+    resampled["high"] = numpy.maximum.reduceat(arrays["high"], starts)
+    resampled["low"] = numpy.minimum.reduceat(arrays["low"], starts)
+    resampled["close"] = numpy.asarray(arrays["close"])[ends]
+    resampled["volume"] = numpy.add.reduceat(arrays["volume"], starts)
+    return resampled
+
+
+def resampled_path(datapath, minutes):
+    """Sidecar directory of the `minutes` bars resampled from a source file.
+
+    Examples
+    --------
+    >>> resampled_path("./data/WIN$N_1M_2015.08.12_2015.12.30_.csv", 5)
+    './data/.store/WIN$N_1M_2015.08.12_2015.12.30_.csv.5M'
+
+    """
+    return "{}.{}M".format(store_path(datapath), int(minutes))
+
+
+def evict_resampled(datapath, maxbytes=RESAMPLE_MAXBYTES, keep=None):
+    """Remove the least recently used resampled series of the folder of `datapath` above `maxbytes`."""
+    pattern = os.path.join(os.path.dirname(store_path(datapath)), "*.csv.*M")
+    entries = []
+    for path in glob.glob(pattern):
+        metapath = os.path.join(path, "meta.json")
+        nbytes = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+        used = os.stat(metapath).st_mtime_ns if os.path.isfile(metapath) else 0
+        entries.append((used, path, nbytes))
+
+    total = sum(nbytes for used, path, nbytes in entries)
+    for used, path, nbytes in sorted(entries):
+        if total <= maxbytes:
+            break
+        if path == keep:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= nbytes
+    return total
+
+
+def read_resampled(datapath, minutes, maxbytes=RESAMPLE_MAXBYTES):
+    """`minutes` bars of a source file, resampled once and then loaded from the disk cache.
+
+    The cached series is validated against the source file as in `store.load_store`, and
+    the least recently used series of the data folder are evicted above `maxbytes`.
+    """
+    path = resampled_path(datapath, minutes)
+    arrays = load_store(datapath, path=path)
+    if arrays is not None:
+        # mark as recently used for the eviction
+        os.utime(os.path.join(path, "meta.json"))
+        return arrays
+
+    arrays = resample_arrays(read_store(datapath), minutes)
+    try:
+        write_store(datapath, arrays, path=path)
+        evict_resampled(datapath, maxbytes=maxbytes, keep=path)
+    except OSError:
+        arrays["days"], arrays["offsets"] = day_index(arrays["datetime"])
+        return arrays
+    return load_store(datapath, path=path)
+
+
+def name_dates(filepath):
+    """First and last "YYYY.MM.DD" dates of a `{symbol}_{freq}_{first}_{last}_.csv` filename, None if not dated.
+
+    Examples
+    --------
+    >>> name_dates("./data/WIN$N_1M_2015.12.30_2015.08.12.csv")
+    ('2015.08.12', '2015.12.30')
+
+    """
+    fields = os.path.basename(filepath).split("_")[2:4]
+    if (len(fields) < 2) or not all(re.fullmatch(r"\d{4}\.\d{2}\.\d{2}", field) for field in fields):
+        return None
+    return min(fields), max(fields)
+
+
+def resolve_datapath(datapath):
+    """Source file and resampling period of a data file that may not exist.
+
+    A missing `{symbol}_{N}M_{first}_{last}_.csv` file is built from the finest file of the
+    same symbol in its folder whose period divides N and whose dates, by its name, cover
+    `first` to `last`. If no such file covers them a FileNotFoundError is raised, instead of
+    running on a shorter history: pass the partial file as the datapath, with `--resample N`,
+    to use it anyway.
+
+    Returns
+    -------
+    source: str
+        existing CSV filepath.
+    minutes: int or None
+        period to resample `source` to, None when `datapath` exists.
+
+    Examples
+    --------
+    >>> resolve_datapath("./data/WIN$N_5M_2015.08.12_2015.12.30_.csv")
+    ('./data/WIN$N_1M_2015.08.12_2015.12.30_.csv', 5)
+
+    """
+    if os.path.isfile(datapath):
+        return datapath, None
+
+    dirname, basename = os.path.split(datapath)
+    try:
+        symbol, freq = basename.split("_")[:2]
+        minutes = int(freq.replace("M", ""))
+    except ValueError:
+        raise FileNotFoundError(datapath)
+    dates = name_dates(datapath)
+
+    candidates, partial = [], []
+    for file in glob.glob(os.path.join(glob.escape(dirname), glob.escape(symbol) + "_*M_*.csv")):
+        try:
+            file_minutes = int(os.path.basename(file).split("_")[1].replace("M", ""))
+        except ValueError:
+            continue
+        if minutes % file_minutes != 0:
+            continue
+        file_dates = name_dates(file)
+        if (dates is None) or ((file_dates is not None) and (file_dates[0] <= dates[0]) and (file_dates[1] >= dates[1])):
+            # finest period first, then the largest file
+            candidates.append((file_minutes, -os.path.getsize(file), file))
+        else:
+            partial.append(file)
+    if len(candidates) == 0:
+        message = datapath
+        if len(partial):
+            message = "{}: no file of the same symbol covers {} to {}, only {}".format(
+                datapath, dates[0], dates[1], ", ".join(sorted(partial)))
+        raise FileNotFoundError(message)
+    return min(candidates)[2], minutes
+
+
+def dataset_source(datapath, **kwargs):
+    """Existing source file and resampling period (None to use it as is) of a data feed."""
+    args = kwargs.get('args', None)
+    source, minutes = resolve_datapath(datapath)
+    minutes = kwargs.get('resample', getattr(args, "resample", None)) or minutes
+    return source, minutes
+
+
+def dataset_columns(columns, minutes=None):
+    """Columns key of the cached datasets, tagged with the resampling period."""
+    return list(columns) + (["{}M".format(minutes)] if minutes else [])
+
+
+def read_arrays(datapath, **kwargs):
+    """Columnar arrays and day index of the whole source file, see `store.read_store`.
+
+    With `resample=N` (or `args.resample`), or a missing `{symbol}_{N}M` datapath, the
+    arrays are the N minutes bars resampled from the source file, see `read_resampled`.
+    """
+    args = kwargs.get('args', None)
+    source, minutes = dataset_source(datapath, **kwargs)
+
+    def loader(path):
+        # columnar sidecar, parsed from the csv only on first load
+        if getattr(args, "no_datacache", False):
+            arrays = read_source(path)
+            if minutes:
+                arrays = resample_arrays(arrays, minutes)
+            arrays["days"], arrays["offsets"] = day_index(arrays["datetime"])
+            return arrays
+        if minutes:
+            return read_resampled(path, minutes)
+        return read_store(path)
+
+    # each source file is read at most once per process
+    return DATASET_CACHE.load(source, dataset_columns(STORE_COLUMNS, minutes), None, loader=loader)
+
+
+def arraysdatafeed(datapath, **kwargs):
+    """Columnar arrays of the source file, sliced to fromdate/todate plus the warm up bars."""
+    fromdate = kwargs.get('fromdate', None)
+    todate = kwargs.get('todate', None)
+    warmup = kwargs.get('warmup', 0)
+    arrays = read_arrays(datapath, **kwargs)
+
+    # materialize only the days from fromdate to todate, plus the warm up bars
+    start, stop = slice_rows(arrays, fromdate=fromdate, todate=todate, warmup=warmup)
+    return {col: arrays[col][start:stop] for col in ["datetime"] + DATA_COLS}
+
+
+def streaming_kwargs(args):
+    """Cerebro kwargs of a `--streaming` run: no preload and bounded line buffers.
+
+    `exactbars` is taken from `args.exactbars`, defaulting to 1 (the smallest buffers) when unset.
+    """
+    if not getattr(args, "streaming", None):
+        return {}
+    return {"preload": False, "exactbars": getattr(args, "exactbars", 0) or 1}
+
+
+def streamingdata(datapath, **kwargs):
+    """`StreamingData` feed of the source file, from fromdate/todate plus the warm up bars.
+
+    The arrays are views on the memory-mapped store (or resampled store), nothing is
+    loaded upfront. `args.streaming` is the number of bars of each chunk.
+    """
+    args = kwargs.get('args', None)
+    chunksize = kwargs.get('chunksize', getattr(args, "streaming", None)) or STREAM_CHUNKSIZE
+    dataname = arraysdatafeed(datapath, **kwargs)
+    return StreamingData(dataname=dataname, chunksize=chunksize, warmup=kwargs.get('warmup', 0),
+                         fromdate=kwargs.get('fromdate', None), todate=kwargs.get('todate', None))
+
+
+def numpydatafeed(datapath, **kwargs):
+    """Arrays to be passed as `dataname` to `NumpyData`, see `pandasdatafeed` for the kwargs.
+
+    With `compact="int32"` (or "int16") the whole file is cached with the integer dtypes of
+    `store.compact_ohlcv` instead of float64, and only the requested window is expanded back.
+    """
+    args = kwargs.get('args', None)
+    fromdate = kwargs.get('fromdate', None)
+    todate = kwargs.get('todate', None)
+    warmup = kwargs.get('warmup', 0)
+    compact = kwargs.get('compact', getattr(args, "compact", None))
+
+    def loader(path):
+        arrays = read_arrays(datapath, **kwargs)
+        dataname = {col: numpy.ascontiguousarray(arrays[col], dtype=numpy.float64) for col in DATA_COLS}
+        dataname["datetime"] = date2num(arrays["datetime"])
+        dataname.update({"days": arrays["days"], "offsets": arrays["offsets"]})
+        return dataname
+
+    def compact_loader(path):
+        return compact_ohlcv(read_arrays(datapath, **kwargs), deltas=COMPACT_DTYPES[compact])
+
+    source, minutes = dataset_source(datapath, **kwargs)
+    columns = dataset_columns(["datetime"] + DATA_COLS, minutes)
+    if compact:
+        # integer arrays of the whole file, each window is expanded to float64 on its own
+        arrays = DATASET_CACHE.load(source, columns, compact, loader=compact_loader)
+        start, stop = slice_rows(arrays, fromdate=fromdate, todate=todate, warmup=warmup)
+        dataname = {"datetime": date2num(arrays["datetime"][start:stop])}
+        dataname.update(expand_ohlcv(arrays, start, stop))
+    else:
+        # float64 arrays of the whole file are converted once, each window is a view on them
+        arrays = DATASET_CACHE.load(source, columns, numpy.float64, loader=loader)
+        start, stop = slice_rows(arrays, fromdate=fromdate, todate=todate, warmup=warmup)
+        dataname = {col: arrays[col][start:stop] for col in ["datetime"] + DATA_COLS}
+
+    if not args.noprint:
+        print('--------------------------------------------------')
+        print(pandas.DataFrame(dataname))
+        print('--------------------------------------------------')
+
+    return dataname
+
 
 def pandasdatafeed(datapath, **kwargs):
     args = kwargs.get('args', None)
@@ -18,17 +617,9 @@ def pandasdatafeed(datapath, **kwargs):
     skiprows = 1 if args.noheaders else 0
     header = None if args.noheaders else 0
 
-    dataframe = pandas.read_csv(datapath,
-                                # skiprows=skiprows,
-                                # header=header,
-                                # parse_dates=True,
-                                parse_dates={'datetime': ['date', 'hour']},
-                                index_col=0)
-    # dataframe = dataframe.set_index('datetime')
-    dataframe = dataframe.sort_index()
-    data_cols = ['open', 'high', 'low', 'close', 'real_volume']
-    dataframe = dataframe.loc[:, data_cols]
-    dataframe = dataframe.rename(columns={"real_volume": "volume"})
+    arrays = arraysdatafeed(datapath, **kwargs)
+    dataframe = pandas.DataFrame({col: arrays[col] for col in DATA_COLS},
+                                 index=pandas.DatetimeIndex(arrays["datetime"], name="datetime"))
 
     if not args.noprint:
         print('--------------------------------------------------')
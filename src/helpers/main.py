@@ -8,7 +8,7 @@ import backtrader as bt  # Import the backtrader platform
 # import argparse
 import json
 
-from src.helpers.datafeed import pandasdatafeed
+from src.helpers.datafeed import NumpyData, numpydatafeed, streamingdata, streaming_kwargs
 from time import process_time
 from src.helpers.args import parse_args
 
@@ -31,7 +31,7 @@ def runstrat_main(settings, **kwargs):
                          # exactbars=args.exactbars,
                          # optdatas=not args.no_optdatas,
                          # optreturn=not args.no_optreturn
-                         )
+                         **streaming_kwargs(args))
 
     # Add a strategy
     cerebro.addstrategy(strategies.MainStrategy, **settings, **kwargs)
@@ -40,9 +40,13 @@ def runstrat_main(settings, **kwargs):
     datapath = args.data
 
     # Pass it to the backtrader datafeed and add it to the cerebro
-    data = bt.feeds.PandasData(dataname=pandasdatafeed(datapath, args=args),
-                               fromdate=args.fromdate,  # fromdate=args.fromdate,
-                               todate=args.todate)  # todate=args.todate)
+    if args.streaming:
+        data = streamingdata(datapath, args=args, fromdate=args.fromdate, todate=args.todate)
+    else:
+        dataname = numpydatafeed(datapath, args=args, fromdate=args.fromdate, todate=args.todate)
+        data = NumpyData(dataname=dataname,
+                         fromdate=args.fromdate,  # fromdate=args.fromdate,
+                         todate=args.todate)  # todate=args.todate)
     cerebro.adddata(data)
 
     # Set our desired cash start
@@ -0,0 +1,221 @@
+""" Indexed store of the optimization results
+
+`main_opt.py` and `main_signals.py` keep the best params and analyzers of
+every walk-forward window in `settings["opt_analyzer"]["path_results"]`, a
+sqlite3 database with one row per (opt_type, fromdate, todate, signal):
+
+    results(id, opt_type, fromdate, todate, signal, output_key, window, output)
+
+`window` holds the JSON of the window params (train/test dates, ...) and
+`output` the JSON of the signal results, so saving a window is a single
+indexed upsert instead of reading and rewriting the whole JSON file, and it is
+safe with several processes writing at the same time (WAL journal).
+
+The JSON layout of the `analyzers_{opt_type}_*.json` files, used by the
+notebooks and `data/analysis/analyzers.py`, is rebuilt with `export_json`:
+
+    [{"train": {...}, "test": {...}, "output_train": {"MACDSignal": {...}, "RSISignal": {...}}}, ...]
+
+Usage:
+    python -m src.helpers.results import ./data/analyzers_opt/analyzers.sqlite train ./data/analyzers_opt/analyzers_train_21d_0.8.json
+    python -m src.helpers.results export ./data/analyzers_opt/analyzers.sqlite train ./data/analyzers_opt/analyzers_train_21d_0.8.json
+"""
+import os
+import json
+import argparse
+import sqlite3
+import contextlib
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    opt_type TEXT NOT NULL,
+    fromdate TEXT NOT NULL,
+    todate TEXT NOT NULL,
+    signal TEXT NOT NULL,
+    output_key TEXT NOT NULL,
+    window TEXT NOT NULL,
+    output TEXT NOT NULL,
+    UNIQUE (opt_type, fromdate, todate, signal)
+)
+"""
+UPSERT = """
+INSERT INTO results (opt_type, fromdate, todate, signal, output_key, window, output)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (opt_type, fromdate, todate, signal)
+DO UPDATE SET output_key = excluded.output_key, window = excluded.window, output = excluded.output
+"""
+# seconds a writer waits for the others to commit
+TIMEOUT = 60
+# databases already set up (WAL journal and schema) by this process
+_READY = set()
+
+
+def results_path(settings):
+    """Database of the results, None to keep them in the JSON files only."""
+    return settings["opt_analyzer"].get("path_results", None)
+
+
+@contextlib.contextmanager
+def connect(path):
+    """Connection to the results database, creating it on first use. Commits on exit.
+
+    The WAL journal mode is kept by the database file, so it and the schema are set once per
+    path and process (again if the file was removed).
+    """
+    abspath = os.path.abspath(path)
+    os.makedirs(os.path.dirname(abspath), exist_ok=True)
+    ready = (abspath in _READY) and os.path.isfile(abspath)
+    connection = sqlite3.connect(path, timeout=TIMEOUT)
+    try:
+        if not ready:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(SCHEMA)
+            _READY.add(abspath)
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+def result_key(opt_type, output, signal):
+    """(opt_type, fromdate, todate, signal) key of the results of a signal on the window of `output[opt_type]`.
+
+    Examples
+    --------
+    >>> result_key("train", {"train": {"fromdate": datetime.datetime(2015, 8, 12), "todate": "2015-09-03 00:00:00"}},
+    ...            "MACDSignal")
+    ('train', '2015-08-12 00:00:00', '2015-09-03 00:00:00', 'MACDSignal')
+
+    """
+    return opt_type, str(output[opt_type]["fromdate"]), str(output[opt_type]["todate"]), signal
+
+
+def result_rows(opt_type, output, output_key):
+    """Rows of the results of a window, one per signal in `output[output_key]`."""
+    window = {key: value for key, value in output.items() if key != output_key}
+    window_json = json.dumps(window, default=str)
+    return [result_key(opt_type, output, signal) + (output_key, window_json, json.dumps(value, default=str))
+            for signal, value in output[output_key].items()]
+
+
+def write_result(path, opt_type, output, output_key):
+    """Save (or replace) the results of the signals of a window.
+
+    Parameters
+    ----------
+    path: str
+        database filepath.
+    opt_type: str
+        "train" or "test", `output[opt_type]` holds the "fromdate"/"todate" of the window.
+    output: dict
+        window params, with the results of each signal in `output[output_key]`.
+    output_key: str
+        key of the results, "output_train" or "output_test".
+
+    """
+    with connect(path) as connection:
+        connection.executemany(UPSERT, result_rows(opt_type, output, output_key))
+    return None
+
+
+def has_result(path, opt_type, fromdate, todate, signal):
+    """Whether the signal was already optimized/tested on the window."""
+    with connect(path) as connection:
+        row = connection.execute("SELECT 1 FROM results WHERE opt_type = ? AND fromdate = ? AND todate = ? "
+                                 "AND signal = ?", (opt_type, str(fromdate), str(todate), signal)).fetchone()
+    return row is not None
+
+
+def result_keys(path, opt_type):
+    """Set of the `result_key` of every saved result of `opt_type`, to check many windows at once."""
+    with connect(path) as connection:
+        rows = connection.execute("SELECT opt_type, fromdate, todate, signal FROM results WHERE opt_type = ?",
+                                  (opt_type,)).fetchall()
+    return set(rows)
+
+
+def json_result_keys(filename, opt_type, output_key):
+    """Set of the `result_key` of every result of an `analyzers_{opt_type}_*.json` file, empty if missing."""
+    try:
+        data = json.load(open(filename, "r"))
+    except (OSError, ValueError):
+        return set()
+    return {result_key(opt_type, row, signal) for row in data for signal in row.get(output_key, {})}
+
+
+def count_results(path, opt_type):
+    """Number of saved (window, signal) results of `opt_type`."""
+    with connect(path) as connection:
+        return connection.execute("SELECT COUNT(*) FROM results WHERE opt_type = ?", (opt_type,)).fetchone()[0]
+
+
+def read_rows(path, opt_type, object_hook=None):
+    """Results of `opt_type` with the layout of the JSON files, windows in the order they were first saved.
+
+    Each window keeps the params of its last saved signal, as the JSON files did.
+    """
+    with connect(path) as connection:
+        rows = connection.execute("SELECT fromdate, todate, signal, output_key, window, output FROM results "
+                                  "WHERE opt_type = ? ORDER BY id", (opt_type,)).fetchall()
+
+    windows = {}
+    for fromdate, todate, signal, output_key, window, output in rows:
+        row = windows.setdefault((fromdate, todate), {"outputs": {}})
+        row.update(window=window, output_key=output_key)
+        row["outputs"][signal] = output
+
+    data = []
+    for row in windows.values():
+        window = json.loads(row["window"], object_hook=object_hook)
+        window[row["output_key"]] = {signal: json.loads(output, object_hook=object_hook)
+                                     for signal, output in row["outputs"].items()}
+        data.append(window)
+    return data
+
+
+def export_json(path, opt_type, filename):
+    """Write the results of `opt_type` as an `analyzers_{opt_type}_*.json` file."""
+    data = read_rows(path, opt_type)
+    tmppath = "{}.{}.tmp".format(filename, os.getpid())
+    with open(tmppath, "w") as file:
+        json.dump(data, file, indent=2, default=str)
+    os.replace(tmppath, filename)
+    return filename
+
+
+def import_json(path, opt_type, filename, output_key):
+    """Save the results of an existing `analyzers_{opt_type}_*.json` file into the database."""
+    data = json.load(open(filename, "r"))
+    with connect(path) as connection:
+        for output in data:
+            connection.executemany(UPSERT, result_rows(opt_type, output, output_key))
+    return len(data)
+
+
+def parse_args(pargs=None):
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        description='Import/export the optimization results from/to the JSON files')
+
+    parser.add_argument('command', choices=['import', 'export'])
+    parser.add_argument('path', help='Results database')
+    parser.add_argument('opt_type', choices=['train', 'test'])
+    parser.add_argument('filename', help='analyzers_{opt_type}_*.json file')
+    parser.add_argument('--output-key', default=None,
+                        help='Key of the results in the JSON file, "output_{opt_type}" if not set')
+
+    return parser.parse_args(pargs)
+
+
+def main(pargs=None):
+    args = parse_args(pargs)
+    if args.command == "import":
+        output_key = args.output_key or "output_{}".format(args.opt_type)
+        print(import_json(args.path, args.opt_type, args.filename, output_key=output_key), "windows imported")
+    else:
+        print(export_json(args.path, args.opt_type, args.filename))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,473 @@
+""" Binary columnar store for MetaTrader CSV exports
+
+The first time a CSV is read its columns are saved as ``.npy`` arrays in a
+sidecar directory, next to the source file:
+
+    data/WIN$N_5M_2015.05.22_2021.01.22_.csv
+    data/.store/WIN$N_5M_2015.05.22_2021.01.22_.csv/
+        meta.json       # source path, size and mtime, row count
+        datetime.npy    # int64 epoch nanoseconds
+        open.npy
+        ...
+        days.npy        # int64 epoch days with at least one bar
+        offsets.npy     # first row of each day, plus the total row count
+
+Later reads memory-map the arrays, as long as the source file size and mtime
+still match the ones recorded in ``meta.json``. The per-day row offsets allow
+a date range to be sliced without touching the rows outside of it.
+"""
+import os
+import json
+import numpy as np
+import pandas
+
+from src.helpers.timeparse import parse_datetimes, NS_PER_DAY
+
+STORE_DIR = ".store"
+STORE_COLUMNS = ["datetime", "open", "high", "low", "close", "volume"]
+STORE_INDEX = ["days", "offsets"]
+STORE_VERSION = 2
+
+
+def store_path(datapath):
+    """Sidecar directory of a given source file.
+
+    Parameters
+    ----------
+    datapath: str
+        CSV filepath.
+
+    Returns
+    -------
+    path: str
+
+    Examples
+    --------
+    >>> store_path("./data/WIN$N_5M_2015.05.22_2021.01.22_.csv")
+    './data/.store/WIN$N_5M_2015.05.22_2021.01.22_.csv'
+
+    """
+    dirname, basename = os.path.split(datapath)
+    return os.path.join(dirname, STORE_DIR, basename)
+
+
+def source_signature(datapath):
+    """Key used to validate the sidecar against its source file."""
+    stat = os.stat(datapath)
+    return {"path": os.path.abspath(datapath),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns}
+
+
+def read_source(datapath):
+    """Parse a MetaTrader CSV export into sorted columnar arrays.
+
+    Parameters
+    ----------
+    datapath: str
+        CSV filepath, with columns "date", "hour", "open", "high", "low", "close" and "real_volume".
+
+    Returns
+    -------
+    arrays: dict
+        dict with `STORE_COLUMNS` as keys and numpy arrays as values.
+
+    """
+    dataframe = pandas.read_csv(datapath, dtype={"date": str, "hour": str})
+    dataframe = dataframe.rename(columns={"real_volume": "volume"})
+
+    datetimes = parse_datetimes(dataframe["date"], dataframe["hour"])
+    order = np.argsort(datetimes, kind="mergesort")
+    arrays = {"datetime": datetimes[order]}
+    for column in STORE_COLUMNS[1:]:
+        arrays[column] = dataframe[column].values[order]
+    return arrays
+
+
+def day_index(datetimes):
+    """Per-day row offsets of a sorted datetime array.
+
+    Parameters
+    ----------
+    datetimes: numpy.ndarray
+        sorted int64 epoch nanoseconds.
+
+    Returns
+    -------
+    days: numpy.ndarray
+        int64 epoch days with at least one row.
+    offsets: numpy.ndarray
+        first row of each day, with the total number of rows appended, so the rows of
+        `days[i]` are `offsets[i]:offsets[i + 1]`.
+
+    """
+    days_rows = np.asarray(datetimes) // NS_PER_DAY
+    if len(days_rows) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(1, dtype=np.int64)
+
+    starts = np.flatnonzero(np.diff(days_rows)) + 1
+    offsets = np.concatenate([[0], starts, [len(days_rows)]]).astype(np.int64)
+    days = days_rows[offsets[:-1]].astype(np.int64)
+    return days, offsets
+
+
+def write_store(datapath, arrays, path=None):
+    """Save columnar arrays of a source file, and their day index, into its sidecar directory.
+
+    `meta.json` is removed first and written last, so an interrupted write is
+    seen as a missing store and not as a valid one. `path` overrides the sidecar
+    directory, for arrays derived from the source file.
+    """
+    path = store_path(datapath) if path is None else path
+    os.makedirs(path, exist_ok=True)
+
+    metapath = os.path.join(path, "meta.json")
+    if os.path.isfile(metapath):
+        os.remove(metapath)
+
+    days, offsets = day_index(arrays["datetime"])
+    index = {"days": days, "offsets": offsets}
+    for column, values in list(arrays.items()) + list(index.items()):
+        filepath = os.path.join(path, column + ".npy")
+        tmppath = "{}.{}.tmp".format(filepath, os.getpid())
+        with open(tmppath, "wb") as file:
+            np.save(file, np.ascontiguousarray(values))
+        os.replace(tmppath, filepath)
+
+    meta = {"version": STORE_VERSION,
+            "source": source_signature(datapath),
+            "columns": list(arrays.keys()),
+            "index": STORE_INDEX,
+            "rows": int(len(arrays["datetime"])),
+            "days": int(len(days))}
+    write_meta(path, meta)
+    return path
+
+
+def append_npy(filepath, values):
+    """Append values to a 1-d ``.npy`` file, rewriting only its header in place.
+
+    Values must be castable without loss to the dtype of the file. When the header has no
+    room left for the new shape the whole file is rewritten.
+    """
+    with open(filepath, "r+b") as file:
+        version = np.lib.format.read_magic(file)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+        data_offset = file.tell()
+
+        output = np.ascontiguousarray(values, dtype=dtype)
+        if not np.array_equal(output, values):
+            raise ValueError("{} values can not be stored as {}".format(filepath, dtype))
+
+        prefix = len(np.lib.format.MAGIC_PREFIX) + 2 + (2 if version == (1, 0) else 4)
+        header = "{{'descr': {!r}, 'fortran_order': False, 'shape': ({},), }}".format(
+            np.lib.format.dtype_to_descr(dtype), shape[0] + len(output))
+        if fortran_order or len(shape) != 1 or len(header) + 1 > data_offset - prefix:
+            rewrite = True
+        else:
+            rewrite = False
+            # data first, the header with the new length last
+            file.seek(data_offset + shape[0] * dtype.itemsize)
+            file.write(output.tobytes())
+            file.flush()
+            file.seek(prefix)
+            file.write(header.ljust(data_offset - prefix - 1).encode("latin1") + b"\n")
+
+    if rewrite:
+        values = np.concatenate([np.load(filepath), output])
+        tmppath = "{}.{}.tmp".format(filepath, os.getpid())
+        with open(tmppath, "wb") as file:
+            np.save(file, values)
+        os.replace(tmppath, filepath)
+
+
+def append_store(datapath, arrays, meta):
+    """Append bars newer than the stored ones to the sidecar of a source file.
+
+    To be called once the same bars were appended to the source file. `meta` is the
+    `read_meta` output from before that, the sidecar stays stale (and is rebuilt on the
+    next read) until the new `meta.json` is written, at the end.
+
+    Parameters
+    ----------
+    datapath: str
+        CSV filepath.
+    arrays: dict
+        dict with `STORE_COLUMNS` as keys and the sorted new bars as values.
+    meta: dict
+        sidecar metadata before the source file was changed.
+
+    """
+    path = store_path(datapath)
+    rows = meta["rows"]
+    stored_days = np.load(os.path.join(path, "days.npy"), mmap_mode="r")
+    last_day = int(stored_days[-1]) if len(stored_days) else None
+    del stored_days
+
+    for column in meta["columns"]:
+        append_npy(os.path.join(path, column + ".npy"), arrays[column])
+
+    days, offsets = day_index(arrays["datetime"])
+    offsets = offsets[1:] + rows
+    if len(days) and (days[0] == last_day):
+        # the first new bars continue the last stored day
+        days = days[1:]
+        stored_offsets = np.lib.format.open_memmap(os.path.join(path, "offsets.npy"), mode="r+")
+        stored_offsets[-1] = offsets[0]
+        stored_offsets.flush()
+        del stored_offsets
+        offsets = offsets[1:]
+    append_npy(os.path.join(path, "days.npy"), days)
+    append_npy(os.path.join(path, "offsets.npy"), offsets)
+
+    meta = dict(meta, source=source_signature(datapath), rows=rows + len(arrays["datetime"]),
+                days=meta["days"] + len(days))
+    write_meta(path, meta)
+    return meta
+
+
+def read_meta(datapath, path=None):
+    """`meta.json` of the sidecar of a source file, None when it is missing or stale."""
+    path = store_path(datapath) if path is None else path
+    try:
+        with open(os.path.join(path, "meta.json"), "r") as file:
+            meta = json.load(file)
+    except (OSError, ValueError):
+        return None
+
+    if (meta.get("version") != STORE_VERSION) or (meta.get("source") != source_signature(datapath)):
+        return None
+    return meta
+
+
+def write_meta(path, meta):
+    metapath = os.path.join(path, "meta.json")
+    tmppath = "{}.{}.tmp".format(metapath, os.getpid())
+    with open(tmppath, "w") as file:
+        json.dump(meta, file, indent=2)
+    os.replace(tmppath, metapath)
+
+
+def load_store(datapath, mmap_mode="r", path=None):
+    """Load the sidecar of a source file, if it is still valid.
+
+    Parameters
+    ----------
+    datapath: str
+        CSV filepath.
+    mmap_mode: str
+        passed to `numpy.load`, default "r" memory-maps the arrays read-only.
+    path: str
+        sidecar directory, default `store_path(datapath)`.
+
+    Returns
+    -------
+    arrays: dict or None
+        columns and day index arrays, None when there is no sidecar or it is stale.
+
+    """
+    path = store_path(datapath) if path is None else path
+    meta = read_meta(datapath, path=path)
+    if meta is None:
+        return None
+
+    sizes = {column: meta["rows"] for column in meta["columns"]}
+    sizes.update({"days": meta["days"], "offsets": meta["days"] + 1})
+    arrays = {}
+    for column, size in sizes.items():
+        try:
+            arrays[column] = np.load(os.path.join(path, column + ".npy"), mmap_mode=mmap_mode)
+        except (OSError, ValueError):
+            return None
+        if len(arrays[column]) != size:
+            return None
+    return arrays
+
+
+def read_store(datapath, mmap_mode="r"):
+    """Columnar arrays of a source file, building the sidecar on first use.
+
+    Examples
+    --------
+    >>> arrays = read_store("./data/WIN$N_30M_2015.08.12_2021.01.22_.csv")
+    >>> arrays["datetime"][:2]
+    memmap([1439370000000000000, 1439371800000000000])
+
+    """
+    arrays = load_store(datapath, mmap_mode=mmap_mode)
+    if arrays is not None:
+        return arrays
+
+    arrays = read_source(datapath)
+    try:
+        write_store(datapath, arrays)
+    except OSError:
+        # read-only data folder, keep going with the parsed arrays
+        arrays["days"], arrays["offsets"] = day_index(arrays["datetime"])
+        return arrays
+    return load_store(datapath, mmap_mode=mmap_mode)
+
+
+def read_calendar(datapath):
+    """Trading calendar of a source file, from the day index persisted in its sidecar.
+
+    Parameters
+    ----------
+    datapath: str
+        CSV filepath.
+
+    Returns
+    -------
+    calendar: dict
+        "days" (int64 epoch days with at least one bar), and the "first" row, "last" row
+        and bar "count" of each one of them.
+
+    Examples
+    --------
+    >>> calendar = read_calendar("./data/WIN$N_30M_2015.08.12_2021.01.22_.csv")
+    >>> calendar["days"][:2], calendar["first"][:2], calendar["count"][:2]
+    (memmap([16659, 16660]), memmap([ 0, 16]), array([16, 17]))
+
+    """
+    arrays = read_store(datapath)
+    offsets = arrays["offsets"]
+    return {"days": arrays["days"],
+            "first": offsets[:-1],
+            "last": offsets[1:] - 1,
+            "count": np.diff(offsets)}
+
+
+def to_epoch_day(date):
+    """Epoch day of a date, datetime or numpy.datetime64."""
+    return int(np.datetime64(date, "ns").astype(np.int64) // NS_PER_DAY)
+
+
+def slice_rows(arrays, fromdate=None, todate=None, warmup=0):
+    """Row bounds of the days between `fromdate` and `todate`, plus `warmup` earlier rows.
+
+    Parameters
+    ----------
+    arrays: dict
+        output of `read_store`, with the "days" and "offsets" index.
+    fromdate: datetime.datetime
+        first day to keep, None to start from the first row.
+    todate: datetime.datetime
+        last day to keep (the whole day), None to go until the last row.
+    warmup: int
+        number of rows before `fromdate` to keep, used to warm up indicators.
+
+    Returns
+    -------
+    start: int
+    stop: int
+
+    Examples
+    --------
+    >>> arrays = read_store("./data/WIN$N_30M_2015.08.12_2021.01.22_.csv")
+    >>> slice_rows(arrays, datetime.datetime(2015, 8, 13), datetime.datetime(2015, 8, 13), warmup=2)
+    (16, 36)
+
+    """
+    days, offsets = arrays["days"], arrays["offsets"]
+    day_start = 0 if fromdate is None else np.searchsorted(days, to_epoch_day(fromdate), side="left")
+    day_stop = len(days) if todate is None else np.searchsorted(days, to_epoch_day(todate), side="right")
+    start = int(offsets[day_start])
+    stop = max(int(offsets[day_stop]), start)
+    return max(start - int(warmup), 0), stop
+
+
+PRICE_COLUMNS = ["open", "high", "low", "close"]
+
+
+def _integral(values, column, dtype):
+    """`values` cast to the integer `dtype`, raising ValueError if the cast is not lossless."""
+    values = np.asarray(values)
+    info = np.iinfo(dtype)
+    if len(values) and ((values.min() < info.min) or (values.max() > info.max)):
+        raise ValueError("{} does not fit into {}".format(column, np.dtype(dtype)))
+    output = values.astype(dtype)
+    if not np.array_equal(output, values):
+        raise ValueError("{} has non integer values".format(column))
+    return output
+
+
+def compact_ohlcv(arrays, deltas=False, tick=None):
+    """Compact integer representation of the columnar arrays of a source file.
+
+    Prices are kept as int32 points, or with `deltas=True` as int16 number of ticks
+    from a per-day base price, and volumes as uint32. Datetimes and the day index are
+    kept as they are. Every conversion is checked, values that can not be represented
+    exactly raise a ValueError instead of being rounded.
+
+    Parameters
+    ----------
+    arrays: dict
+        output of `read_store`, with the "days" and "offsets" index.
+    deltas: bool
+        store prices as int16 ticks from the first open of each day.
+    tick: int
+        price increment of the deltas, None to use the largest one dividing every delta.
+
+    Returns
+    -------
+    compact: dict
+        "datetime", "days" and "offsets" as in `arrays`, int32/int16 prices, uint32 "volume",
+        and with `deltas=True` the int32 "base" price of each day and the "tick".
+
+    Examples
+    --------
+    >>> arrays = read_store("./data/WIN$N_1M_2015.08.12_2015.12.30_.csv")
+    >>> compact = compact_ohlcv(arrays, deltas=True)
+    >>> compact["open"].dtype, compact["tick"]
+    (dtype('int16'), 5)
+
+    """
+    compact = {column: arrays[column] for column in ["datetime", "days", "offsets"]}
+    compact["volume"] = _integral(arrays["volume"], "volume", np.uint32)
+    prices = {column: _integral(arrays[column], column, np.int32) for column in PRICE_COLUMNS}
+    if not deltas:
+        compact.update(prices)
+        return compact
+
+    offsets = np.asarray(arrays["offsets"])
+    base = prices["open"][offsets[:-1]]
+    rows_base = np.repeat(base.astype(np.int64), np.diff(offsets))
+    differences = {column: values.astype(np.int64) - rows_base for column, values in prices.items()}
+    if tick is None:
+        tick = int(np.gcd.reduce([np.gcd.reduce(values) for values in differences.values()] + [0])) or 1
+    for column, values in differences.items():
+        if np.any(values % tick):
+            raise ValueError("{} is not a multiple of tick {} from the day base".format(column, tick))
+        compact[column] = _integral(values // tick, column, np.int16)
+    compact["base"] = base
+    compact["tick"] = tick
+    return compact
+
+
+def expand_ohlcv(compact, start=0, stop=None):
+    """float64 prices and volumes of the rows `start:stop` of `compact_ohlcv` arrays.
+
+    Examples
+    --------
+    >>> arrays = read_store("./data/WIN$N_1M_2015.08.12_2015.12.30_.csv")
+    >>> expand_ohlcv(compact_ohlcv(arrays, deltas=True), 0, 2)["close"]
+    array([50405., 50400.])
+
+    """
+    stop = len(compact["datetime"]) if stop is None else stop
+    expanded = {}
+    if "base" in compact:
+        # per-row base price, from the day of each row
+        rows = np.arange(start, stop)
+        rows_day = np.searchsorted(compact["offsets"], rows, side="right") - 1
+        rows_base = compact["base"][rows_day].astype(np.float64)
+        for column in PRICE_COLUMNS:
+            expanded[column] = rows_base + compact[column][start:stop].astype(np.float64) * compact["tick"]
+    else:
+        for column in PRICE_COLUMNS:
+            expanded[column] = compact[column][start:stop].astype(np.float64)
+    expanded["volume"] = compact["volume"][start:stop].astype(np.float64)
+    return expanded
@@ -0,0 +1,144 @@
+""" Fast parser for MetaTrader date and hour columns
+
+MetaTrader exports keep dates as "YYYY.MM.DD" and hours as "HH:MM:SS" in
+separate columns. Since the layout is fixed, the digits are read straight
+from the bytes of the strings and turned into int64 epoch nanoseconds,
+without the generic (and slow) format inference of `pandas.to_datetime` or
+one `datetime.strptime` call per row. Exports repeat the same few hundred
+dates and hours over and over, so only the distinct strings are parsed.
+"""
+import numpy as np
+import pandas
+
+NS_PER_SECOND = 10**9
+NS_PER_DAY = 86400 * NS_PER_SECOND
+DIGITS = ord("0")
+
+
+def _factorize(values):
+    """Codes and distinct values of an array of strings."""
+    codes, uniques = pandas.factorize(np.asarray(values, dtype=object))
+    return codes, np.asarray(uniques, dtype=object)
+
+
+def _as_bytes(values, width):
+    """Fixed width bytes matrix, one row per value.
+
+    One more column than `width` is kept, nonzero for the values longer than `width`, so that
+    `_check` rejects them instead of reading their first `width` bytes.
+    """
+    chars = np.asarray(values).astype("S{}".format(width + 1))
+    return chars.view(np.uint8).reshape(-1, width + 1)
+
+
+def _digits(chars, positions):
+    """Integer made of the digits of `chars` at `positions`."""
+    number = np.zeros(len(chars), dtype=np.int64)
+    for position in positions:
+        number = number * 10 + (chars[:, position].astype(np.int64) - DIGITS)
+    return number
+
+
+def _check(chars, codes, separators, digits, layout, ranges=()):
+    """Raise a ValueError on the first row that is not in the layout, or whose fields are out
+    of their (positions, lowest, highest) `ranges`."""
+    separators_ok = np.all(chars[:, separators] == ord(layout[separators[0]]), axis=1)
+    digits_ok = np.all((chars[:, digits] >= DIGITS) & (chars[:, digits] <= DIGITS + 9), axis=1)
+    valid = separators_ok & digits_ok & (chars[:, len(layout)] == 0)
+    for positions, lowest, highest in ranges:
+        field = _digits(chars, positions)
+        valid &= (field >= lowest) & (field <= highest)
+    invalid = np.flatnonzero(~valid)
+    if len(invalid):
+        row = np.flatnonzero(codes == invalid[0])[0]
+        raise ValueError("row {} does not match the {} layout".format(row, layout))
+
+
+def days_from_civil(year, month, day):
+    """Days since 1970-01-01 of proleptic gregorian dates (vectorized).
+
+    Examples
+    --------
+    >>> days_from_civil(np.array([1970, 2015]), np.array([1, 8]), np.array([1, 12]))
+    array([    0, 16659])
+
+    """
+    year = year - (month <= 2)
+    era = np.floor_divide(year, 400)
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + np.where(month > 2, -3, 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def parse_dates(dates):
+    """Epoch nanoseconds at midnight of "YYYY.MM.DD" dates.
+
+    Parameters
+    ----------
+    dates: array-like
+        strings with the "YYYY.MM.DD" layout.
+
+    Returns
+    -------
+    datetimes: numpy.ndarray
+        int64 epoch nanoseconds.
+
+    Examples
+    --------
+    >>> parse_dates(["2015.08.12", "2021.01.22"]).astype("datetime64[ns]")
+    array(['2015-08-12T00:00:00.000000000', '2021-01-22T00:00:00.000000000'], dtype='datetime64[ns]')
+
+    """
+    codes, uniques = _factorize(dates)
+    chars = _as_bytes(uniques, 10)
+    _check(chars, codes, [4, 7], [0, 1, 2, 3, 5, 6, 8, 9], "YYYY.MM.DD", ranges=[([5, 6], 1, 12), ([8, 9], 1, 31)])
+    days = days_from_civil(_digits(chars, [0, 1, 2, 3]), _digits(chars, [5, 6]), _digits(chars, [8, 9]))
+    return (days * NS_PER_DAY)[codes]
+
+
+def parse_hours(hours):
+    """Nanoseconds since midnight of "HH:MM:SS" hours, also accepting "H:MM:SS".
+
+    Examples
+    --------
+    >>> parse_hours(["09:00:00", "9:05:00", "17:55:30"]) // 10**9
+    array([32400, 32700, 64530])
+
+    """
+    codes, uniques = _factorize(hours)
+    chars = _as_bytes(uniques, 8)
+    # "H:MM:SS" is padded at the end, shift it to "0H:MM:SS"
+    short = chars[:, 7] == 0
+    if short.any():
+        chars[short, 1:] = chars[short, :8]
+        chars[short, 0] = DIGITS
+    _check(chars, codes, [2, 5], [0, 1, 3, 4, 6, 7], "HH:MM:SS",
+           ranges=[([0, 1], 0, 23), ([3, 4], 0, 59), ([6, 7], 0, 59)])
+    seconds = _digits(chars, [0, 1]) * 3600 + _digits(chars, [3, 4]) * 60 + _digits(chars, [6, 7])
+    return (seconds * NS_PER_SECOND)[codes]
+
+
+def parse_datetimes(dates, hours):
+    """Epoch nanoseconds of separate "YYYY.MM.DD" date and "HH:MM:SS" hour columns.
+
+    Parameters
+    ----------
+    dates: array-like
+        strings with the "YYYY.MM.DD" layout.
+    hours: array-like
+        strings with the "HH:MM:SS" layout.
+
+    Returns
+    -------
+    datetimes: numpy.ndarray
+        int64 epoch nanoseconds, `.astype("datetime64[ns]")` to get datetimes.
+
+    Examples
+    --------
+    >>> df = pandas.read_csv("./data/WIN$N_30M_2015.08.12_2021.01.22_.csv")
+    >>> parse_datetimes(df["date"], df["hour"])[:2].astype("datetime64[ns]")
+    array(['2015-08-12T09:00:00.000000000', '2015-08-12T09:30:00.000000000'], dtype='datetime64[ns]')
+
+    """
+    return parse_dates(dates) + parse_hours(hours)
@@ -4,6 +4,7 @@ import os
 import json
 import pandas
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 
 import pandas as pd
 
@@ -17,7 +18,11 @@ import datetime  # For datetime objects
 
 from src.helpers.args import parse_args
 from time import process_time
-from src.helpers.datafeed import pandasdatafeed
+from src.helpers.datafeed import NumpyData, SharedArrays, numpydatafeed, warmup_bars, resolve_datapath
+from src.helpers.cache import DATASET_CACHE
+from src.helpers.timeparse import parse_dates, NS_PER_DAY
+from src.helpers.store import read_calendar
+from src.helpers import results as results_store
 
 # from strategies import TestStrategy
 # from strategies import MainStrategy
@@ -25,6 +30,15 @@ from src.helpers.datafeed import pandasdatafeed
 # import collections
 # import quantstats
 
+# metrics kept for each params set in the optimization logs: (analyzer, keys of its analysis)
+LOG_METRICS = {
+    "vwr": ("VWR", ["vwr"]),
+    "sqn": ("SQN", ["sqn"]),
+    "trades": ("SQN", ["trades"]),
+    # pnl.net.total: profit and loss of the closed trades, minus commission
+    "total": ("TradeAnalyzer", ["pnl", "net", "total"]),
+}
+
 TFRAMES = dict(
     minutes=bt.TimeFrame.Minutes,
     days=bt.TimeFrame.Days,
@@ -55,12 +69,15 @@ def runstrat_opt(settings, **kwargs):
 
     args = parse_args(kwargs)
 
+    # workers attach to the data in shared memory, so it must not be preloaded in the parent
+    sharedmem = args.sharedmem and (args.maxcpus != 1)
+
     # Create a cerebro entity
     cerebro = bt.Cerebro(stdstats=False,
                          maxcpus=args.maxcpus,
                          runonce=not args.no_runonce,
                          exactbars=args.exactbars,
-                         optdatas=not args.no_optdatas,
+                         optdatas=not (args.no_optdatas or sharedmem),
                          optreturn=not args.no_optreturn
                          )
 
@@ -76,10 +93,16 @@ def runstrat_opt(settings, **kwargs):
     datapath = args.data
 
     # Pass it to the backtrader datafeed and add it to the cerebro
-    data = bt.feeds.PandasData(dataname=pandasdatafeed(datapath, args=args),
-                               fromdate=getattr(args, opt_type)["fromdate"], # fromdate=args.train["fromdate"],  # fromdate=args.fromdate,
-                               todate=getattr(args, opt_type)["todate"] # todate=args.train["todate"] # todate=args.todate)
-                               )
+    fromdate = getattr(args, opt_type)["fromdate"]
+    todate = getattr(args, opt_type)["todate"]
+    warmup = warmup_bars(kwargs[output_key].get(signal))
+    dataname = numpydatafeed(datapath, args=args, fromdate=fromdate, todate=todate, warmup=warmup)
+    if sharedmem:
+        dataname = SharedArrays(dataname)
+    data = NumpyData(dataname=dataname, warmup=warmup,
+                     fromdate=fromdate, # fromdate=args.train["fromdate"],  # fromdate=args.fromdate,
+                     todate=todate # todate=args.train["todate"] # todate=args.todate)
+                     )
 
     cerebro.adddata(data)
 
@@ -105,75 +128,266 @@ def runstrat_opt(settings, **kwargs):
     # Print out the starting conditions
     # print('Starting Portfolio Value: %.2f' % cerebro.broker.getvalue())
 
+    # Log each params set as soon as its run ends
+    optlog = OptLog()
+    cerebro.optcallback(optlog)
+
     # Run over everything
-    results = cerebro.run()
+    try:
+        cerebro.run()
+    finally:
+        if sharedmem:
+            dataname.unlink()
 
-    # Extract/save analyzers
-    analyzers_log(settings, results)
+    # Save analyzers
+    analyzers = optlog.write(settings)
 
     # clock the end of the process
     tend = process_time()
 
     # print out the result
     print('Time used:', str(tend - tstart))
+    return analyzers
 
 
-def analyzers_log(settings, results):
-    analyzers_dict = {}
+class OptLog(object):
+    """Log of an optimization filled while it runs, one row per params set.
+
+    Registered with `cerebro.optcallback`, it is called with the results of each params set as
+    soon as its run ends, and keeps only its params and its `LOG_METRICS`, in column buffers.
+    The rest of the analyses are cleared, so the results kept by cerebro do not grow with them.
+    """
     params_pop = ['plot_entry', 'plot_exit', 'limdays', 'printlog']
-    for stratrun in results:
+
+    def __init__(self):
+        self.rows_params = []
+        self.metrics = {column: [] for column in LOG_METRICS}
+
+    def __call__(self, stratrun):
         for strat in stratrun:
-            params = strat.params.__dict__
-            [params.pop(param) for param in params_pop if param in params]
-            analysis_value = {analyzer.__class__.__name__: analyzer.get_analysis() for analyzer in strat.analyzers}
-            analysis_key = json.dumps(params, cls=NpEncoder)
-            analyzers_dict.update({analysis_key: analysis_value})
-
-    filepath = settings["opt_analyzer"]["path_log"].format(params['signal'])
-    json.dump(analyzers_dict, open(filepath, "w"), sort_keys=True, indent=4)
-    return None
+            params = dict(strat.params.__dict__)
+            for param in self.params_pop:
+                params.pop(param, None)
+            self.rows_params.append(params)
+
+            analyses = {analyzer.__class__.__name__: analyzer.get_analysis() for analyzer in strat.analyzers}
+            for column, (analyzer, keys) in LOG_METRICS.items():
+                self.metrics[column].append(metric_value(analyses.get(analyzer), keys))
+            for analyzer in strat.analyzers:
+                if getattr(analyzer, "rets", None) is not None:
+                    analyzer.rets.clear()
+
+    def table(self):
+        table = params_columns(self.rows_params)
+        for column, values in self.metrics.items():
+            table[column] = np.array(values, dtype=np.float64)
+        return table
+
+    def write(self, settings):
+        """Save the table as the log of the signal, see `log_path`."""
+        table = self.table()
+        write_table(log_path(settings, self.rows_params[-1]['signal']), table)
+        return table
+
+
+def analyzers_log(settings, results):
+    """Columnar table of the optimization, one row per params set, saved as the log of the signal.
+
+    Instead of the whole `get_analysis()` of each analyzer, only the metrics of `LOG_METRICS` are
+    kept, as float64 columns (NaN when missing), next to one column per param. `runstrat_opt`
+    fills the same table during the run, see `OptLog`.
+    """
+    optlog = OptLog()
+    for stratrun in results:
+        optlog(stratrun)
+    return optlog.write(settings)
+
+
+def metric_value(analysis, keys):
+    """Value of the nested `keys` of an analysis, None where any of them is missing (e.g. no trades)."""
+    for key in keys:
+        analysis = None if analysis is None else analysis.get(key)
+    return analysis
+
+
+def metric_column(analyses, keys):
+    """float64 column of the nested `keys` of each analysis, NaN where any of them is missing (e.g. no trades)."""
+    return np.array([metric_value(analysis, keys) for analysis in analyses], dtype=np.float64)
+
+
+def params_columns(rows_params):
+    """One column per param of a list of params dicts.
+
+    Numbers, booleans and strings are kept as typed numpy arrays, any other value (e.g. the
+    `time_start` lists) as its JSON string, listed in the "_json" column.
+    """
+    names = list(rows_params[0].keys()) if rows_params else []
+    frame = pandas.DataFrame.from_records(rows_params, columns=names)
+    table = {"_params": np.asarray(names, dtype=str)}
+    json_names = []
+    for name in names:
+        kind = pandas.api.types.infer_dtype(frame[name], skipna=False)
+        if kind in ("integer", "floating", "mixed-integer-float", "boolean"):
+            table[name] = np.asarray(frame[name].tolist()) if frame[name].dtype == object else frame[name].to_numpy()
+        elif kind == "string":
+            table[name] = frame[name].to_numpy().astype(str)
+        else:
+            # a few distinct values (e.g. the `time_start` lists), each one encoded once
+            codes, uniques = pandas.factorize(frame[name].map(repr))
+            first = np.unique(codes, return_index=True)[1]
+            encoded = [json.dumps(frame[name].iat[idx], cls=NpEncoder) for idx in first]
+            table[name] = np.asarray(encoded, dtype=str)[codes]
+            json_names.append(name)
+    table["_json"] = np.asarray(json_names, dtype=str)
+    return table
+
+
+def table_params(table, index):
+    """Params dict of one row of a `params_columns` table, with python values."""
+    json_names = set(table["_json"].tolist())
+    return {name: json.loads(str(table[name][index])) if name in json_names else table[name][index].item()
+            for name in table["_params"].tolist()}
+
+
+def log_path(settings, signal):
+    """Log of the last optimization of a signal, `path_log_opt` (or `path_log` with the ".npz" extension)."""
+    path_log_opt = settings["opt_analyzer"].get("path_log_opt", None)
+    if path_log_opt is None:
+        path_log_opt = os.path.splitext(settings["opt_analyzer"]["path_log"])[0] + ".npz"
+    return path_log_opt.format(signal)
+
+
+def read_log(settings, signal):
+    """Table of the last optimization of a signal, from its npz log or else its former JSON log."""
+    filepath = log_path(settings, signal)
+    if os.path.isfile(filepath):
+        return read_table(filepath)
+    return json_log_table(settings["opt_analyzer"]["path_log"].format(signal))
+
+
+def json_log_table(filepath):
+    """Table of a former `analyzer_{signal}.json` log, the analyses keyed by the JSON of their params."""
+    analyzers = json.load(open(filepath, "r"))
+    table = params_columns([json.loads(key) for key in analyzers])
+    for column, (analyzer, keys) in LOG_METRICS.items():
+        table[column] = metric_column([analysis.get(analyzer) for analysis in analyzers.values()], keys)
+    return table
+
+
+def write_table(filepath, table):
+    # windows of the same signal may run at the same time, readers never see a partial log
+    tmppath = "{}.{}.tmp".format(filepath, os.getpid())
+    with open(tmppath, "wb") as file:
+        np.savez(file, **table)
+    os.replace(tmppath, filepath)
+    return filepath
+
+
+def read_table(filepath):
+    with np.load(filepath, allow_pickle=False) as npz:
+        return {name: npz[name] for name in npz.files}
 
 
 def analyzers_read(settings, **kwargs):
+    opt_type = kwargs.get("opt_type")
+    output = analyzers_select(settings, **kwargs)
+    analyzers_write(settings, output, opt_type=opt_type)
+    return None
+
+
+def analyzers_select(settings, analyzers=None, **kwargs):
+    """Best params of the optimization of one window and signal, by `settings["opt_analyzer"]["analyzer_opt"]`.
+
+    Parameters
+    ----------
+    analyzers: dict
+        table of the params sets and their metrics, as returned by `runstrat_opt`, None to read the
+        log of the signal (see `read_log`).
+
+    Returns
+    -------
+    output: dict
+        the `kwargs` of the window, with the best params of the signal and their analyzers.
+
+    """
     opt_type = kwargs.pop("opt_type")
     filename, output_key = filename_key_opt_type(settings, opt_type=opt_type)
 
-    objective_opt = settings["opt_analyzer"]["analyzer_opt"]
+    objectives = settings["opt_analyzer"]["analyzer_opt"]
+    objectives = [objectives] if isinstance(objectives, str) else list(objectives)
     signal_opt = list(kwargs[output_key].keys())[0]
 
     output = {}
     output.update(kwargs)
-    analyzers_keys = {
-        "SQN": ["sqn"],
-        "VWR": ["vwr"],
-        "TradeAnalyzer": ['pnl'],   # pnl (float): current profit and loss of the trade (gross pnl)
-        # "TimeDrawDown": ["maxdrawdown", "maxdrawdownperiod"]
-    }
+    if analyzers is None:
+        analyzers = read_log(settings, signal_opt)
 
-    filepath = settings["opt_analyzer"]["path_log"].format(signal_opt)
-    analyzers = json.load(open(filepath, 'r'))
-    analyzers_df = pandas.DataFrame()
-    df = pandas.DataFrame(analyzers).T
-
-    # filter params of analyzers
-    for key, values in analyzers_keys.items():
-        df_sample = df[key].apply(pandas.Series).loc[:, values]
-        if key == "TradeAnalyzer":      # pnlcomm (float): current profit and loss of the trade minus commission (net pnl)
-            df_sample = df_sample[values[0]].apply(pd.Series)["net"]
-            df_sample = df_sample.apply(pandas.Series).loc[:, ["total"]]
-        analyzers_df = pandas.concat([analyzers_df, df_sample], axis=1)
-
-    best = analyzers_df.sort_values(by=objective_opt, ascending=False).head(1)
-    best_index = json.loads(best.first_valid_index())
+    best = rank_params(analyzers, objectives, k=1)[0]
+    best_index = table_params(analyzers, best)
     signal = best_index.pop("signal")
     output[output_key][signal] = best_index
 
-    output[output_key][signal]["analyzer_opt"] = {}
-    output[output_key][signal]["analyzer_opt"][objective_opt] = best[objective_opt].values[0]
+    # objectives first, then sqn and total as before the multi-objective ranking
+    output[output_key][signal]["analyzer_opt"] = {column: analyzers[column][best].item()
+                                                  for column in objectives + ["sqn", "total"]}
+    return output
+
+
+def rank_params(table, objectives, k=1):
+    """Rows of the `k` best params sets of a `params_columns` table, best first.
+
+    Parameters
+    ----------
+    table: dict
+        params and metric columns, as returned by `analyzers_log`.
+    objectives: list
+        metric columns to maximize, the next ones only break the ties of the previous ones
+        (e.g. ["vwr", "sqn", "total"]). NaN metrics rank last, remaining ties keep the first
+        params set run.
+    k: int
+        number of rows.
+
+    Returns
+    -------
+    rows: numpy.ndarray
+        row indices of the table.
+
+    Examples
+    --------
+    >>> rank_params({"vwr": np.array([1., 3., 3., np.nan]), "sqn": np.array([0., 1., 2., 5.])}, ["vwr", "sqn"], k=2)
+    array([2, 1])
+
+    """
+    keys = [np.nan_to_num(np.asarray(table[objective], dtype=np.float64), nan=-np.inf) for objective in objectives]
+    size = len(keys[0])
+    k = min(k, size)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+
+    primary = keys[0]
+    if k == 1:
+        threshold = primary[np.argmax(primary)]
+    else:
+        threshold = primary[np.argpartition(primary, size - k)[size - k]]
+    # every row tied with the k-th best is a candidate, ordered by all the objectives
+    candidates = np.flatnonzero(primary >= threshold)
+    if (len(candidates) == k) and (len(objectives) == 1):
+        order = np.argsort(-primary[candidates], kind="stable")
+    else:
+        order = np.lexsort([candidates] + [-key[candidates] for key in keys[::-1]])
+    return candidates[order[:k]]
+
+
+def analyzers_write(settings, output, **kwargs):
+    """Save the best params of a window and signal into the results database (or file) of `opt_type`."""
+    opt_type = kwargs.get("opt_type")
+    filename, output_key = filename_key_opt_type(settings, opt_type=opt_type)
+    signal = list(output[output_key].keys())[0]
 
-    # prototipe for multiobjective
-    output[output_key][signal]["analyzer_opt"]["sqn"] = best["sqn"].values[0]
-    output[output_key][signal]["analyzer_opt"]["total"] = best["total"].values[0]
+    path_results = results_store.results_path(settings)
+    if path_results is not None:
+        results_store.write_result(path_results, opt_type, output, output_key)
+        return None
 
     with open(filename, "r+") as file:
         data = json.load(file)
@@ -194,45 +408,39 @@ def analyzers_read(settings, **kwargs):
 
 def daterange_opt(settings, **kwargs):
     datapath = settings.get("opt_analyzer").get("datapath")
-    dates_file_str = pandas.read_csv(datapath)["date"].unique()
-    dates_file = [datetime.datetime.strptime(dt, "%Y.%m.%d") for dt in dates_file_str]
+    # session dates come from the day index of the columnar store, built once at ingestion,
+    # resampled series have the same sessions as their source file
+    source, minutes = resolve_datapath(datapath)
+    calendar = DATASET_CACHE.load(source, ["days"], np.int64, loader=read_calendar)
+    days = calendar["days"]
 
     fromdate = settings.get("opt_analyzer").get("fromdate")
     todate = settings.get("opt_analyzer").get("todate")
     daterange_opt = settings.get("opt_analyzer").get("daterange_opt")
     daterange_opt_train = settings.get("opt_analyzer").get("daterange_opt_train")
 
-    if (fromdate == "") & (todate == ""):
-        fromdate = dates_file[0]
-        todate = dates_file[-1]
-    elif (fromdate != "") & (todate == ""):
-        fromdate = datetime.datetime.strptime(fromdate, "%Y.%m.%d")
-        todate = dates_file[-1]
-    elif (fromdate == "") & (todate != ""):
-        todate = datetime.datetime.strptime(todate, "%Y.%m.%d")
-        fromdate = dates_file[0]
+    # first session on/after fromdate and last session on/before todate
+    idx_from = 0
+    idx_to = len(days) - 1
+    if fromdate != "":
+        idx_from = int(np.searchsorted(days, parse_dates([fromdate])[0] // NS_PER_DAY, side="left"))
+    if todate != "":
+        idx_to = int(np.searchsorted(days, parse_dates([todate])[0] // NS_PER_DAY, side="right")) - 1
 
     days_train = round(daterange_opt * daterange_opt_train)
     days_test = daterange_opt - days_train
-    last_date_bin = fromdate
-    dates = {}
-    i = 0
 
-    while dates_file.index(todate) > dates_file.index(last_date_bin) + daterange_opt:
-        fromdate_bin_train = last_date_bin
-        todate_bin_train_idx = dates_file.index(fromdate_bin_train) + days_train - 1
-        todate_bin_train = dates_file[todate_bin_train_idx]
-
-        fromdate_bin_test = dates_file[todate_bin_train_idx + 1]
-        todate_bin_test_idx = dates_file.index(fromdate_bin_test) + days_test - 1
-        todate_bin_test = dates_file[todate_bin_test_idx]
-
-        last_date_bin = dates_file[todate_bin_test_idx + 1]
-        bin_dates = {"train": {"fromdate": fromdate_bin_train, "todate": todate_bin_train},
-                     "test": {"fromdate": fromdate_bin_test, "todate": todate_bin_test}}
-        dates.update({i: bin_dates})
-        i += 1
+    # windows start every daterange_opt sessions while idx_to > start + daterange_opt
+    n_bins = max(-((idx_from + daterange_opt - idx_to) // daterange_opt), 0)
+    starts = idx_from + daterange_opt * np.arange(n_bins)
+    bounds = np.stack([starts, starts + days_train - 1, starts + days_train, starts + days_train + days_test - 1])
+    bounds_dates = (days[bounds.ravel()] * NS_PER_DAY).astype("datetime64[ns]").astype("datetime64[us]").tolist()
+    bounds_dates = np.array(bounds_dates, dtype=object).reshape(bounds.shape)
 
+    dates = {}
+    for i, (fromdate_train, todate_train, fromdate_test, todate_test) in enumerate(bounds_dates.T):
+        dates[i] = {"train": {"fromdate": fromdate_train, "todate": todate_train},
+                    "test": {"fromdate": fromdate_test, "todate": todate_test}}
     return dates
 
 
@@ -268,7 +476,7 @@ def params_ops_signals(settings_path, **kwargs):
     return params_opt
 
 
-def params_ops_validate(settings, **kwargs):
+def params_ops_validate(settings, completed=None, **kwargs):
     opt_type = kwargs.pop("opt_type")
     filename, output_key = filename_key_opt_type(settings, opt_type=opt_type)
     output = {}
@@ -278,6 +486,15 @@ def params_ops_validate(settings, **kwargs):
     if kwargs.get("override"):
         return False
 
+    # keys read once by `completed_tasks`, instead of reading the results for every window
+    if completed is not None:
+        return results_store.result_key(opt_type, output, signal_opt) in completed
+
+    path_results = results_store.results_path(settings)
+    if path_results is not None:
+        return results_store.has_result(path_results, opt_type, output.get(opt_type).get("fromdate"),
+                                        output.get(opt_type).get("todate"), signal_opt)
+
     with open(filename, "r") as file:
         data = json.load(file)
         for idx, row in enumerate(data):
@@ -289,6 +506,16 @@ def params_ops_validate(settings, **kwargs):
     return False
 
 
+def completed_tasks(settings, **kwargs):
+    """Set of the (opt_type, fromdate, todate, signal) keys of the windows and signals already saved."""
+    opt_type = kwargs.get("opt_type")
+    filename, output_key = filename_key_opt_type(settings, opt_type=opt_type)
+    path_results = results_store.results_path(settings)
+    if path_results is not None:
+        return results_store.result_keys(path_results, opt_type)
+    return results_store.json_result_keys(filename, opt_type, output_key)
+
+
 def filename_key_opt_type(settings, **kwargs):
     opt_type_dict = {
         "train": {"key": "output_train_key", "path": "path_output_train"},
@@ -310,22 +537,88 @@ def main(settings, **kwargs):
     if os.path.isfile(filename) is False:
         json.dump([], open(filename, "w"), sort_keys=True, indent=4)
 
+    # results saved in the file before the database was set up
+    path_results = results_store.results_path(settings)
+    if (path_results is not None) and (results_store.count_results(path_results, opt_type) == 0):
+        results_store.import_json(path_results, opt_type, filename, output_key)
+
     # run script for each params set
     params = kwargs.get("params")
-    for params_opt in params:
+    # validate if params already calculated, very helpful is case the code breaks
+    completed = completed_tasks(settings, opt_type=opt_type)
+    params = [params_opt for params_opt in params
+              if not params_ops_validate(settings, completed=completed, override=False, opt_type=opt_type,
+                                         **params_opt)]
+
+    workers = kwargs.get("workers", settings["opt_analyzer"].get("workers", 1))
+    workers, maxcpus = schedule_workers(workers, len(params))
+    if workers <= 1:
+        for params_opt in params:
+            # run optimization strategy and select best parameters for given signal
+            output = runstrat_task(settings, opt_type, params_opt)
+            # save them
+            analyzers_write(settings, output, opt_type=opt_type)
+            completed.update(results_store.result_key(opt_type, output, signal) for signal in output[output_key])
+        export_results(settings, opt_type=opt_type)
+        return None
+
+    # windows and signals are independent, each worker runs one of them with its share of the cores
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(runstrat_task, settings, opt_type,
+                                   dict(params_opt, maxcpus=min(params_opt.get("maxcpus") or maxcpus, maxcpus)))
+                   for params_opt in params]
+        # only the parent writes the results file, in the same order as a serial run
+        for future in futures:
+            output = future.result()
+            analyzers_write(settings, output, opt_type=opt_type)
+            completed.update(results_store.result_key(opt_type, output, signal) for signal in output[output_key])
+
+    export_results(settings, opt_type=opt_type)
+    return None
 
-        # validate if params already calculated, very helpful is case the code breaks
-        if params_ops_validate(settings, override=False, opt_type=opt_type, **params_opt):
-            continue
 
-        else:
-            # run optimization strategy
-            runstrat_opt(settings, opt_type=opt_type, **params_opt)
+def export_results(settings, **kwargs):
+    """Rewrite the results file of `opt_type` from the results database, if there is one."""
+    opt_type = kwargs.get("opt_type")
+    filename, output_key = filename_key_opt_type(settings, opt_type=opt_type)
+    path_results = results_store.results_path(settings)
+    if path_results is not None:
+        results_store.export_json(path_results, opt_type, filename)
+    return None
 
-            # select best parameters for given signal and save
-            analyzers_read(settings, opt_type=opt_type, **params_opt)
 
-    return None
+def runstrat_task(settings, opt_type, params_opt):
+    """Optimization of one window and signal, returning its best params (run in the workers of `main`)."""
+    analyzers = runstrat_opt(settings, opt_type=opt_type, **params_opt)
+    return analyzers_select(settings, analyzers=analyzers, opt_type=opt_type, **params_opt)
+
+
+def schedule_workers(workers, tasks, cpus=None):
+    """Number of optimizations run at the same time and cerebro `maxcpus` of each one.
+
+    Parameters
+    ----------
+    workers: int
+        optimizations at the same time, 0 to use all available CPUs.
+    tasks: int
+        number of (window, signal) optimizations to run.
+
+    Returns
+    -------
+    workers, maxcpus: int
+        workers * maxcpus never exceeds the available CPUs.
+
+    Examples
+    --------
+    >>> schedule_workers(0, tasks=100, cpus=8)
+    (8, 1)
+    >>> schedule_workers(2, tasks=100, cpus=8)
+    (2, 4)
+
+    """
+    cpus = cpus or os.cpu_count() or 1
+    workers = min(workers or cpus, cpus, max(tasks, 1))
+    return workers, max(cpus // workers, 1)
 
 
 if __name__ == '__main__':
@@ -11,9 +11,10 @@ import json
 import numpy as np
 import dateutil.parser
 
-from src.helpers.datafeed import pandasdatafeed
+from src.helpers.datafeed import NumpyData, numpydatafeed, streamingdata, streaming_kwargs, warmup_bars
 from time import process_time
 from src.helpers.args import parse_args
+from src.helpers import results as results_store
 from src import strategies
 
 
@@ -47,7 +48,7 @@ def runstrat_signals(settings, **kwargs):
                          # exactbars=args.exactbars,
                          # optdatas=not args.no_optdatas,
                          # optreturn=not args.no_optreturn
-                         )
+                         **streaming_kwargs(args))
 
     # Add a strategy
     strategy = getattr(strategies, "".join([kwargs.get("signal_strategy"), "Strategy"]))
@@ -58,10 +59,17 @@ def runstrat_signals(settings, **kwargs):
     datapath = args.data
 
     # Pass it to the backtrader datafeed and add it to the cerebro
-    data = bt.feeds.PandasData(dataname=pandasdatafeed(datapath, args=args),
-                               fromdate=getattr(args, opt_type)["fromdate"], # fromdate=args.test["fromdate"],  # fromdate=args.fromdate,
-                               todate=getattr(args, opt_type)["todate"]  # todate=args.test["todate"] # todate=args.todate)
-                               )
+    fromdate = getattr(args, opt_type)["fromdate"]
+    todate = getattr(args, opt_type)["todate"]
+    warmup = warmup_bars(*kwargs.get("output_train", {}).values())
+    if args.streaming:
+        data = streamingdata(datapath, args=args, fromdate=fromdate, todate=todate, warmup=warmup)
+    else:
+        dataname = numpydatafeed(datapath, args=args, fromdate=fromdate, todate=todate, warmup=warmup)
+        data = NumpyData(dataname=dataname, warmup=warmup,
+                         fromdate=fromdate, # fromdate=args.test["fromdate"],  # fromdate=args.fromdate,
+                         todate=todate  # todate=args.test["todate"] # todate=args.todate)
+                         )
     cerebro.adddata(data)
 
     # Set our desired cash start
@@ -122,6 +130,11 @@ def analyzers_signals_read(settings, **kwargs):
     # opt_type = kwargs.pop("opt_type")
     filename, output_key = filename_key_opt_type(settings, opt_type=opt_type)
 
+    path_results = results_store.results_path(settings)
+    if path_results is not None:
+        results_store.write_result(path_results, opt_type, output, output_key)
+        return None
+
     with open(filename, "r+") as file:
         data = json.load(file)
         match_date = False
@@ -152,7 +165,7 @@ def datetime_parser(json_dict):
     return json_dict
 
 
-def params_output_validate(settings, **kwargs):
+def params_output_validate(settings, completed=None, **kwargs):
     signal = kwargs.pop("signal")  # signal = "Signals"
     opt_type = kwargs.pop("opt_type")   # opt_type = "test"
     filename, output_key = filename_key_opt_type(settings, opt_type=opt_type)
@@ -163,6 +176,15 @@ def params_output_validate(settings, **kwargs):
     if kwargs.get("override"):
         return False
 
+    # keys read once by `completed_tasks`, instead of reading the results for every window
+    if completed is not None:
+        return results_store.result_key("test", output, signal) in completed
+
+    path_results = results_store.results_path(settings)
+    if path_results is not None:
+        return results_store.has_result(path_results, opt_type, output.get("test").get("fromdate"),
+                                        output.get("test").get("todate"), signal)
+
     with open(filename, "r") as file:
         data = json.load(file)
         for idx, row in enumerate(data):
@@ -188,6 +210,16 @@ def filename_key_opt_type(settings, **kwargs):
     return filename, output_key
 
 
+def completed_tasks(settings, **kwargs):
+    """Set of the (opt_type, fromdate, todate, signal) keys of the windows and signals already saved."""
+    opt_type = kwargs.get("opt_type")
+    filename, output_key = filename_key_opt_type(settings, opt_type=opt_type)
+    path_results = results_store.results_path(settings)
+    if path_results is not None:
+        return results_store.result_keys(path_results, opt_type)
+    return results_store.json_result_keys(filename, opt_type, output_key)
+
+
 def main(settings, **kwargs):
     filename, output_key = filename_key_opt_type(settings, opt_type="test")
     filename_train, output_key_train = filename_key_opt_type(settings, opt_type="train")
@@ -196,14 +228,25 @@ def main(settings, **kwargs):
     if os.path.isfile(filename) is False:
         json.dump([], open(filename, "w"), sort_keys=True, indent=4)
 
-    params = json.load(open(filename_train, "r"), object_hook=datetime_parser)
-
+    path_results = results_store.results_path(settings)
+    if path_results is not None:
+        # results saved in the files before the database was set up
+        if results_store.count_results(path_results, "train") == 0:
+            results_store.import_json(path_results, "train", filename_train, output_key_train)
+        if results_store.count_results(path_results, "test") == 0:
+            results_store.import_json(path_results, "test", filename, output_key)
+        params = results_store.read_rows(path_results, "train", object_hook=datetime_parser)
+    else:
+        params = json.load(open(filename_train, "r"), object_hook=datetime_parser)
+
+    completed = completed_tasks(settings, opt_type="test")
     for idx, params_opt in enumerate(params):
 
         signals = ["Signals", "BuyHold"]
         for signal in signals:
             # validate if params already calculated, very helpful in case the code breaks
-            if params_output_validate(settings, override=False, opt_type="test", signal=signal, **params_opt):
+            if params_output_validate(settings, completed=completed, override=False, opt_type="test", signal=signal,
+                                      **params_opt):
                 continue
 
             else:
@@ -212,7 +255,10 @@ def main(settings, **kwargs):
 
                 # read analyzers and save output
                 analyzers_signals_read(settings, opt_type="test", signal_strategy=signal, **params_opt)
+                completed.add(results_store.result_key("test", params_opt, signal))
 
+    if path_results is not None:
+        results_store.export_json(path_results, "test", filename)
     return None
 
 
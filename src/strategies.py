@@ -12,6 +12,7 @@ import quantstats
 
 # from args import parse_args
 from src import signals
+from src.helpers.datafeed import warming_up
 from time import process_time
 
 
@@ -135,6 +136,10 @@ class MainStrategy(bt.Strategy):
 
     def next(self):
         """Simply log the closing price of the series from the reference"""
+        # bars before fromdate only warm up the indicators
+        if warming_up(self.data):
+            return
+
 
         if self.signal_time.signal[0] == 0:
             if self.orefs:
@@ -303,6 +308,8 @@ class TestStrategy(bt.Strategy):
 
     def next(self):
         # Simply log the closing price of the series from the reference
+        if warming_up(self.data):
+            return
         self.log('Close, %.2f' % self.dataclose[0])
 
         # Check if an order is pending ... if yes, we cannot send a 2nd one
@@ -438,6 +445,10 @@ class OptStrategy(bt.Strategy):
 
     def next(self):
         """Simply log the closing price of the series from the reference"""
+        # bars before fromdate only warm up the indicators
+        if warming_up(self.data):
+            return
+
 
         # self.log('Datetime: %s, Open: %.2f, High: %.2f, Low: %.2f, Close: %.2f' %
         #       (self.data.datetime.datetime(0),
@@ -686,6 +697,10 @@ class SignalsStrategy(bt.Strategy):
 
     def next(self):
         """Simply log the closing price of the series from the reference"""
+        # bars before fromdate only warm up the indicators
+        if warming_up(self.data):
+            return
+
 
         if self.signal_time.signal[0] == 0:
             if self.orefs:
@@ -901,6 +916,10 @@ class BuyHoldStrategy(bt.Strategy):
 
     def next(self):
         """Simply log the closing price of the series from the reference"""
+        # bars before fromdate only warm up the indicators
+        if warming_up(self.data):
+            return
+
         # Check if an order is in Pending state, if yes, we cannot send a 2nd one
         if self.orefs:
             self.log('An order already in Pending state')
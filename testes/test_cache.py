@@ -0,0 +1,61 @@
+import os
+import numpy as np
+import pandas
+
+from testes import context
+from testes.test_store import write_csv
+from src.helpers.cache import DatasetCache, dataset_nbytes
+from src.helpers.store import read_store
+
+
+def test_dataset_nbytes():
+    assert dataset_nbytes(np.zeros(10)) == 80
+    assert dataset_nbytes({"a": np.zeros(10), "b": [np.zeros(5, dtype=np.int32)]}) == 100
+    assert dataset_nbytes(pandas.DataFrame({"a": np.zeros(10)})) >= 80
+
+
+def test_dataset_cache_load(tmp_path):
+    datapath = write_csv(tmp_path)
+    calls = []
+
+    def loader(path):
+        calls.append(path)
+        return read_store(path)
+
+    cache = DatasetCache()
+    output = cache.load(datapath, ["datetime", "close"], "int64", loader=loader)
+    assert cache.load(datapath, ["datetime", "close"], "int64", loader=loader) is output
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1
+
+    # another dtype is another dataset
+    cache.load(datapath, ["datetime", "close"], "float64", loader=loader)
+    assert len(calls) == 2
+
+    # source changed on disk
+    with open(datapath, "a") as file:
+        file.write("2015.08.13,09:05:00,50150,50160,50100,50120,80,10\n")
+    output = cache.load(datapath, ["datetime", "close"], "int64", loader=loader)
+    assert len(calls) == 3
+    assert len(output["close"]) == 4
+
+
+def test_dataset_cache_eviction(tmp_path):
+    paths = [write_csv(tmp_path, name="file_{}.csv".format(idx)) for idx in range(3)]
+    cache = DatasetCache(maxbytes=2 * 800)
+    for path in paths:
+        cache.load(path, loader=lambda path: np.zeros(100))
+    assert len(cache) == 2
+    assert cache.stats()["evictions"] == 1
+    assert cache.key(paths[0]) not in cache
+
+    # most recently used entries are kept
+    cache.load(paths[1], loader=lambda path: np.zeros(100))
+    cache.load(paths[0], loader=lambda path: np.zeros(100))
+    assert cache.key(paths[1]) in cache
+    assert cache.key(paths[2]) not in cache
+
+    # the newest entry is kept even above the budget
+    cache.load(paths[2], loader=lambda path: np.zeros(1000))
+    assert len(cache) == 1
+    assert cache.nbytes == 8000
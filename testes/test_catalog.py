@@ -0,0 +1,52 @@
+import os
+import json
+import numpy as np
+
+from testes import context
+from testes.test_store import write_csv
+from data.analysis import catalog
+
+HEADER = "date,hour,open,high,low,close,real_volume,tick_volume\n"
+
+
+def write_file(tmp_path, name, dates):
+    content = HEADER + "".join("{},09:00:00,1,1,1,1,1,1\n{},09:01:00,1,1,1,1,1,1\n".format(date, date)
+                               for date in dates)
+    return write_csv(tmp_path, content, name=name)
+
+
+def test_parse_filename():
+    assert catalog.parse_filename("./data/WIN$N_10M_2013.11.08_2021.01.22_.csv") == ("WIN$N", "10M")
+
+
+def test_encode_days():
+    days = np.array([16659, 16660, 16664, 16700])
+    entry = {"rows": 4, "first": "2015.08.12", "last": "2015.09.25", "days": catalog.encode_days(days)}
+    assert list(catalog.entry_days(entry)) == list(days)
+    assert catalog.format_days(days[:2]) == ["2015.08.12", "2015.08.13"]
+
+
+def test_read_catalog(tmp_path):
+    file1 = write_file(tmp_path, "WIN$N_1M_a_.csv", ["2015.08.12", "2015.08.13", "2015.08.17"])
+    file2 = write_file(tmp_path, "WIN$N_10M_b_.csv", ["2015.08.13", "2015.08.14", "2015.08.17", "2015.08.18"])
+    file3 = write_file(tmp_path, "WIN$N_10M_c_.csv", ["2015.09.01"])
+
+    entries = catalog.read_catalog([file1, file2, file3])
+    assert entries[file1]["freq"] == "1M"
+    assert entries[file1]["symbol"] == "WIN$N"
+    assert (entries[file1]["first"], entries[file1]["last"], entries[file1]["rows"]) == ("2015.08.12", "2015.08.17", 6)
+    assert os.path.isfile(catalog.catalog_path(file1))
+
+    overlap = catalog.overlapping_days(entries[file1], entries[file2])
+    assert catalog.format_days(overlap) == ["2015.08.13", "2015.08.17"]
+    assert len(catalog.overlapping_days(entries[file1], entries[file3])) == 0
+
+    # entries are read back from the catalog, and rebuilt when the file changes
+    with open(catalog.catalog_path(file1), "r") as file:
+        assert set(json.load(file)["files"]) == {"WIN$N_1M_a_.csv", "WIN$N_10M_b_.csv", "WIN$N_10M_c_.csv"}
+    assert catalog.read_catalog([file1])[file1] == entries[file1]
+    write_file(tmp_path, "WIN$N_1M_a_.csv", ["2015.08.18"])
+    os.utime(file1, ns=(0, 0))
+    entry = catalog.read_catalog([file1])[file1]
+    assert entry["first"] == "2015.08.18"
+    assert entry["checksum"] != entries[file1]["checksum"]
@@ -1,7 +1,10 @@
 import os
+import numpy as np
 import pandas
 
-from data.analysis import data
+from testes.test_store import write_csv
+from data.analysis import data, catalog
+from src.helpers import store
 
 os.chdir('..')
 
@@ -119,3 +122,127 @@ def test_save_dfs():
     assert isinstance(output, list)
     assert len(output) == 2
     # assert mock_to_csv.called
+
+
+def test_merge_sorted_keys():
+    day = 86400 * 10**9
+    rows, splits = data.merge_sorted_keys([np.array([1, 2, 4]), np.array([2, 3]), np.array([40 * day])])
+    assert list(rows) == [0, 3, 4, 2, 5]
+    assert list(splits) == [4]
+
+    rows, splits = data.merge_sorted_keys([])
+    assert len(rows) == 0
+    assert len(splits) == 0
+
+
+def test_process_files_merge(tmp_path):
+    header = "date,hour,open,high,low,close,real_volume,tick_volume\n"
+    file1 = write_csv(tmp_path, header + "2015.08.12,10:00:00,3,3,3,3,1,1\n2015.08.12,9:00:00,1,1,1,1,1,1\n",
+                      name="WIN$N_1M_a.csv")
+    file2 = write_csv(tmp_path, header + "2015.08.12,10:00:00,4,4,4,4,1,1\n2015.08.13,09:00:00,5,5,5,5,1,1\n"
+                      "2015.10.01,09:00:00,6,6,6,6,1,1\n", name="WIN$N_1M_b.csv")
+
+    output = data.process_files([file1, file2])
+    assert len(output) == 2
+    assert list(output[0]["hour"]) == ["9:00:00", "10:00:00", "09:00:00"]
+    assert list(output[0]["close"]) == [1, 4, 5]
+    assert list(output[1]["date"]) == ["2015.10.01"]
+    assert list(output[1].index) == [3]
+    assert len(data.process_files([file1, file2], days_split=60)) == 1
+
+
+def test_merge_files_chunks(tmp_path):
+    header = "date,hour,open,high,low,close,real_volume,tick_volume\n"
+    bars = ["2015.08.12,09:0{}:00,{},{},{},{},1,1\n".format(minute, close, close, close, close)
+            for minute, close in zip(range(10), range(10))]
+    # oldest first, newest first and unordered exports, overlapping each other
+    file1 = write_csv(tmp_path, header + "".join(bars[0:5]), name="WIN$N_1M_a.csv")
+    file2 = write_csv(tmp_path, header + "".join(bars[3:8][::-1]).replace(",1,1\n", ",2,2\n"), name="WIN$N_1M_b.csv")
+    file3 = write_csv(tmp_path, header + "".join([bars[9], bars[2], bars[8]]), name="WIN$N_1M_c.csv")
+
+    chunks = list(data.merge_files([file1, file2, file3], chunksize=2))
+    assert max(len(keys) for df, keys in chunks) <= 6
+    keys = np.concatenate([keys for df, keys in chunks])
+    assert np.all(np.diff(keys) > 0)
+    df = pandas.concat([df for df, keys in chunks])
+    assert list(df["close"]) == list(range(10))
+    # repeated bars are taken from the latest file
+    assert list(df["real_volume"]) == [1, 1, 1, 2, 2, 2, 2, 2, 1, 1]
+
+    rows, splits = data.merge_sorted_keys([keys[:6], keys[3:]], chunksize=2)
+    assert list(rows) == [0, 1, 2, 6, 7, 8, 9, 10, 11, 12]
+
+
+def test_write_parts(tmp_path):
+    header = "date,hour,open,high,low,close,real_volume,tick_volume\n"
+    days = ["2015.08.12", "2015.08.13", "2015.10.01", "2015.12.01", "2015.12.02"]
+    file = write_csv(tmp_path, header + "".join("{},09:00:00,{},{},{},{},1,1\n".format(day, i, i, i, i)
+                                                for i, day in enumerate(days)), name="WIN$N_1M_a.csv")
+
+    path = str(tmp_path) + "/"
+    saved_files = data.write_parts(data.merge_files([file], chunksize=2), "1M", path=path)
+    assert saved_files == [path + "WIN$N_1M_2015.08.12_2015.08.13_.csv", path + "WIN$N_1M_2015.10.01_2015.10.01_.csv",
+                           path + "WIN$N_1M_2015.12.01_2015.12.02_.csv"]
+    assert [list(pandas.read_csv(file)["close"]) for file in saved_files] == [[0, 1], [2], [3, 4]]
+    assert sorted(os.listdir(tmp_path)) == sorted([os.path.basename(file) for file in saved_files] + ["WIN$N_1M_a.csv"])
+
+
+def test_split_date_points():
+    df = pandas.DataFrame({"date": ["2015.08.12", "2015.08.13", "2015.10.01", "2015.10.02", "2016.01.04"],
+                           "close": [1, 2, 3, 4, 5]})
+    assert list(data.split_date_points(df)) == [2, 4]
+    assert list(data.split_date_points(df, days_split=60)) == [4]
+
+    output = data.split_date_dfs(df)
+    assert [list(part["close"]) for part in output] == [[1, 2], [3, 4], [5]]
+    assert list(output[1].index) == [2, 3]
+    assert data.split_date_dfs(df, days_split=100)[0] is df
+
+
+def test_append_export(tmp_path):
+    header = "date,hour,open,high,low,close,real_volume,tick_volume\n"
+    rows = ["2015.08.12,09:00:00,1,1,1,1,1,1\n", "2015.08.12,09:01:00,2,2,2,2,1,1\n",
+            "2015.08.13,09:00:00,3,3,3,3,1,1\n", "2015.08.13,09:01:00,4,4,4,4,1,1\n",
+            "2015.08.14,09:00:00,5,5,5,5,1,1\n"]
+    target = write_csv(tmp_path, header + "".join(rows[:3]), name="WIN$N_1M_2015.08.12_2015.08.13_.csv")
+    export = write_csv(tmp_path, header + "".join(rows[4:] + rows[1:4]), name="export.csv")
+    store.read_store(target)
+    catalog.read_catalog([target])
+
+    checksum = catalog.read_catalog([target])[target]["checksum"]
+    renamed = str(tmp_path / "WIN$N_1M_2015.08.12_2015.08.14_.csv")
+    assert data.append_export(target, export) == (renamed, 2)
+    assert data.append_export(renamed, export) == (renamed, 0)
+    assert not os.path.exists(target)
+    with open(renamed, "r") as file:
+        assert file.read() == header + "".join(rows)
+
+    arrays = store.load_store(renamed)
+    assert arrays is not None
+    assert list(arrays["close"]) == [1, 2, 3, 4, 5]
+    assert list(arrays["offsets"]) == [0, 2, 4, 5]
+    entries = catalog.load_catalog(catalog.catalog_path(renamed))
+    assert list(entries) == [os.path.basename(renamed)]
+    entry = entries[os.path.basename(renamed)]
+    assert catalog.is_current(entry, renamed)
+    assert (entry["last"], entry["rows"]) == ("2015.08.14", 5)
+    # only the appended bytes are hashed, chained to the former checksum
+    assert entry["checksum"] == catalog.file_checksum(renamed, offset=len(header) + len("".join(rows[:3])),
+                                                      checksum=checksum)
+
+
+def test_main_append(tmp_path):
+    header = "date,hour,open,high,low,close,real_volume,tick_volume\n"
+    old = write_csv(tmp_path, header + "2015.08.10,09:00:00,1,1,1,1,1,1\n", name="WIN$N_1M_2015.08.10_2015.08.10_.csv")
+    target = write_csv(tmp_path, header + "2015.08.12,09:00:00,1,1,1,1,1,1\n", name="WIN$N_1M_2015.08.12_2015.08.12_.csv")
+    write_csv(tmp_path, header + "2015.08.12,09:00:00,1,1,1,1,1,1\n", name="WIN$N_5M_2015.08.12_2015.08.14_.csv")
+    export = write_csv(tmp_path, header + "2015.08.13,09:00:00,2,2,2,2,1,1\n2015.08.12,09:00:00,1,1,1,1,1,1\n",
+                       name="WIN$N_1M_2015.08.13_2015.08.12.csv")
+
+    assert data.consolidated_target(export, path=str(tmp_path)) == target
+    assert data.consolidated_target(str(tmp_path / "WIN$N_15M_a_b.csv"), path=str(tmp_path)) is None
+
+    renamed = str(tmp_path / "WIN$N_1M_2015.08.12_2015.08.13_.csv")
+    assert data.main(["--append", export, "--path", str(tmp_path)]) == {renamed: 1}
+    assert open(renamed).read().endswith("2015.08.13,09:00:00,2,2,2,2,1,1\n")
+    assert open(old).read().count("\n") == 2
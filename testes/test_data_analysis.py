@@ -1,8 +1,10 @@
 # import os
 # import glob
+import numpy as np
 import pandas
 # import datetime
 
+from testes.test_store import write_csv
 from data.analysis import data_analysis as da
 
 
@@ -50,12 +52,27 @@ def test_format_hour():
     df_input= pandas.DataFrame(data=data)
     data = {
         'date': {0: '2015.08.12', 1: '2015.08.12', 2: '2015.08.12', 3: '2015.08.12'},
-        'hour': {0: '09:01:00', 1: '09:03:00', 2: '09:05:00', 3: '17:02:00'}}
+        'hour': {0: '09:01:00', 1: '09:03:00', 2: '09:05:00', 3: '17:02:00'},
+        'time': {0: 32460 * 10**9, 1: 32580 * 10**9, 2: 32700 * 10**9, 3: 61320 * 10**9}}
     df_expected = pandas.DataFrame(data=data)
     output = da.format_hour(df_input)
     assert output.equals(df_expected)
 
 
+def test_format_hour_repeated():
+    df_input = pandas.DataFrame({'date': ['2015.08.13', '2015.08.12', '2015.08.12', '2015.08.12'],
+                                 'hour': ['9:00:00', '10:00:00', '9:00:00', '09:00:00'],
+                                 'close': [4, 3, 1, 2]}, index=[10, 11, 12, 13])
+    output = da.format_hour(df_input)
+    assert list(output.columns) == ['date', 'hour', 'time', 'close']
+    assert list(output['hour']) == ['09:00:00', '10:00:00', '09:00:00']
+    # time of day, in nanoseconds since midnight
+    assert output['time'].dtype == np.int64
+    assert list(output['time'] // 10**9) == [9 * 3600, 10 * 3600, 9 * 3600]
+    assert list(output['close']) == [1, 3, 4]
+    assert list(output.index) == [0, 1, 2]
+
+
 def test_filter_overlapping_files_dfs():
     files = da.list_data_files()
     file1 = files["1M"][0]
@@ -79,6 +96,20 @@ def test_filter_time_match():
     assert len(output) is 2
 
 
+def test_match_bars():
+    dt1 = np.array(["2015-08-12T08:59", "2015-08-12T09:00", "2015-08-12T09:09", "2015-08-12T09:10",
+                    "2015-08-12T09:25", "2015-08-12T09:30"], dtype="datetime64[ns]")
+    dt2 = np.array(["2015-08-12T09:00", "2015-08-12T09:10", "2015-08-12T09:20", "2015-08-12T09:30"],
+                   dtype="datetime64[ns]")
+    match1, offsets2 = da.match_bars(dt1, dt2, np.timedelta64(9, "m"))
+    assert list(match1) == [-1, 0, 0, 1, 2, 3]
+    assert offsets2.tolist() == [[1, 3], [3, 4], [4, 5], [5, 6]]
+
+    match1, offsets2 = da.match_bars(dt1, dt2, np.timedelta64(4, "m"))
+    assert list(match1) == [-1, 0, -1, 1, -1, 3]
+    assert offsets2.tolist() == [[1, 2], [3, 4], [4, 4], [5, 6]]
+
+
 def test_compare_candles_frequencies():
     files = da.list_data_files()
     file1 = files["1M"][0]
@@ -104,6 +135,61 @@ def test_format_df_candles():
     assert len(output) > 0
 
 
+def test_classify_candles():
+    df1 = pandas.DataFrame({"high": [10, 12, 11, 10, 13, 11, 9, 9, 9, 20],
+                            "low": [8, 9, 7, 9, 8, 6, 8, 8, 8, 1]})
+    df2 = pandas.DataFrame({"open": [9, 9, 9, 9, 9], "high": [12, 13, 9, 14, 20],
+                            "low": [7, 6, 8, 7, 1], "close": [10, 8, 9, 10, 10]})
+    offsets2 = np.array([[0, 3], [3, 6], [6, 9], [0, 3], [9, 10]])
+    candles = da.classify_candles(df1, df2, offsets2)
+    # low after high and close > open, high before low and close < open, close == open,
+    # high not found, too few fine bars
+    assert list(candles) == [3, 2, 0, 0, 0]
+    assert list(da.classify_candles(df1, df2, np.zeros((0, 2), dtype=int))) == []
+
+
+def test_format_df_candles_match():
+    df = pandas.DataFrame({"close": [1, 2, 3, 4, 5, 6]})
+    time_match_df = np.array([-1, 0, 0, 1, 1, 1])
+    candles = pandas.Series([2, 4])
+    output = da.format_df_candles(df, time_match_df, candles)
+    assert list(output["id"]) == [0, 0, 1, 0, 1, 2]
+    assert list(output["match"]) == [-1, 0, 0, 1, 1, 1]
+    assert list(output["candle"]) == [0, 2, 2, 4, 4, 4]
+
+
+def write_candles_files(tmp_path):
+    rows1 = []
+    for minute in range(60):
+        # 5M candle going up with the low first, then down with the high first
+        price = 50000 + 5 * (minute % 5) if (minute // 5) % 2 == 0 else 50100 - 5 * (minute % 5)
+        rows1.append("2015.08.12,{:02d}:{:02d}:00,{},{},{},{},1,1\n".format(9 + minute // 60, minute % 60,
+                                                                           price, price + 5, price - 5, price))
+    rows5 = []
+    for candle in range(12):
+        if candle % 2 == 0:
+            values = (50000, 50025, 49995, 50020)
+        else:
+            values = (50100, 50105, 50075, 50080)
+        rows5.append("2015.08.12,09:{:02d}:00,{},{},{},{},5,5\n".format(5 * candle, *values))
+    header = "date,hour,open,high,low,close,real_volume,tick_volume\n"
+    file1 = write_csv(tmp_path, header + "".join(rows1), name="WIN$N_1M_2015.08.12_2015.08.12_.csv")
+    file5 = write_csv(tmp_path, header + "".join(rows5), name="WIN$N_5M_2015.08.12_2015.08.12_.csv")
+    return {"1M": [file1], "5M": [file5]}
+
+
+def test_candles_analysis_workers(tmp_path):
+    files = write_candles_files(tmp_path)
+    output = da.candles_analysis(files, workers=1, output_path=None)
+    assert list(output.index) == [("1M_5M", "2015.08.12_2015.08.12")]
+    assert list(output.columns) == da.CANDLE_TYPES
+    assert list(output.iloc[0]) == [0, 6, 6, 0, 0]
+
+    parallel = da.candles_analysis(files, workers=2, output_path=str(tmp_path / "candles.csv"))
+    assert parallel.equals(output)
+    assert (tmp_path / "candles.csv").exists()
+
+
 def test_candles_analysis():
     files = da.list_data_files()
     # file1 = files["1M"][0]
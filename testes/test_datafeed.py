@@ -0,0 +1,280 @@
+import os
+import argparse
+import pickle
+import datetime
+import numpy
+import pandas
+import pytest
+import backtrader as bt
+
+from testes import context
+from testes.test_store import write_csv
+from src.helpers import datafeed, store
+
+ARGS = argparse.Namespace(noheaders=False, noprint=True)
+
+CSV_DAYS = "date,hour,open,high,low,close,real_volume,tick_volume\n" + "".join(
+    "2015.08.{:02d},{:02d}:{:02d}:00,{},{},{},{},{},1\n".format(day, 9 + minute // 60, minute % 60, 50000 + 5 * minute,
+                                                             50100 + 5 * minute, 49900 + day, 50050 - minute, minute)
+    for day in range(12, 17) for minute in range(0, 300, 30))
+
+
+def test_pandasdatafeed(tmp_path):
+    datapath = write_csv(tmp_path)
+    output = datafeed.pandasdatafeed(datapath, args=ARGS)
+    assert isinstance(output, pandas.DataFrame)
+    assert list(output.columns) == ['open', 'high', 'low', 'close', 'volume']
+    assert output.index.name == "datetime"
+    assert output.index.is_monotonic_increasing
+
+    expected = pandas.read_csv(datapath, parse_dates={'datetime': ['date', 'hour']}, index_col=0)
+    expected = expected.sort_index().loc[:, ['open', 'high', 'low', 'close', 'real_volume']]
+    expected = expected.rename(columns={"real_volume": "volume"})
+    assert output.equals(expected)
+
+    # second load comes from the sidecar
+    assert datafeed.pandasdatafeed(datapath, args=ARGS).equals(expected)
+
+
+def test_pandasdatafeed_daterange(tmp_path):
+    datapath = write_csv(tmp_path)
+    output = datafeed.pandasdatafeed(datapath, args=ARGS,
+                                     fromdate=datetime.datetime(2015, 8, 13), todate=datetime.datetime(2015, 8, 13))
+    assert len(output) == 1
+    assert output.index[0] == pandas.Timestamp("2015-08-13 09:00:00")
+
+    output = datafeed.pandasdatafeed(datapath, args=ARGS, warmup=1,
+                                     fromdate=datetime.datetime(2015, 8, 13), todate=datetime.datetime(2015, 8, 13))
+    assert len(output) == 2
+    assert output.index[0] == pandas.Timestamp("2015-08-12 09:05:00")
+
+
+def test_warmup_bars():
+    params = {"period_me1": numpy.arange(10, 21, 5), "period_me2": numpy.arange(20, 31, 5),
+              "period_atr": numpy.arange(50, 81, 15), "atrdist": numpy.arange(0.8, 1.5, 0.2),
+              "time_start": [[9, 0]]}
+    assert datafeed.warmup_bars(params) == 80
+    assert datafeed.warmup_bars({"period_rsi": 5}, {"period_atr": 70, "analyzer_opt": {"vwr": 1.}}) == 70
+    assert datafeed.warmup_bars({}) == 0
+
+
+def test_date2num():
+    dates = pandas.to_datetime(["2015-08-12 09:00:00", "2015-08-12 09:05:00", "2021-01-22 17:55:00"])
+    output = datafeed.date2num(dates.values.view(numpy.int64))
+    expected = [bt.date2num(dt) for dt in dates.to_pydatetime()]
+    assert list(output) == expected
+
+
+class CloseStrategy(bt.Strategy):
+    def __init__(self):
+        self.sma = bt.indicators.SMA(period=2)
+        self.values = []
+
+    def next(self):
+        self.values.append((self.data.datetime[0], self.data.open[0], self.data.close[0],
+                            self.data.volume[0], self.sma[0]))
+
+
+def run_cerebro(data, **kwargs):
+    cerebro = bt.Cerebro(stdstats=False, **kwargs)
+    cerebro.adddata(data)
+    cerebro.addstrategy(CloseStrategy)
+    return cerebro.run()[0].values
+
+
+def test_numpydata(tmp_path):
+    datapath = write_csv(tmp_path, CSV_DAYS)
+    dataname = datafeed.numpydatafeed(datapath, args=ARGS)
+    assert all(value.dtype == numpy.float64 for value in dataname.values())
+
+    dataframe = datafeed.pandasdatafeed(datapath, args=ARGS)
+    dates = [(None, datetime.datetime(2015, 8, 14)),
+             (datetime.datetime(2015, 8, 13), datetime.datetime(2015, 8, 15, 11, 0)),
+             (datetime.datetime(2015, 8, 14), None)]
+    for fromdate, todate in dates:
+        for kwargs in [{}, {"runonce": False}, {"preload": False}, {"exactbars": 1}]:
+            expected = run_cerebro(bt.feeds.PandasData(dataname=dataframe, fromdate=fromdate, todate=todate),
+                                   **kwargs)
+            output = run_cerebro(datafeed.NumpyData(dataname=dataname, fromdate=fromdate, todate=todate),
+                                 **kwargs)
+            assert output == expected
+
+
+def test_streamingdata(tmp_path):
+    datapath = write_csv(tmp_path, CSV_DAYS)
+    dataname = datafeed.numpydatafeed(datapath, args=ARGS)
+    dates = [(None, None),
+             (datetime.datetime(2015, 8, 13), datetime.datetime(2015, 8, 15, 11, 0)),
+             (datetime.datetime(2015, 8, 14), None)]
+    for fromdate, todate in dates:
+        expected = run_cerebro(datafeed.NumpyData(dataname=dataname, fromdate=fromdate, todate=todate, warmup=2))
+        for chunksize in [1, 7, 10, 1000]:
+            args = argparse.Namespace(streaming=chunksize, exactbars=0, **vars(ARGS))
+            data = datafeed.streamingdata(datapath, args=args, fromdate=fromdate, todate=todate, warmup=2)
+            assert isinstance(data.p.dataname["close"], numpy.memmap)
+            assert run_cerebro(data, **datafeed.streaming_kwargs(args)) == expected
+
+    assert datafeed.streaming_kwargs(argparse.Namespace(streaming=None, exactbars=0)) == {}
+    assert datafeed.streaming_kwargs(argparse.Namespace(streaming=10, exactbars=-1)) == {"preload": False,
+                                                                                         "exactbars": -1}
+
+
+class WarmupStrategy(bt.Strategy):
+    def __init__(self):
+        self.sma = bt.indicators.SMA(period=3)
+        self.values = []
+
+    def next(self):
+        if not datafeed.warming_up(self.data):
+            self.values.append((self.data.datetime.datetime(0), self.sma[0]))
+
+
+def test_warmup_indicators(tmp_path):
+    datapath = write_csv(tmp_path, CSV_DAYS)
+    fromdate, todate = datetime.datetime(2015, 8, 13), datetime.datetime(2015, 8, 14)
+    closes = datafeed.pandasdatafeed(datapath, args=ARGS)["close"]
+    # the SMA at fromdate is primed with the last 2 bars of the day before
+    expected = closes[closes.index < fromdate][-2:].sum() + closes[closes.index >= fromdate][0]
+
+    dataname = datafeed.numpydatafeed(datapath, args=ARGS, fromdate=fromdate, todate=todate, warmup=2)
+    args = argparse.Namespace(streaming=4, exactbars=0, **vars(ARGS))
+    feeds = [(datafeed.NumpyData(dataname=dataname, fromdate=fromdate, todate=todate, warmup=2), {}),
+             (datafeed.NumpyData(dataname=dataname, fromdate=fromdate, todate=todate, warmup=2), {"preload": False}),
+             (datafeed.streamingdata(datapath, args=args, fromdate=fromdate, todate=todate, warmup=2),
+              datafeed.streaming_kwargs(args))]
+    for data, kwargs in feeds:
+        cerebro = bt.Cerebro(stdstats=False, **kwargs)
+        cerebro.adddata(data)
+        cerebro.addstrategy(WarmupStrategy)
+        values = cerebro.run()[0].values
+        # trading starts at fromdate, with the indicator already primed
+        assert values[0][0] == datetime.datetime(2015, 8, 13, 9, 0)
+        assert values[0][1] == pytest.approx(expected / 3)
+        assert len(values) == 10
+
+    # without warm up the first 2 bars of fromdate only prime the indicator
+    data = datafeed.NumpyData(dataname=dataname, fromdate=fromdate, todate=todate)
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.adddata(data)
+    cerebro.addstrategy(WarmupStrategy)
+    assert cerebro.run()[0].values[0][0] == datetime.datetime(2015, 8, 13, 10, 0)
+
+
+def test_numpydatafeed_compact(tmp_path):
+    datapath = write_csv(tmp_path, CSV_DAYS)
+    kwargs = {"fromdate": datetime.datetime(2015, 8, 13), "todate": datetime.datetime(2015, 8, 14), "warmup": 3}
+    expected = datafeed.numpydatafeed(datapath, args=ARGS, **kwargs)
+    for compact in ["int32", "int16"]:
+        output = datafeed.numpydatafeed(datapath, args=ARGS, compact=compact, **kwargs)
+        assert list(output.keys()) == list(expected.keys())
+        for column, values in expected.items():
+            assert output[column].dtype == numpy.float64
+            assert numpy.array_equal(output[column], values)
+
+
+def test_resample_arrays(tmp_path):
+    datapath = write_csv(tmp_path, CSV_DAYS)
+    arrays = store.read_store(datapath)
+    resampled = datafeed.resample_arrays(arrays, 60)
+    assert len(resampled["datetime"]) == 5 * 5
+    dates = resampled["datetime"].astype("datetime64[ns]")
+    assert str(dates[0]) == "2015-08-12T09:00:00.000000000"
+    assert str(dates[5]) == "2015-08-13T09:00:00.000000000"
+    assert list(resampled["open"][:2]) == [arrays["open"][0], arrays["open"][2]]
+    assert list(resampled["high"][:2]) == [max(arrays["high"][0:2]), max(arrays["high"][2:4])]
+    assert list(resampled["low"][:2]) == [min(arrays["low"][0:2]), min(arrays["low"][2:4])]
+    assert list(resampled["close"][:2]) == [arrays["close"][1], arrays["close"][3]]
+    assert list(resampled["volume"][:2]) == [sum(arrays["volume"][0:2]), sum(arrays["volume"][2:4])]
+
+    # 5 hours bars from 09:00, split at 10:00 and never mixing sessions
+    resampled = datafeed.resample_arrays(arrays, 300)
+    assert len(resampled["datetime"]) == 2 * 5
+    assert numpy.array_equal(resampled["datetime"] // store.NS_PER_DAY, numpy.repeat(arrays["days"], 2))
+
+    with pytest.raises(ValueError):
+        datafeed.resample_arrays(arrays, 45)
+
+
+def test_read_resampled(tmp_path):
+    datapath = write_csv(tmp_path, CSV_DAYS)
+    output = datafeed.read_resampled(datapath, 60)
+    path = datafeed.resampled_path(datapath, 60)
+    assert os.path.isfile(os.path.join(path, "meta.json"))
+    assert list(output["offsets"]) == [0, 5, 10, 15, 20, 25]
+    cached = datafeed.read_resampled(datapath, 60)
+    assert isinstance(cached["close"], numpy.memmap)
+    assert numpy.array_equal(cached["close"], output["close"])
+
+    datafeed.read_resampled(datapath, 120)
+    total = datafeed.evict_resampled(datapath, maxbytes=0, keep=path)
+    assert os.path.isdir(path)
+    assert not os.path.isdir(datafeed.resampled_path(datapath, 120))
+    assert total > 0
+
+
+def test_resolve_datapath(tmp_path):
+    file1 = write_csv(tmp_path, CSV_DAYS, name="WIN$N_30M_2015.08.12_2015.08.16_.csv")
+    write_csv(tmp_path, CSV_DAYS, name="WIN$N_45M_2015.08.12_2015.08.16_.csv")
+    assert datafeed.resolve_datapath(file1) == (file1, None)
+    missing = os.path.join(str(tmp_path), "WIN$N_60M_2015.08.12_2015.08.16_.csv")
+    assert datafeed.resolve_datapath(missing) == (file1, 60)
+    with pytest.raises(FileNotFoundError):
+        datafeed.resolve_datapath(os.path.join(str(tmp_path), "WIN$N_20M_2015.08.12_2015.08.16_.csv"))
+    # a finer file of a shorter history is not used silently
+    with pytest.raises(FileNotFoundError, match="only"):
+        datafeed.resolve_datapath(os.path.join(str(tmp_path), "WIN$N_60M_2015.05.22_2021.01.22_.csv"))
+    write_csv(tmp_path, CSV_DAYS, name="WIN$N_15M_2015.08.01_2015.08.20_.csv")
+    assert datafeed.resolve_datapath(missing) == (str(tmp_path / "WIN$N_15M_2015.08.01_2015.08.20_.csv"), 60)
+
+    dataname = datafeed.numpydatafeed(missing, args=ARGS)
+    assert len(dataname["close"]) == 25
+    dataname = datafeed.numpydatafeed(file1, args=ARGS, resample=60)
+    assert len(dataname["close"]) == 25
+
+
+def test_shared_arrays(tmp_path):
+    datapath = write_csv(tmp_path, CSV_DAYS)
+    dataname = datafeed.numpydatafeed(datapath, args=ARGS)
+    shared = datafeed.SharedArrays(dataname)
+    try:
+        assert set(shared.keys()) == set(dataname.keys())
+        payload = pickle.dumps(shared)
+        assert len(payload) < 1024
+
+        attached = pickle.loads(payload)
+        assert attached.name == shared.name
+        for column, values in dataname.items():
+            assert numpy.array_equal(attached[column], values)
+        attached.close()
+
+        expected = run_cerebro(datafeed.NumpyData(dataname=dataname))
+        assert run_cerebro(datafeed.NumpyData(dataname=shared)) == expected
+    finally:
+        shared.unlink()
+
+
+class OptStrategy(bt.Strategy):
+    params = (("period", 2),)
+
+    def __init__(self):
+        self.sma = bt.indicators.SMA(period=self.p.period)
+
+    def stop(self):
+        self.total = sum(self.sma.array[self.p.period - 1:len(self)])
+
+
+def test_shared_arrays_optimization(tmp_path):
+    datapath = write_csv(tmp_path, CSV_DAYS)
+    dataname = datafeed.numpydatafeed(datapath, args=ARGS)
+    shared = datafeed.SharedArrays(dataname)
+    try:
+        output = {}
+        for maxcpus, optdatas, data in [(1, True, dataname), (2, False, shared)]:
+            cerebro = bt.Cerebro(stdstats=False, maxcpus=maxcpus, optdatas=optdatas, optreturn=False)
+            cerebro.adddata(datafeed.NumpyData(dataname=data))
+            cerebro.optstrategy(OptStrategy, period=[2, 3, 4])
+            results = cerebro.run()
+            output[maxcpus] = sorted((strats[0].p.period, strats[0].total) for strats in results)
+        assert output[1] == output[2]
+    finally:
+        shared.unlink()
@@ -5,8 +5,10 @@ import pandas
 import json
 import datetime
 import numpy as np
+from types import SimpleNamespace
 
 from testes import context
+from testes.test_store import write_csv
 from src import main_opt as opt
 
 def test_analyzers_read():
@@ -38,6 +40,32 @@ def test_analyzer_opt():
     assert False
 
 
+def test_daterange_opt(tmp_path):
+    # 12 sessions, from 2015.08.03 to 2015.08.18 skipping the weekends
+    sessions = [day for day in pandas.date_range("2015-08-03", "2015-08-18") if day.weekday() < 5]
+    content = "date,hour,open,high,low,close,real_volume,tick_volume\n" + "".join(
+        "{},{},50000,50010,49990,50005,10,1\n".format(day.strftime("%Y.%m.%d"), hour)
+        for day in sessions for hour in ["09:00:00", "09:30:00"])
+    settings = {"opt_analyzer": {"datapath": write_csv(tmp_path, content), "fromdate": "", "todate": "",
+                                 "daterange_opt": 4, "daterange_opt_train": 0.5}}
+
+    output = opt.daterange_opt(settings)
+    assert list(output.keys()) == [0, 1]
+    assert output[0] == {"train": {"fromdate": datetime.datetime(2015, 8, 3), "todate": datetime.datetime(2015, 8, 4)},
+                         "test": {"fromdate": datetime.datetime(2015, 8, 5), "todate": datetime.datetime(2015, 8, 6)}}
+    assert output[1]["train"]["fromdate"] == datetime.datetime(2015, 8, 7)
+    assert output[1]["test"]["todate"] == datetime.datetime(2015, 8, 12)
+
+    # dates out of the calendar (weekends) snap to the sessions inside the range
+    settings["opt_analyzer"].update({"fromdate": "2015.08.08", "todate": "2015.08.17"})
+    output = opt.daterange_opt(settings)
+    assert list(output.keys()) == [0]
+    assert output[0]["train"]["fromdate"] == datetime.datetime(2015, 8, 10)
+
+    settings["opt_analyzer"].update({"fromdate": "", "todate": "2015.08.06"})
+    assert opt.daterange_opt(settings) == {}
+
+
 def test_params_ops_validate():
     settings = json.load(open("./src/settings.json"))
     kwargs = {
@@ -71,3 +99,150 @@ def test_validate_null_data():
 
     
     
+
+
+def test_schedule_workers():
+    assert opt.schedule_workers(0, tasks=100, cpus=8) == (8, 1)
+    assert opt.schedule_workers(2, tasks=100, cpus=8) == (2, 4)
+    assert opt.schedule_workers(3, tasks=100, cpus=8) == (3, 2)
+    # never more workers than tasks or CPUs
+    assert opt.schedule_workers(0, tasks=2, cpus=8) == (2, 4)
+    assert opt.schedule_workers(16, tasks=100, cpus=4) == (4, 1)
+    assert opt.schedule_workers(0, tasks=0, cpus=4) == (1, 4)
+
+
+def test_analyzers_select_write(tmp_path):
+    settings = {"opt_analyzer": {"path_log": str(tmp_path / "analyzer_{}.json"),
+                                 "path_output_train": str(tmp_path / "analyzers_train_{}d_{}.json"),
+                                 "output_train_key": "output_train", "analyzer_opt": "vwr",
+                                 "daterange_opt": 21, "daterange_opt_train": 0.8}}
+    filename, output_key = opt.filename_key_opt_type(settings, opt_type="train")
+    json.dump([], open(filename, "w"))
+
+    analyzers = opt.params_columns([{"period_rsi": period, "signal": "RSISignal"} for period in [10, 20, 30]])
+    analyzers.update(vwr=np.array([1.5, 3.5, 2.5]), sqn=np.full(3, 0.5), total=np.full(3, 100.))
+    windows = [{"train": {"fromdate": datetime.datetime(2015, 8, day), "todate": datetime.datetime(2015, 8, day + 1)},
+                output_key: {"RSISignal": {"period_rsi": np.array([10, 20, 30])}}} for day in [3, 10]]
+
+    for window in windows:
+        output = opt.analyzers_select(settings, analyzers=analyzers, opt_type="train", **window)
+        assert output[output_key]["RSISignal"]["period_rsi"] == 20
+        assert output[output_key]["RSISignal"]["analyzer_opt"] == {"vwr": 3.5, "sqn": 0.5, "total": 100.}
+        opt.analyzers_write(settings, output, opt_type="train")
+    # the same window is updated in place
+    opt.analyzers_write(settings, output, opt_type="train")
+
+    data = json.load(open(filename))
+    assert [row["train"]["fromdate"] for row in data] == ["2015-08-03 00:00:00", "2015-08-10 00:00:00"]
+    assert opt.params_ops_validate(settings, opt_type="train", **windows[0])
+
+    # the keys of the saved windows are read once
+    completed = opt.completed_tasks(settings, opt_type="train")
+    assert len(completed) == 2
+    for window in windows:
+        assert opt.params_ops_validate(settings, completed=completed, opt_type="train", **window)
+    window = dict(windows[0], output_train={"MACDSignal": {}})
+    assert not opt.params_ops_validate(settings, completed=completed, opt_type="train", **window)
+    assert not opt.params_ops_validate(settings, opt_type="train", **window)
+
+
+def test_analyzers_log(tmp_path):
+    settings = {"opt_analyzer": {"path_log": str(tmp_path / "analyzer_{}.json"),
+                                 "path_output_train": str(tmp_path / "analyzers_train_{}d_{}.json"),
+                                 "output_train_key": "output_train", "analyzer_opt": "vwr",
+                                 "daterange_opt": 21, "daterange_opt_train": 0.8}}
+
+    def strat(period, vwr, total):
+        analysis = {"VWR": {"vwr": vwr}, "SQN": {"sqn": 0.5, "trades": 10},
+                    "TradeAnalyzer": {"pnl": {"net": {"total": total}}} if total is not None else {"total": {"total": 0}}}
+        analyzers = [type(name, (), {"get_analysis": lambda self, value=value: value})()
+                     for name, value in analysis.items()]
+        params = {"period_rsi": period, "atrdist": 0.8, "time_start": [9, 0], "signal": "RSISignal", "printlog": False}
+        return SimpleNamespace(params=SimpleNamespace(**params), analyzers=analyzers)
+
+    results = [[strat(period, vwr, total)] for period, vwr, total in [(10, 1.5, 100.), (20, 3.5, 50.), (30, 2.5, None)]]
+    table = opt.analyzers_log(settings, results)
+
+    # one row per params set, typed param columns and float metrics
+    assert os.path.isfile(tmp_path / "analyzer_RSISignal.npz")
+    assert table["_params"].tolist() == ["period_rsi", "atrdist", "time_start", "signal"]
+    assert table["period_rsi"].dtype.kind == "i" and table["atrdist"].dtype.kind == "f"
+    assert table["_json"].tolist() == ["time_start"]
+    np.testing.assert_array_equal(table["total"], [100., 50., np.nan])
+    np.testing.assert_array_equal(table["trades"], [10., 10., 10.])
+
+    logged = opt.read_table(opt.log_path(settings, "RSISignal"))
+    assert sorted(logged) == sorted(table)
+    assert opt.table_params(logged, 2) == {"period_rsi": 30, "atrdist": 0.8, "time_start": [9, 0],
+                                           "signal": "RSISignal"}
+
+    window = {"train": {"fromdate": datetime.datetime(2015, 8, 3), "todate": datetime.datetime(2015, 8, 4)},
+              "output_train": {"RSISignal": {}}}
+    output = opt.analyzers_select(settings, opt_type="train", **window)
+    assert output["output_train"]["RSISignal"]["period_rsi"] == 20
+    assert output["output_train"]["RSISignal"]["time_start"] == [9, 0]
+
+    # former JSON logs are still read when there is no npz log
+    os.remove(opt.log_path(settings, "RSISignal"))
+    json.dump({json.dumps({"period_rsi": 40, "signal": "RSISignal"}): {"VWR": {"vwr": 1.0}, "SQN": {"sqn": 0.1}},
+               json.dumps({"period_rsi": 50, "signal": "RSISignal"}): {"VWR": {"vwr": 2.0}, "SQN": {"sqn": 0.2}}},
+              open(tmp_path / "analyzer_RSISignal.json", "w"))
+    output = opt.analyzers_select(settings, opt_type="train", **window)
+    assert output["output_train"]["RSISignal"]["period_rsi"] == 50
+    assert np.isnan(output["output_train"]["RSISignal"]["analyzer_opt"]["total"])
+    opt.analyzers_log(settings, results)
+
+    # multi-objective, the net pnl breaks the tie of sqn
+    settings["opt_analyzer"]["analyzer_opt"] = ["sqn", "total"]
+    output = opt.analyzers_select(settings, opt_type="train", **window)
+    assert output["output_train"]["RSISignal"]["period_rsi"] == 10
+    assert output["output_train"]["RSISignal"]["analyzer_opt"] == {"sqn": 0.5, "total": 100.}
+
+
+def test_optlog(tmp_path):
+    settings = {"opt_analyzer": {"path_log": str(tmp_path / "analyzer_{}.json")}}
+
+    class Analyzer(object):
+        def __init__(self, rets):
+            self.rets = rets
+
+        def get_analysis(self):
+            return self.rets
+
+    def stratrun(period):
+        analyzers = [type("VWR", (Analyzer,), {})({"vwr": period / 10}),
+                     type("TradeAnalyzer", (Analyzer,), {})({"pnl": {"net": {"total": period}}, "long": {}})]
+        params = {"period_rsi": period, "signal": "RSISignal", "printlog": False}
+        return [SimpleNamespace(params=SimpleNamespace(**params), analyzers=analyzers)]
+
+    # rows are logged as each run ends, and the analyses are released once logged
+    optlog = opt.OptLog()
+    runs = [stratrun(period) for period in [10, 20]]
+    optlog(runs[0])
+    assert runs[0][0].analyzers[1].rets == {}
+    assert runs[0][0].params.printlog is False
+    optlog(runs[1])
+    table = optlog.write(settings)
+    assert table["period_rsi"].tolist() == [10, 20]
+    np.testing.assert_array_equal(table["vwr"], [1., 2.])
+    np.testing.assert_array_equal(table["total"], [10., 20.])
+    assert np.isnan(table["sqn"]).all()
+    assert sorted(opt.read_table(opt.log_path(settings, "RSISignal"))) == sorted(table)
+
+
+def test_rank_params():
+    table = {"vwr": np.array([1.5, 3.5, np.nan, 3.5, 2.5]), "sqn": np.array([0.1, 0.2, 9.0, 0.4, 0.3]),
+             "total": np.array([10., 20., 30., 20., 50.])}
+
+    # the first params set run wins the ties of a single objective
+    assert opt.rank_params(table, ["vwr"]).tolist() == [1]
+    assert opt.rank_params(table, ["vwr"], k=3).tolist() == [1, 3, 4]
+    # the next objectives break the ties, NaN ranks last
+    assert opt.rank_params(table, ["vwr", "sqn", "total"], k=2).tolist() == [3, 1]
+    assert opt.rank_params(table, ["vwr", "sqn"], k=10).tolist() == [3, 1, 4, 0, 2]
+    assert opt.rank_params(table, ["sqn"], k=0).tolist() == []
+
+    metrics = np.random.default_rng(0).integers(0, 50, size=(2, 10000)).astype(float)
+    table = {"vwr": metrics[0], "sqn": metrics[1]}
+    expected = pandas.DataFrame(table).sort_values(["vwr", "sqn"], ascending=False, kind="mergesort").index[:100]
+    np.testing.assert_array_equal(opt.rank_params(table, ["vwr", "sqn"], k=100), expected)
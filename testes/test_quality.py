@@ -0,0 +1,70 @@
+from testes import context
+from testes.test_store import write_csv
+from data.analysis import quality
+
+HEADER = "date,hour,open,high,low,close,real_volume,tick_volume\n"
+ROWS = ["2015.08.12,08:55:00,10,12,9,11,5,1",   # out of session
+        "2015.08.12,09:00:00,10,12,9,11,5,1",
+        "2015.08.12,09:05:00,10,12,9,11,0,1",   # zero volume
+        "2015.08.12,09:05:00,10,12,9,11,5,1",   # duplicated
+        "2015.08.12,09:20:00,10,12,9,11,5,1",   # 2 missing bars, and 102 up to the session close
+        "2015.08.13,09:00:00,10,10,9,11,5,1",   # high < close
+        "2015.08.13,09:05:00,10,12,11,11,5,1",  # low > open
+        "2015.08.13,17:50:00,10,12,9,11,5,1",   # last bar of the session, 104 missing bars before it
+        "2015.08.13,17:55:00,10,12,9,11,5,1"]   # out of session, at the close
+
+
+def test_scan_file(tmp_path):
+    datapath = write_csv(tmp_path, HEADER + "\n".join(ROWS) + "\n", name="WIN$N_5M_a_.csv")
+    report = quality.scan_file(datapath)
+
+    assert list(report.index) == ["2015.08.12", "2015.08.13"]
+    assert list(report["bars"]) == [5, 4]
+    assert list(report["missing"]) == [2 + 102, 104]
+    assert list(report["duplicated"]) == [1, 0]
+    assert list(report["zero_volume"]) == [1, 0]
+    assert list(report["invalid_ohlc"]) == [0, 2]
+    assert list(report["out_of_session"]) == [1, 1]
+    assert list(report["first"]) == ["08:55:00", "09:00:00"]
+    assert list(report["last"]) == ["09:20:00", "17:55:00"]
+
+    report = quality.scan_file(datapath, session=("08:00:00", "18:30:00"))
+    assert list(report["out_of_session"]) == [0, 0]
+
+
+def test_scan_session_edges(tmp_path):
+    rows = ["2015.08.12,09:10:00,10,12,9,11,5,1", "2015.08.12,09:15:00,10,12,9,11,5,1",
+            "2015.08.13,09:00:00,10,12,9,11,5,1", "2015.08.13,09:05:00,10,12,9,11,5,1"]
+    datapath = write_csv(tmp_path, HEADER + "\n".join(rows) + "\n", name="WIN$N_5M_a_.csv")
+
+    # the bars missing before the first and after the last bar of the day are counted
+    report = quality.scan_file(datapath, session=("09:00:00", "09:35:00"))
+    assert list(report["missing"]) == [2 + 3, 5]
+    report = quality.scan_file(datapath, session=("09:00:00", "09:10:00"))
+    assert list(report["missing"]) == [2, 0]
+    assert list(report["out_of_session"]) == [2, 0]
+
+
+def test_scan_full_day(tmp_path):
+    # a normal day of 1 minute bars, 09:00 to 17:54, has no missing bar with the default session
+    rows = ["2015.08.12,{:02d}:{:02d}:00,10,12,9,11,5,1".format(minute // 60, minute % 60)
+            for minute in range(9 * 60, 17 * 60 + 55)]
+    datapath = write_csv(tmp_path, HEADER + "\n".join(rows) + "\n", name="WIN$N_1M_a_.csv")
+    report = quality.scan_file(datapath)
+    assert list(report["bars"]) == [535]
+    assert list(report["missing"]) == [0]
+    assert list(report["out_of_session"]) == [0]
+    assert len(quality.issues(report)) == 0
+
+
+def test_main(tmp_path):
+    clean = "\n".join("2015.08.14,{:02d}:{:02d}:00,10,12,9,11,5,1".format(minute // 60, minute % 60)
+                      for minute in range(9 * 60, 17 * 60 + 55, 5))
+    datapath1 = write_csv(tmp_path, HEADER + "\n".join(ROWS) + "\n", name="WIN$N_5M_a_.csv")
+    datapath2 = write_csv(tmp_path, HEADER + clean + "\n", name="WIN$N_5M_b_.csv")
+    output = str(tmp_path / "quality.csv")
+
+    report = quality.main([datapath1, datapath2, "--issues", "--output", output])
+    assert len(report) == 2
+    assert set(report.index.get_level_values("file")) == {datapath1}
+    assert (tmp_path / "quality.csv").exists()
@@ -0,0 +1,85 @@
+import os
+import json
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from testes import context
+from src.helpers import results
+
+
+def window_output(day, signal, vwr):
+    return {"train": {"fromdate": datetime.datetime(2015, 8, day), "todate": datetime.datetime(2015, 8, day + 1)},
+            "test": {"fromdate": datetime.datetime(2015, 8, day + 2), "todate": datetime.datetime(2015, 8, day + 3)},
+            "output_train": {signal: {"period_rsi": 10, "analyzer_opt": {"vwr": vwr}}}}
+
+
+def test_write_result(tmp_path):
+    path = str(tmp_path / "analyzers.sqlite")
+    results.write_result(path, "train", window_output(3, "RSISignal", 1.), "output_train")
+    results.write_result(path, "train", window_output(10, "RSISignal", 2.), "output_train")
+    results.write_result(path, "train", window_output(3, "MACDSignal", 3.), "output_train")
+    # replaced in place
+    results.write_result(path, "train", window_output(3, "RSISignal", 4.), "output_train")
+
+    assert results.count_results(path, "train") == 3
+    assert results.count_results(path, "test") == 0
+    assert results.has_result(path, "train", datetime.datetime(2015, 8, 3), datetime.datetime(2015, 8, 4), "MACDSignal")
+    assert results.has_result(path, "train", "2015-08-10 00:00:00", "2015-08-11 00:00:00", "RSISignal")
+    assert not results.has_result(path, "train", "2015-08-10 00:00:00", "2015-08-11 00:00:00", "MACDSignal")
+
+    rows = results.read_rows(path, "train")
+    assert [row["train"]["fromdate"] for row in rows] == ["2015-08-03 00:00:00", "2015-08-10 00:00:00"]
+    assert list(rows[0]["output_train"].keys()) == ["RSISignal", "MACDSignal"]
+    assert rows[0]["output_train"]["RSISignal"]["analyzer_opt"]["vwr"] == 4.
+
+
+def test_export_import_json(tmp_path):
+    path = str(tmp_path / "analyzers.sqlite")
+    for day in [3, 10, 17]:
+        for signal in ["RSISignal", "MACDSignal"]:
+            results.write_result(path, "train", window_output(day, signal, day / 10), "output_train")
+
+    filename = results.export_json(path, "train", str(tmp_path / "analyzers_train_21d_0.8.json"))
+    data = json.load(open(filename))
+    assert len(data) == 3
+    assert data[1]["output_train"]["MACDSignal"]["analyzer_opt"]["vwr"] == 1.
+
+    # the JSON layout goes back to the same rows
+    path_copy = str(tmp_path / "copy.sqlite")
+    assert results.import_json(path_copy, "train", filename, "output_train") == 3
+    assert results.read_rows(path_copy, "train") == data
+
+
+def test_concurrent_writers(tmp_path):
+    path = str(tmp_path / "analyzers.sqlite")
+    outputs = [window_output(day, signal, 1.) for day in range(1, 25) for signal in ["RSISignal", "MACDSignal"]]
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        list(executor.map(results.write_result, [path] * len(outputs), ["train"] * len(outputs), outputs,
+                          ["output_train"] * len(outputs)))
+    assert results.count_results(path, "train") == len(outputs)
+    assert len(results.read_rows(path, "train")) == 24
+
+
+def test_result_keys(tmp_path):
+    path = str(tmp_path / "analyzers.sqlite")
+    for day in [3, 10]:
+        results.write_result(path, "train", window_output(day, "RSISignal", 1.), "output_train")
+    keys = results.result_keys(path, "train")
+    assert keys == {("train", "2015-08-03 00:00:00", "2015-08-04 00:00:00", "RSISignal"),
+                    ("train", "2015-08-10 00:00:00", "2015-08-11 00:00:00", "RSISignal")}
+    assert results.result_key("train", window_output(10, "RSISignal", 1.), "RSISignal") in keys
+
+    filename = results.export_json(path, "train", str(tmp_path / "analyzers_train_21d_0.8.json"))
+    assert results.json_result_keys(filename, "train", "output_train") == keys
+    assert results.json_result_keys(str(tmp_path / "missing.json"), "train", "output_train") == set()
+
+
+def test_connect_once(tmp_path):
+    path = str(tmp_path / "analyzers.sqlite")
+    assert results.count_results(path, "train") == 0
+    assert os.path.abspath(path) in results._READY
+    # a removed database is set up again
+    os.remove(path)
+    assert results.count_results(path, "train") == 0
+    with results.connect(path) as connection:
+        assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
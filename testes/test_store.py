@@ -0,0 +1,155 @@
+import os
+import datetime
+import numpy as np
+import pytest
+
+from testes import context
+from src.helpers import store
+
+CSV = """date,hour,open,high,low,close,real_volume,tick_volume
+2015.08.13,09:00:00,50140,50200,50100,50150,120,30
+2015.08.12,09:05:00,50145,50155,49550,49630,100,20
+2015.08.12,09:00:00,50280,50440,50030,50140,190,72
+"""
+
+
+def write_csv(tmp_path, content=CSV, name="WIN$N_5M_2015.08.12_2015.08.13_.csv"):
+    datapath = os.path.join(str(tmp_path), name)
+    with open(datapath, "w") as file:
+        file.write(content)
+    return datapath
+
+
+def test_store_path():
+    output = store.store_path("./data/WIN$N_5M_2015.05.22_2021.01.22_.csv")
+    assert output == os.path.join("./data", ".store", "WIN$N_5M_2015.05.22_2021.01.22_.csv")
+
+
+def test_read_source(tmp_path):
+    datapath = write_csv(tmp_path)
+    output = store.read_source(datapath)
+    assert list(output.keys()) == store.STORE_COLUMNS
+    assert output["datetime"].dtype == np.int64
+    assert np.all(np.diff(output["datetime"]) > 0)
+    assert list(output["open"]) == [50280, 50145, 50140]
+    assert list(output["volume"]) == [190, 100, 120]
+
+
+def test_read_store(tmp_path):
+    datapath = write_csv(tmp_path)
+    assert store.load_store(datapath) is None
+
+    output = store.read_store(datapath)
+    assert os.path.isfile(os.path.join(store.store_path(datapath), "meta.json"))
+    assert isinstance(output["close"], np.memmap)
+
+    expected = store.read_source(datapath)
+    for column in store.STORE_COLUMNS:
+        assert np.array_equal(output[column], expected[column])
+
+
+def test_load_store_stale(tmp_path):
+    datapath = write_csv(tmp_path)
+    store.read_store(datapath)
+    assert store.load_store(datapath) is not None
+
+    write_csv(tmp_path, CSV + "2015.08.13,09:05:00,50150,50160,50100,50120,80,10\n")
+    assert store.load_store(datapath) is None
+    assert len(store.read_store(datapath)["datetime"]) == 4
+
+
+def test_day_index():
+    datetimes = np.array(["2015-08-12T09:00", "2015-08-12T09:05", "2015-08-13T09:00", "2015-08-17T09:00"],
+                         dtype="datetime64[ns]").view(np.int64)
+    days, offsets = store.day_index(datetimes)
+    assert list(days) == [16659, 16660, 16664]
+    assert list(offsets) == [0, 2, 3, 4]
+
+    days, offsets = store.day_index(np.zeros(0, dtype=np.int64))
+    assert len(days) == 0
+    assert list(offsets) == [0]
+
+
+def test_slice_rows(tmp_path):
+    datapath = write_csv(tmp_path)
+    arrays = store.read_store(datapath)
+    assert store.slice_rows(arrays) == (0, 3)
+    assert store.slice_rows(arrays, fromdate=datetime.datetime(2015, 8, 13)) == (2, 3)
+    assert store.slice_rows(arrays, fromdate=datetime.datetime(2015, 8, 13), warmup=1) == (1, 3)
+    assert store.slice_rows(arrays, fromdate=datetime.datetime(2015, 8, 13), warmup=10) == (0, 3)
+    assert store.slice_rows(arrays, todate=datetime.datetime(2015, 8, 12, 0, 0)) == (0, 2)
+    assert store.slice_rows(arrays, fromdate=datetime.datetime(2015, 9, 1)) == (3, 3)
+
+
+def test_compact_ohlcv(tmp_path):
+    datapath = write_csv(tmp_path)
+    arrays = store.read_store(datapath)
+    for deltas, dtype in [(False, np.int32), (True, np.int16)]:
+        compact = store.compact_ohlcv(arrays, deltas=deltas)
+        assert compact["close"].dtype == dtype
+        assert compact["volume"].dtype == np.uint32
+        expanded = store.expand_ohlcv(compact)
+        for column in store.STORE_COLUMNS[1:]:
+            assert expanded[column].dtype == np.float64
+            assert np.array_equal(expanded[column], arrays[column])
+        expanded = store.expand_ohlcv(compact, 1, 3)
+        assert np.array_equal(expanded["low"], arrays["low"][1:3])
+
+    compact = store.compact_ohlcv(arrays, deltas=True)
+    assert compact["tick"] == 5
+    assert list(compact["base"]) == [50280, 50140]
+
+
+def test_compact_ohlcv_lossy():
+    arrays = {"datetime": np.array([0, 60]), "days": np.array([0]), "offsets": np.array([0, 2]),
+              "open": np.array([100.0, 100.5]), "high": np.array([100, 101]),
+              "low": np.array([100, 100]), "close": np.array([100, 101]), "volume": np.array([1, 2])}
+    with pytest.raises(ValueError, match="open"):
+        store.compact_ohlcv(arrays)
+
+    arrays["open"] = np.array([100, 100])
+    arrays["volume"] = np.array([1, -2])
+    with pytest.raises(ValueError, match="volume"):
+        store.compact_ohlcv(arrays)
+
+    arrays["volume"] = np.array([1, 2])
+    arrays["high"] = np.array([100, 100 + 2 ** 17])
+    assert store.compact_ohlcv(arrays)["high"][1] == 100 + 2 ** 17
+    with pytest.raises(ValueError, match="int16"):
+        store.compact_ohlcv(arrays, deltas=True)
+    with pytest.raises(ValueError, match="tick"):
+        store.compact_ohlcv(arrays, deltas=True, tick=3)
+
+
+def test_append_npy(tmp_path):
+    filepath = os.path.join(str(tmp_path), "values.npy")
+    np.save(filepath, np.arange(5, dtype=np.int64))
+    store.append_npy(filepath, np.array([5, 6]))
+    assert list(np.load(filepath)) == list(range(7))
+    assert list(np.load(filepath, mmap_mode="r")) == list(range(7))
+
+    with pytest.raises(ValueError):
+        store.append_npy(filepath, np.array([7.5]))
+    assert len(np.load(filepath)) == 7
+
+
+def test_append_store(tmp_path):
+    datapath = write_csv(tmp_path)
+    store.read_store(datapath)
+    meta = store.read_meta(datapath)
+    with open(datapath, "a") as file:
+        file.write("2015.08.13,09:05:00,50150,50160,50140,50145,10,3\n2015.08.14,09:00:00,50145,50150,50100,50110,20,4\n")
+    assert store.load_store(datapath) is None
+
+    new = {"datetime": np.array(["2015-08-13T09:05", "2015-08-14T09:00"], dtype="datetime64[ns]").view(np.int64),
+           "open": np.array([50150, 50145]), "high": np.array([50160, 50150]), "low": np.array([50140, 50100]),
+           "close": np.array([50145, 50110]), "volume": np.array([10, 20])}
+    store.append_store(datapath, new, meta)
+    arrays = store.load_store(datapath)
+    assert arrays is not None
+    expected = store.read_source(datapath)
+    for column in store.STORE_COLUMNS:
+        assert np.array_equal(arrays[column], expected[column])
+    days, offsets = store.day_index(expected["datetime"])
+    assert np.array_equal(arrays["days"], days)
+    assert np.array_equal(arrays["offsets"], offsets)
@@ -0,0 +1,100 @@
+import numpy
+import pytest
+import argparse
+import datetime
+
+from testes import context
+from testes.test_store import write_csv
+from data.analysis import ticks
+from src.helpers import datafeed
+
+TICKS = "<DATE>\t<TIME>\t<BID>\t<ASK>\t<LAST>\t<VOLUME>\t<FLAGS>\n" + "\n".join([
+    "2021.01.22\t09:00:00.137\t100\t105\t\t\t6",      # quote only
+    "2021.01.22\t09:00:01.250\t100\t105\t105\t3\t88",
+    "2021.01.22\t09:00:14.999\t\t\t110\t2\t88",
+    "2021.01.22\t09:00:15.000\t105\t110\t\t\t6",      # quote only
+    "2021.01.22\t09:00:20.500\t\t\t95\t4\t88",
+    "2021.01.22\t09:00:44\t\t\t100\t1\t88",
+    "2021.01.25\t09:00:03.000\t200\t201\t201\t5\t88",
+    "2021.01.25\t09:00:02.000\t200\t210\t205\t1\t88"]) + "\n"   # out of order
+
+
+def test_parse_times():
+    output = ticks.parse_times(["09:00:00.137", "09:00:01", "17:55:30.005"])
+    assert list(output // 10**6) == [32400137, 32401000, 64530005]
+
+
+def test_read_ticks(tmp_path):
+    output = ticks.read_ticks(write_csv(tmp_path, TICKS, name="WIN$N_ticks.csv"))
+    assert list(output["price"]) == [105, 110, 95, 100, 205, 201]
+    assert list(output["volume"]) == [3, 2, 4, 1, 1, 5]
+    assert list(output["spread"]) == [5, 5, 5, 5, 10, 1]
+    assert (output["datetime"][1] - output["datetime"][0]) == 13749 * 10**6
+
+
+def test_aggregate_ticks(tmp_path):
+    trades = ticks.read_ticks(write_csv(tmp_path, TICKS, name="WIN$N_ticks.csv"))
+
+    bars = ticks.aggregate_ticks(trades, by="time", threshold=15)
+    assert list(ticks.format_hours(bars["datetime"])) == ["09:00:00", "09:00:15", "09:00:30", "09:00:00"]
+    assert list(bars["open"]) == [105, 95, 100, 205]
+    assert list(bars["high"]) == [110, 95, 100, 205]
+    assert list(bars["low"]) == [105, 95, 100, 201]
+    assert list(bars["close"]) == [110, 95, 100, 201]
+    assert list(bars["real_volume"]) == [5, 4, 1, 6]
+    assert list(bars["tick_volume"]) == [2, 1, 1, 2]
+    assert list(bars["spread"]) == [5, 5, 5, 1]
+
+    # bars restart every day
+    bars = ticks.aggregate_ticks(trades, by="tick", threshold=3)
+    assert list(bars["tick_volume"]) == [3, 1, 2]
+    assert list(bars["close"]) == [95, 100, 201]
+
+    # a bar is closed once its volume reaches the threshold
+    bars = ticks.aggregate_ticks(trades, by="volume", threshold=5)
+    assert list(bars["real_volume"]) == [5, 5, 6]
+    assert list(ticks.format_hours(bars["datetime"])) == ["09:00:01", "09:00:20", "09:00:02"]
+
+    # the high - low of a range bar stays within the threshold
+    bars = ticks.aggregate_ticks(trades, by="range", threshold=10)
+    assert list(bars["open"]) == [105, 95, 205]
+    assert list(bars["high"] - bars["low"]) == [5, 5, 4]
+
+
+def test_volume_bars_reach_threshold():
+    volumes = numpy.array([400, 200, 450, 100, 500, 300, 100, 700])
+    trades = {"datetime": numpy.arange(8) * 10**9 + (numpy.arange(8) >= 6) * 86400 * 10**9,
+              "price": numpy.ones(8), "volume": volumes, "spread": numpy.zeros(8)}
+
+    bars = ticks.aggregate_ticks(trades, by="volume", threshold=500)
+    assert list(bars["real_volume"]) == [600, 550, 500, 300, 800]
+    # every bar but the last one of each day reaches the threshold
+    assert all(bars["real_volume"][[0, 1, 2, 4]] >= 500)
+
+
+def test_write_bars_repeated_second(tmp_path):
+    trades = {"datetime": numpy.array([0, 10**8, 2 * 10**8, 10**9]) + 1611306000 * 10**9,
+              "price": numpy.array([1., 2., 3., 4.]), "volume": numpy.ones(4), "spread": numpy.zeros(4)}
+    bars = ticks.aggregate_ticks(trades, by="tick", threshold=1)
+    with pytest.raises(ValueError, match="same second"):
+        ticks.write_bars(bars, str(tmp_path / "bars.csv"))
+
+    bars = ticks.aggregate_ticks(trades, by="tick", threshold=3)
+    ticks.write_bars(bars, str(tmp_path / "bars.csv"))
+    assert len(open(tmp_path / "bars.csv").readlines()) == 3
+
+
+def test_main(tmp_path):
+    tickpath = write_csv(tmp_path, TICKS, name="WIN$N_ticks.csv")
+    filepath, = ticks.main([tickpath, "--by", "time", "--threshold", "60", "--output", str(tmp_path)])
+    assert filepath.endswith("WIN$N_1M_2021.01.22_2021.01.25_.csv")
+    assert open(filepath).readline().strip() == ",".join(ticks.BAR_COLUMNS)
+
+    args = argparse.Namespace(noheaders=False, noprint=True)
+    dataframe = datafeed.pandasdatafeed(filepath, args=args)
+    assert list(dataframe.index) == [datetime.datetime(2021, 1, 22, 9), datetime.datetime(2021, 1, 25, 9)]
+    assert list(dataframe["close"]) == [100, 201]
+    assert list(dataframe["volume"]) == [10, 6]
+
+    filepath, = ticks.main([tickpath, "--by", "volume", "--threshold", "5", "--output", str(tmp_path)])
+    assert filepath.endswith("WIN$N_5V_2021.01.22_2021.01.25_.csv")
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas
+import pytest
+
+from testes import context
+from src.helpers.timeparse import days_from_civil, parse_dates, parse_hours, parse_datetimes
+
+
+def test_days_from_civil():
+    year = np.array([1970, 1969, 2000, 2015, 2021])
+    month = np.array([1, 12, 2, 8, 1])
+    day = np.array([1, 31, 29, 12, 22])
+    expected = (pandas.to_datetime(["1970-01-01", "1969-12-31", "2000-02-29", "2015-08-12", "2021-01-22"])
+                .values.astype("datetime64[D]").astype(np.int64))
+    assert np.array_equal(days_from_civil(year, month, day), expected)
+
+
+def test_parse_dates():
+    dates = ["2015.08.12", "2015.08.12", "2016.02.29", "2021.01.22"]
+    output = parse_dates(dates)
+    assert output.dtype == np.int64
+    assert np.array_equal(output, pandas.to_datetime(dates, format="%Y.%m.%d").values.view(np.int64))
+    assert len(parse_dates([])) == 0
+
+    with pytest.raises(ValueError, match="row 1"):
+        parse_dates(["2015.08.12", "2015-08-12"])
+    # longer strings are not truncated to the layout, and the fields are checked
+    for date in ["2015.08.12 x", "2015.08.123", "2015.13.01", "2015.00.10", "2015.08.32", "2015.08.00"]:
+        with pytest.raises(ValueError, match="row 1 does not match the YYYY.MM.DD"):
+            parse_dates(["2015.08.12", date])
+
+
+def test_parse_hours():
+    output = parse_hours(["09:00:00", "9:05:00", "17:55:30", "09:00:00"])
+    assert np.array_equal(output // 10**9, [32400, 32700, 64530, 32400])
+
+    with pytest.raises(ValueError, match="HH:MM:SS"):
+        parse_hours(["09:00:00", "09h00"])
+    for hour in ["09:00:00.5", "9:00:00.5", "24:00:00", "09:60:00", "09:00:60", "9:61:00"]:
+        with pytest.raises(ValueError, match="row 1 does not match the HH:MM:SS"):
+            parse_hours(["09:00:00", hour])
+    assert np.array_equal(parse_hours(["23:59:59", "0:00:00"]) // 10**9, [86399, 0])
+
+
+def test_parse_datetimes():
+    dates = pandas.Series(["2015.08.12", "2015.08.12", "2015.12.30"])
+    hours = pandas.Series(["09:00:00", "17:55:00", "9:01:00"])
+    output = parse_datetimes(dates, hours)
+    expected = pandas.to_datetime(dates + " " + hours).values.view(np.int64)
+    assert np.array_equal(output, expected)